@@ -0,0 +1,54 @@
+"""Measures anonymization throughput of the single-document and batched APIs."""
+
+import argparse
+import json
+import os
+import time
+
+from text_anonymizer.core import anonymize, anonymize_batch
+from text_anonymizer.model import warm_up
+
+SAMPLE_TEXT = (
+    "Ticket from John Smith (john.smith@acme.com): the Acme Corporation portal at "
+    "https://portal.acme.com has been down since Monday in New York City."
+)
+
+
+def measure(label: str, run, documents: int) -> dict:
+    start = time.perf_counter()
+    run()
+    elapsed = time.perf_counter() - start
+    return {"mode": label, "documents": documents, "docs_per_second": documents / elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--documents", type=int, default=5000, help="Documents per run")
+    parser.add_argument("--batch_size", type=int, default=256, help="nlp.pipe batch size")
+    parser.add_argument(
+        "--max_processes", type=int, default=os.cpu_count() or 1, help="Largest n_process"
+    )
+    args = parser.parse_args()
+
+    warm_up()
+    texts = [SAMPLE_TEXT] * args.documents
+    results = [
+        measure("single", lambda: [anonymize(text) for text in texts], args.documents)
+    ]
+    n_process = 1
+    while n_process <= args.max_processes:
+        results.append(
+            measure(
+                f"batch n_process={n_process}",
+                lambda: list(
+                    anonymize_batch(texts, batch_size=args.batch_size, n_process=n_process)
+                ),
+                args.documents,
+            )
+        )
+        n_process *= 2
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Measures peak RSS and time of recognize_entities as documents grow, with and without
+chunking. Each measurement runs in a fresh process so peak RSS is not shared."""
+
+import argparse
+import json
+import subprocess
+import sys
+
+PARAGRAPH = (
+    "John Smith from Acme Corporation located in New York City called me at "
+    "john.smith@acme.com. He asked about the invoice sent to Globex last Tuesday.\n\n"
+)
+
+MEASURE = """
+import json, resource, sys, time
+from text_anonymizer.core import recognize_entities
+from text_anonymizer.model import warm_up
+warm_up()
+text = {paragraph!r} * {repeat}
+start = time.perf_counter()
+entities = recognize_entities(text, chunk_size={chunk_size})
+print(json.dumps({{
+    "characters": len(text),
+    "entities": len(entities),
+    "seconds": time.perf_counter() - start,
+    "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}}))
+"""
+
+
+def measure(repeat: int, chunk_size) -> dict:
+    code = MEASURE.format(paragraph=PARAGRAPH, repeat=repeat, chunk_size=chunk_size)
+    output = subprocess.run(
+        [sys.executable, "-c", code], check=True, capture_output=True, text=True
+    ).stdout
+    return {"chunk_size": chunk_size, **json.loads(output)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[100, 1000, 5000], help="Paragraphs per document"
+    )
+    parser.add_argument("--chunk_size", type=int, default=100_000, help="Chunk size to compare")
+    args = parser.parse_args()
+
+    results = []
+    for repeat in args.sizes:
+        results.append(measure(repeat, args.chunk_size))
+        if len(PARAGRAPH) * repeat < 1_000_000:
+            results.append(measure(repeat, None))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
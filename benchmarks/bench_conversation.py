@@ -0,0 +1,44 @@
+"""Compares re-anonymizing a whole chat transcript on every turn with a Conversation.
+
+Reports the total time over --turns turns and the time of the last turn for both approaches.
+"""
+
+import argparse
+import json
+import time
+
+from corpus import generate_corpus
+
+from text_anonymizer.anonymizer import Anonymizer
+from text_anonymizer.conversation import Conversation
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--turns", type=int, default=50, help="Turns in the conversation")
+    parser.add_argument("--words", type=int, default=80, help="Words per turn")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the corpus generator")
+    args = parser.parse_args()
+
+    turns = generate_corpus(args.turns, args.words, 5, args.seed)
+    anonymizer = Anonymizer()
+    anonymizer.model.warm_up()
+
+    def full_transcript(history):
+        return anonymizer.anonymize("\n\n".join(history))
+
+    conversation = Conversation(anonymizer)
+    results = {}
+    for name, step in (("full_transcript", full_transcript), ("conversation", conversation.sync)):
+        total = last = 0.0
+        for turn in range(1, args.turns + 1):
+            start = time.perf_counter()
+            step(turns[:turn])
+            last = time.perf_counter() - start
+            total += last
+        results[name] = {"total_seconds": total, "last_turn_ms": last * 1000}
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
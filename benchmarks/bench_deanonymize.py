@@ -0,0 +1,62 @@
+"""Compares deanonymization time of the previous replace-per-map-entry loop with the
+single-pass placeholder scan for growing anonymization maps."""
+
+import argparse
+import json
+import time
+
+from text_anonymizer.core import deanonymize
+
+
+def make_input(entries: int, placeholders_in_text: int):
+    anonymization_map = {f"[ENTITY_PERSON_{n}]": f"Person {n}" for n in range(1, entries + 1)}
+    step = max(entries // placeholders_in_text, 1)
+    text = " ".join(
+        f"[ENTITY_PERSON_{n}] replied to the thread." for n in range(1, entries + 1, step)
+    )
+    return text, anonymization_map
+
+
+def replace_per_entry(text, anonymization_map):
+    for placeholder, original_text in anonymization_map.items():
+        text = text.replace(placeholder, original_text)
+    return text
+
+
+def timed(function, *args) -> float:
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--map_sizes",
+        type=int,
+        nargs="+",
+        default=[10, 100, 1_000, 10_000, 50_000],
+        help="Entries per anonymization map",
+    )
+    parser.add_argument(
+        "--placeholders", type=int, default=1_000, help="Placeholders in the text"
+    )
+    args = parser.parse_args()
+
+    results = []
+    for entries in args.map_sizes:
+        text, anonymization_map = make_input(entries, args.placeholders)
+        assert deanonymize(text, anonymization_map) == replace_per_entry(text, anonymization_map)
+        results.append(
+            {
+                "map_entries": entries,
+                "characters": len(text),
+                "single_pass_seconds": timed(deanonymize, text, anonymization_map),
+                "replace_per_entry_seconds": timed(replace_per_entry, text, anonymization_map),
+            }
+        )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Compares the full, auto and fast detection tiers on a mix of prose and status messages.
+
+Reports throughput, the fraction of documents that skipped NER, and how many of the entities
+found with detection="full" each tier finds as well.
+"""
+
+import argparse
+import json
+import random
+import time
+
+from corpus import generate_corpus, generate_status_messages
+
+from text_anonymizer.core import recognize_spans_batch
+from text_anonymizer.instrumentation import default_instrumentation
+from text_anonymizer.model import default_manager
+
+
+def measure(texts, detection: str, batch_size: int, full=None) -> dict:
+    default_instrumentation.reset()
+    start = time.perf_counter()
+    results = list(recognize_spans_batch(texts, batch_size=batch_size, detection=detection))
+    elapsed = time.perf_counter() - start
+    counters = default_instrumentation.snapshot()["counters"]
+    report = {
+        "detection": detection,
+        "docs_per_second": len(texts) / elapsed,
+        "ner_skipped_fraction": counters.get("ner_skipped", 0) / counters["documents"],
+    }
+    if full is not None:
+        expected = sum(len(entities) for entities in full)
+        found = sum(len(set(a) & set(b)) for a, b in zip(results, full))
+        report["recall_vs_full"] = found / expected if expected else 1.0
+    return report, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--documents", type=int, default=2000, help="Documents in the corpus")
+    parser.add_argument("--words", type=int, default=30, help="Words per prose document")
+    parser.add_argument("--status_share", type=float, default=0.7, help="Share of status messages")
+    parser.add_argument("--batch_size", type=int, default=256, help="Texts per nlp.pipe batch")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the corpus generator")
+    args = parser.parse_args()
+
+    status = int(args.documents * args.status_share)
+    texts = generate_status_messages(status, args.seed) + generate_corpus(
+        args.documents - status, args.words, 5, args.seed
+    )
+    random.Random(args.seed).shuffle(texts)
+
+    default_manager.warm_up()
+    default_instrumentation.enable()
+    full_report, full = measure(texts, "full", args.batch_size)
+    results = [full_report]
+    for detection in ("auto", "fast"):
+        results.append(measure(texts, detection, args.batch_size, full)[0])
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
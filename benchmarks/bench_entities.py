@@ -0,0 +1,92 @@
+"""Compares time and retained memory per million entities of entity dictionaries, the
+previous representation, with Entity spans and their dictionary view."""
+
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+
+from text_anonymizer.entities import Entity, by_start, to_dicts
+
+LINE = "Order {index} for Globex, contact user{index}@example.com on 2024-08-26\n"
+
+
+def make_matches(count: int):
+    # Raw (type, start, end) matches as a recognizer would find them, in the order of
+    # two recognizers that each scan the whole text.
+    parts = []
+    emails = []
+    companies = []
+    position = 0
+    for index in range((count + 1) // 2):
+        line = LINE.format(index=index)
+        companies.append(("COMPANY", position + line.index("Globex"), position + line.index(",")))
+        emails.append(("EMAIL", position + line.index("user"), position + line.index(" on")))
+        parts.append(line)
+        position += len(line)
+    return "".join(parts), (emails + companies)[:count]
+
+
+def best_of(repeat: int, run, documents) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for document in documents:
+            run(document)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def retained_mb(run, matches) -> float:
+    # Memory held by the entities of one large batch, e.g. collected batch results.
+    gc.collect()
+    tracemalloc.start()
+    entities = run(matches)
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del entities
+    return retained / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entities", type=int, default=1_000_000, help="Entities to produce")
+    parser.add_argument("--per_document", type=int, default=50, help="Entities per document")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing runs; the best is kept")
+    args = parser.parse_args()
+
+    text, matches = make_matches(args.entities)
+    documents = [
+        matches[start : start + args.per_document]
+        for start in range(0, len(matches), args.per_document)
+    ]
+
+    def dicts(document):
+        entities = [
+            {"type": entity_type, "start": start, "end": end, "text": text[start:end]}
+            for entity_type, start, end in document
+        ]
+        entities.sort(key=lambda x: x["start"])
+        return entities
+
+    def spans(document):
+        entities = [Entity(entity_type, start, end) for entity_type, start, end in document]
+        entities.sort(key=by_start)
+        return entities
+
+    def spans_as_dicts(document):
+        return to_dicts(text, spans(document))
+
+    scale = 1_000_000 / len(matches)
+    results = {"entities": len(matches), "per_document": args.per_document}
+    for label, run in (("dicts", dicts), ("spans", spans), ("spans_as_dicts", spans_as_dicts)):
+        results[label] = {
+            "seconds_per_million": best_of(args.repeat, run, documents) * scale,
+            "retained_mb_per_million": retained_mb(run, matches) * scale,
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Compares the size and read time of anonymization maps in each map format.
+
+Writes one map with --map_size entries per format, then times reading the whole map and reading
+only the entries a text with --placeholders placeholders needs.
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from corpus import generate_anonymized
+
+from text_anonymizer.mapfile import MAP_FORMATS, load_map, write_map
+
+
+def best_of(repeat: int, function) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--map_size", type=int, default=100_000, help="Entries in the map")
+    parser.add_argument("--placeholders", type=int, default=50, help="Placeholders in the text")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement")
+    args = parser.parse_args()
+
+    (_, anonymization_map), = generate_anonymized(1, 0, args.map_size, 0)
+    keys = random.Random(0).sample(list(anonymization_map), args.placeholders)
+    text = " and ".join(keys)
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for fmt in MAP_FORMATS:
+            path = os.path.join(directory, f"map.{fmt}")
+            write_seconds = best_of(1, lambda: write_map(path, anonymization_map, fmt))
+            results.append(
+                {
+                    "format": fmt,
+                    "file_mb": os.path.getsize(path) / 1024 / 1024,
+                    "write_seconds": write_seconds,
+                    "load_all_ms": best_of(args.repeat, lambda: load_map(path)) * 1000,
+                    "load_for_text_ms": best_of(args.repeat, lambda: load_map(path, text)) * 1000,
+                }
+            )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Compares import time, first-call latency, load time and per-document latency of the full
+and NER-only pipelines."""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+from text_anonymizer.model import DEFAULT_EXCLUDE, DEFAULT_MODEL, ModelManager
+
+SAMPLE_TEXT = (
+    "John Smith from Acme Corporation located in New York City called me at "
+    "john.smith@acme.com about the contract signed last Tuesday."
+)
+
+
+FIRST_CALL = """
+import sys, time
+start = time.perf_counter()
+import text_anonymizer
+imported = time.perf_counter()
+if sys.argv[1] == "eager":
+    text_anonymizer.warm_up()
+ready = time.perf_counter()
+text_anonymizer.anonymize(sys.argv[2])
+print(imported - start, ready - imported, time.perf_counter() - ready)
+"""
+
+
+def measure_first_call(mode: str) -> dict:
+    """Times a fresh process: the import, the warm-up if ``mode`` is eager, the first call."""
+    output = subprocess.run(
+        [sys.executable, "-c", FIRST_CALL, mode, SAMPLE_TEXT],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    import_time, warm_up_time, first_call = map(float, output.split())
+    return {
+        "import_seconds": import_time,
+        "warm_up_seconds": warm_up_time,
+        "first_call_seconds": first_call,
+    }
+
+
+def measure_build(model_name: str, exclude, documents: int) -> dict:
+    manager = ModelManager(model_name=model_name, exclude=exclude)
+    start = time.perf_counter()
+    nlp = manager.get()
+    load_time = time.perf_counter() - start
+
+    nlp(SAMPLE_TEXT)
+    start = time.perf_counter()
+    for _ in range(documents):
+        nlp(SAMPLE_TEXT)
+    per_document = (time.perf_counter() - start) / documents
+
+    return {
+        "components": nlp.pipe_names,
+        "load_seconds": load_time,
+        "per_document_ms": per_document * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="spaCy pipeline to measure")
+    parser.add_argument("--documents", type=int, default=200, help="Documents per build")
+    args = parser.parse_args()
+
+    results = {
+        "lazy": measure_first_call("lazy"),
+        "eager": measure_first_call("eager"),
+        "full": measure_build(args.model, (), args.documents),
+        "ner_only": measure_build(args.model, DEFAULT_EXCLUDE, args.documents),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Measures service throughput and latency with and without request micro-batching."""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from text_anonymizer.server import AnonymizationServer
+
+SAMPLE_TEXT = (
+    "Ticket from John Smith (john.smith@acme.com): the Acme Corporation portal at "
+    "https://portal.acme.com has been down since Monday in New York City."
+)
+
+
+async def request(port: int, body: bytes) -> float:
+    start = time.perf_counter()
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(
+        b"POST /anonymize HTTP/1.1\r\nConnection: close\r\n"
+        + f"Content-Length: {len(body)}\r\n\r\n".encode()
+        + body
+    )
+    await writer.drain()
+    await reader.read()
+    writer.close()
+    return time.perf_counter() - start
+
+
+async def measure(max_batch_size: int, max_wait: float, requests: int, concurrency: int) -> dict:
+    server = AnonymizationServer(max_batch_size=max_batch_size, max_wait=max_wait)
+    server.anonymizer.model.warm_up()
+    listener = await server.start(port=0)
+    port = listener.sockets[0].getsockname()[1]
+    body = json.dumps({"text": SAMPLE_TEXT}).encode()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited():
+        async with semaphore:
+            return await request(port, body)
+
+    start = time.perf_counter()
+    latencies = sorted(await asyncio.gather(*(limited() for _ in range(requests))))
+    elapsed = time.perf_counter() - start
+    await server.stop()
+    return {
+        "max_batch_size": max_batch_size,
+        "max_wait_ms": max_wait * 1000,
+        "requests_per_second": requests / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "mean_batch_size": server.batcher.batched_texts / server.batcher.batches,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per run")
+    parser.add_argument("--concurrency", type=int, default=64, help="Requests in flight")
+    parser.add_argument("--max_wait_ms", type=float, default=5, help="Batching window")
+    args = parser.parse_args()
+
+    results = [
+        asyncio.run(measure(size, args.max_wait_ms / 1000, args.requests, args.concurrency))
+        for size in (1, 16, 64)
+    ]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
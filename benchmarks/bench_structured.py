@@ -0,0 +1,66 @@
+"""Compares anonymizing the fields of records one call at a time with anonymize_structured.
+
+The records are support tickets with an ID, an amount, a date, a customer name and a message.
+Reports the records per second of anonymizing every field with its own ``anonymize`` call, and
+of ``anonymize_structured``, which sends the text fields of a batch through one ``nlp.pipe``
+call and only scans the other fields with the pattern recognizers.
+"""
+
+import argparse
+import json
+import random
+import time
+
+from corpus import generate_corpus
+
+from text_anonymizer.anonymizer import Anonymizer
+from text_anonymizer.structured import anonymize_structured, iter_fields
+
+
+def generate_records(count, words, seed):
+    rng = random.Random(seed)
+    messages = generate_corpus(count, words, 5, seed)
+    return [
+        {
+            "id": 100000 + index,
+            "amount": round(rng.uniform(1, 1000), 2),
+            "date": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            "customer": {"name": message.split(".")[0][:40], "tier": rng.choice(["gold", "free"])},
+            "message": message,
+        }
+        for index, message in enumerate(messages)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--records", type=int, default=2000, help="Records to anonymize")
+    parser.add_argument("--words", type=int, default=60, help="Words per message")
+    parser.add_argument("--batch_size", type=int, default=256, help="Records per batch")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the corpus generator")
+    args = parser.parse_args()
+
+    records = generate_records(args.records, args.words, args.seed)
+    anonymizer = Anonymizer()
+    anonymizer.model.warm_up()
+
+    def per_field():
+        for record in records:
+            for _, value in iter_fields(record):
+                anonymizer.anonymize(str(value))
+
+    def structured():
+        for _ in anonymize_structured(records, anonymizer=anonymizer, batch_size=args.batch_size):
+            pass
+
+    results = {}
+    for name, run in (("per_field", per_field), ("structured", structured)):
+        start = time.perf_counter()
+        run()
+        seconds = time.perf_counter() - start
+        results[name] = {"seconds": seconds, "records_per_second": args.records / seconds}
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Compares placeholder substitution time of the previous per-entity string rebuild with
+the single-pass rewrite for documents with 10 to 100k entities."""
+
+import argparse
+import json
+import time
+
+from text_anonymizer.core import _replace_entities
+from text_anonymizer.entities import from_dicts
+
+LINE = "2024-08-26,{index},user{index}@example.com,ok\n"
+
+
+def make_document(entities: int):
+    parts = []
+    spans = []
+    position = 0
+    for index in range(entities):
+        line = LINE.format(index=index)
+        start = position + line.index("user")
+        end = position + line.index(",ok")
+        email = line[start - position : end - position]
+        spans.append({"type": "EMAIL", "start": start, "end": end, "text": email})
+        parts.append(line)
+        position += len(line)
+    return "".join(parts), spans
+
+
+def rebuild_per_entity(text, entities):
+    anonymization_map = {}
+    entity_counters = {}
+    for entity in reversed(entities):
+        entity_type = entity["type"]
+        entity_counters[entity_type] = entity_counters.get(entity_type, 0) + 1
+        placeholder = f"[ENTITY_{entity_type}_{entity_counters[entity_type]}]"
+        anonymization_map[placeholder] = entity["text"]
+        text = text[: entity["start"]] + placeholder + text[entity["end"] :]
+    return text, anonymization_map
+
+
+def timed(function, *args) -> float:
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--entities",
+        type=int,
+        nargs="+",
+        default=[10, 100, 1_000, 10_000, 100_000],
+        help="Entities per document",
+    )
+    parser.add_argument(
+        "--max_rebuild", type=int, default=20_000, help="Largest size run with the old algorithm"
+    )
+    args = parser.parse_args()
+
+    results = []
+    for entities in args.entities:
+        text, spans = make_document(entities)
+        result = {
+            "entities": entities,
+            "characters": len(text),
+            "single_pass_seconds": timed(_replace_entities, text, from_dicts(spans)),
+        }
+        if entities <= args.max_rebuild:
+            result["rebuild_per_entity_seconds"] = timed(rebuild_per_entity, text, spans)
+        results.append(result)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Measures entity vault lookups in both directions, in memory and in SQLite.
+
+Fills a vault with --values distinct values, then times assigning placeholders to known values
+and restoring values from placeholders, and reports the size of the SQLite database.
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from text_anonymizer.vault import EntityVault, SQLiteEntityVault
+
+TYPES = ["PERSON", "ORG", "GPE", "EMAIL"]
+
+
+def measure(vault, values: int, lookups: int, batch: int) -> dict:
+    entities = [(TYPES[i % len(TYPES)], f"value {i}") for i in range(values)]
+    start = time.perf_counter()
+    for i in range(0, values, batch):
+        vault.placeholders(entities[i : i + batch])
+    fill_seconds = time.perf_counter() - start
+
+    rng = random.Random(0)
+    sample = [entities[rng.randrange(values)] for _ in range(lookups)]
+    start = time.perf_counter()
+    placeholders = [vault.placeholder(*entity) for entity in sample]
+    placeholder_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    for placeholder in placeholders:
+        vault[placeholder]
+    value_seconds = time.perf_counter() - start
+    return {
+        "values": values,
+        "fill_values_per_second": values / fill_seconds,
+        "value_to_placeholder_us": placeholder_seconds / lookups * 1e6,
+        "placeholder_to_value_us": value_seconds / lookups * 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--values", type=int, default=1_000_000, help="Distinct values")
+    parser.add_argument("--lookups", type=int, default=100_000, help="Lookups per direction")
+    parser.add_argument("--batch", type=int, default=1000, help="Values assigned per call")
+    args = parser.parse_args()
+
+    results = {"memory": measure(EntityVault(), args.values, args.lookups, args.batch)}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "vault.db")
+        vault = SQLiteEntityVault(path)
+        results["sqlite"] = measure(vault, args.values, args.lookups, args.batch)
+        vault.close()
+        results["sqlite"]["database_mb"] = os.path.getsize(path) / 1024 / 1024
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
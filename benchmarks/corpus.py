@@ -0,0 +1,135 @@
+"""Deterministic synthetic corpora for the benchmarks.
+
+The same arguments always produce the same documents, so runs on different commits or
+machines measure the same work.
+"""
+
+import random
+from typing import Dict, List, Tuple
+
+FIRST_NAMES = ["John", "Maria", "Wei", "Fatima", "Lars", "Priya", "Carlos", "Aiko", "Omar", "Emma"]
+LAST_NAMES = ["Smith", "Garcia", "Chen", "Khan", "Larsen", "Patel", "Silva", "Tanaka", "Haddad"]
+COMPANIES = ["Acme Corporation", "Globex", "Initech", "Umbrella Corp", "Stark Industries", "Hooli"]
+CITIES = ["New York City", "Berlin", "Tokyo", "London", "Paris", "Toronto", "Sydney", "Madrid"]
+FILLER = (
+    "the report was reviewed and the team agreed to follow up next week on the open items "
+    "while the budget stays unchanged and the schedule is confirmed for the next quarter"
+).split()
+ENTITY_TYPES = ["PERSON", "ORG", "GPE", "EMAIL", "URL", "DATE"]
+
+
+def _entity(rng: random.Random) -> str:
+    kind = rng.randrange(5)
+    first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    if kind == 0:
+        return f"{first} {last}"
+    if kind == 1:
+        return rng.choice(COMPANIES)
+    if kind == 2:
+        return rng.choice(CITIES)
+    if kind == 3:
+        return f"{first.lower()}.{last.lower()}@example.com"
+    return f"https://{last.lower()}.example.com/{rng.randrange(1000)}"
+
+
+def generate_document(rng: random.Random, words: int, density: float) -> str:
+    """
+    Generates one document.
+
+    Args:
+        rng: The random source.
+        words: The approximate number of words.
+        density: Entities per 100 words.
+
+    Returns:
+        The document, in sentences of about twelve words.
+    """
+    parts: List[str] = []
+    sentence = 0
+    for _ in range(words):
+        if rng.random() < density / 100:
+            parts.append(_entity(rng))
+        else:
+            word = rng.choice(FILLER)
+            # Sentences start with a capital; entities keep their own capitalization.
+            parts.append(word.capitalize() if sentence == 0 else word)
+        sentence += 1
+        if sentence >= 12:
+            parts[-1] += "."
+            sentence = 0
+    if parts and not parts[-1].endswith("."):
+        parts[-1] += "."
+    return " ".join(parts)
+
+
+def generate_corpus(documents: int, words: int, density: float, seed: int = 0) -> List[str]:
+    """
+    Generates a corpus of documents with the given length and entity density.
+
+    Args:
+        documents: The number of documents.
+        words: The approximate number of words per document.
+        density: Entities per 100 words.
+        seed: The random seed.
+
+    Returns:
+        The documents.
+    """
+    rng = random.Random(seed)
+    return [generate_document(rng, words, density) for _ in range(documents)]
+
+
+def generate_anonymized(
+    documents: int, words: int, map_size: int, density: float, seed: int = 0
+) -> List[Tuple[str, Dict[str, str]]]:
+    """
+    Generates anonymized documents that share one large anonymization map.
+
+    Args:
+        documents: The number of documents.
+        words: The approximate number of words per document.
+        map_size: The number of entries in the map.
+        density: Placeholders per 100 words.
+        seed: The random seed.
+
+    Returns:
+        ``(anonymized_text, anonymization_map)`` pairs.
+    """
+    rng = random.Random(seed)
+    anonymization_map = {
+        f"[ENTITY_{ENTITY_TYPES[i % len(ENTITY_TYPES)]}_{i // len(ENTITY_TYPES) + 1}]": _entity(rng)
+        for i in range(map_size)
+    }
+    placeholders = list(anonymization_map)
+    pairs = []
+    for _ in range(documents):
+        parts = [
+            rng.choice(placeholders) if rng.random() < density / 100 else rng.choice(FILLER)
+            for _ in range(words)
+        ]
+        pairs.append((" ".join(parts), anonymization_map))
+    return pairs
+
+
+STATUS_WORDS = (
+    "connection refused retrying worker stopped queue drained cache miss request timed out "
+    "health check passed job finished without errors backend unavailable disk almost full"
+).split()
+
+
+def generate_status_messages(documents: int, seed: int = 0) -> List[str]:
+    """
+    Generates short, lowercase status messages without entities, as found in logs.
+
+    Args:
+        documents: The number of messages.
+        seed: The random seed.
+
+    Returns:
+        The messages.
+    """
+    rng = random.Random(seed)
+    return [
+        " ".join(rng.choice(STATUS_WORDS) for _ in range(rng.randrange(3, 10)))
+        for _ in range(documents)
+    ]
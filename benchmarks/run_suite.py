@@ -0,0 +1,215 @@
+"""Runs the benchmark suite on a synthetic corpus and compares it against a baseline.
+
+Measures import and model load time, per-document latency percentiles, throughput and peak
+memory of recognize_entities, anonymize, anonymize_batch and deanonymize, and the wall time of
+the CLI. Results are written as JSON. With --compare, metrics that got worse than the baseline
+by more than --threshold are reported and the exit status is 1.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from corpus import generate_anonymized, generate_corpus
+
+# Metric name suffixes and whether larger values are better.
+DIRECTIONS = {"_ms": False, "_seconds": False, "_mb": False, "_per_second": True}
+
+
+def run_python(code: str) -> float:
+    output = subprocess.run(
+        [sys.executable, "-c", code], check=True, capture_output=True, text=True
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def measure_startup() -> dict:
+    import_seconds = run_python(
+        "import time; t = time.perf_counter(); import text_anonymizer; "
+        "print(time.perf_counter() - t)"
+    )
+    load_seconds = run_python(
+        "import time; from text_anonymizer.model import default_manager; "
+        "t = time.perf_counter(); default_manager.get(); print(time.perf_counter() - t)"
+    )
+    return {"import_seconds": import_seconds, "model_load_seconds": load_seconds}
+
+
+def percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def measure_per_document(function, inputs) -> dict:
+    latencies = []
+    start = time.perf_counter()
+    for item in inputs:
+        started = time.perf_counter()
+        function(item)
+        latencies.append(time.perf_counter() - started)
+    elapsed = time.perf_counter() - start
+    return {
+        "docs_per_second": len(inputs) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "peak_memory_mb": peak_memory(function, inputs[: max(1, len(inputs) // 10)]),
+    }
+
+
+def peak_memory(function, inputs) -> float:
+    # Traced separately, on a sample: tracing slows allocation-heavy code down a lot.
+    tracemalloc.start()
+    for item in inputs:
+        function(item)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024 / 1024
+
+
+def measure_batch(function, texts) -> dict:
+    start = time.perf_counter()
+    for _ in function(texts):
+        pass
+    return {"docs_per_second": len(texts) / (time.perf_counter() - start)}
+
+
+def measure_cli(texts) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        text_file = os.path.join(directory, "input.txt")
+        with open(text_file, "w") as f:
+            f.write("\n\n".join(texts[:10]))
+        jsonl_file = os.path.join(directory, "input.jsonl")
+        with open(jsonl_file, "w") as f:
+            f.writelines(json.dumps({"text": text}) + "\n" for text in texts)
+
+        def cli(*args) -> float:
+            command = [sys.executable, "-m", "text_anonymizer.main", "anonymize", *args]
+            start = time.perf_counter()
+            subprocess.run(command, check=True, capture_output=True)
+            return time.perf_counter() - start
+
+        return {
+            "text_file_seconds": cli(
+                "--input_file", text_file, "--output_file", os.path.join(directory, "out.txt")
+            ),
+            "jsonl_stream_seconds": cli(
+                "--input_file",
+                jsonl_file,
+                "--output_file",
+                os.path.join(directory, "out.jsonl"),
+                "--format",
+                "jsonl",
+            ),
+        }
+
+
+def run(args) -> dict:
+    import spacy
+
+    from text_anonymizer.core import anonymize, anonymize_batch, deanonymize, recognize_entities
+    from text_anonymizer.model import default_manager
+
+    texts = generate_corpus(args.documents, args.words, args.density, args.seed)
+    anonymized = generate_anonymized(
+        args.documents, args.words, args.map_size, args.density, args.seed
+    )
+    results = {"startup": measure_startup()}
+    default_manager.warm_up()
+    results["recognize_entities"] = measure_per_document(recognize_entities, texts)
+    results["anonymize"] = measure_per_document(anonymize, texts)
+    results["anonymize_batch"] = measure_batch(anonymize_batch, texts)
+    results["deanonymize"] = measure_per_document(lambda pair: deanonymize(*pair), anonymized)
+    if not args.skip_cli:
+        results["cli"] = measure_cli(texts)
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "spacy": spacy.__version__,
+            "model": default_manager.model_name,
+        },
+        "corpus": {
+            "documents": args.documents,
+            "words": args.words,
+            "density": args.density,
+            "map_size": args.map_size,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list:
+    """Lists the metrics that got worse than the baseline by more than ``threshold``."""
+    regressions = []
+    for group, metrics in current["results"].items():
+        for name, value in metrics.items():
+            previous = baseline.get("results", {}).get(group, {}).get(name)
+            higher_is_better = next(
+                (better for suffix, better in DIRECTIONS.items() if name.endswith(suffix)), None
+            )
+            if not previous or higher_is_better is None:
+                continue
+            change = (value - previous) / previous
+            if (-change if higher_is_better else change) > threshold:
+                regressions.append(
+                    {
+                        "metric": f"{group}.{name}",
+                        "baseline": previous,
+                        "current": value,
+                        "change": change,
+                    }
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--documents", type=int, default=200, help="Documents in the corpus")
+    parser.add_argument("--words", type=int, default=200, help="Words per document")
+    parser.add_argument("--density", type=float, default=5, help="Entities per 100 words")
+    parser.add_argument("--map_size", type=int, default=1000, help="Entries in the deanonymize map")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the corpus generator")
+    parser.add_argument("--skip_cli", action="store_true", help="Do not measure the CLI")
+    parser.add_argument("--output", help="Write the results to this file instead of stdout")
+    parser.add_argument("--compare", help="Baseline results to compare against")
+    parser.add_argument(
+        "--threshold", type=float, default=0.1, help="Relative change counted as a regression"
+    )
+    args = parser.parse_args()
+
+    report = run(args)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get("corpus") != report["corpus"]:
+            print("Warning: the baseline was measured on a different corpus", file=sys.stderr)
+        report["regressions"] = compare(report, baseline, args.threshold)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    for regression in report.get("regressions", []):
+        print(
+            f"Regression: {regression['metric']} {regression['baseline']:.4g} -> "
+            f"{regression['current']:.4g} ({regression['change']:+.0%})",
+            file=sys.stderr,
+        )
+    if report.get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,119 +1,444 @@
-import os
+"""Measures how anonymization affects LLM answers, and what it costs in latency.
+
+Every document of a corpus is summarized and questioned twice: once as it is, and once
+anonymized, with the responses de-anonymized afterwards. The report compares the answers and
+the time spent anonymizing and de-anonymizing with the time spent waiting for the model.
+
+Model calls run concurrently, bounded by ``--concurrency``, and responses are cached on disk by
+a hash of the client and prompt, so re-running an evaluation only calls the model for new
+prompts. ``--client echo`` replaces the API with a deterministic local stand-in, which needs
+neither network nor API key.
+"""
+
+import argparse
+import asyncio
+import hashlib
 import json
+import os
+import re
+import tempfile
+import time
 from datetime import datetime
-from anthropic import Anthropic, HUMAN_PROMPT, AI_PROMPT
-from text_anonymizer.core import anonymize, deanonymize
-
-def get_llm_response(anthropic, prompt):
-    response = anthropic.completions.create(
-        model="claude-2",
-        max_tokens_to_sample=300,
-        prompt=prompt
-    )
-    return response.completion.strip()
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from text_anonymizer.anonymizer import Anonymizer
+from text_anonymizer.core import deanonymize, find_unknown_placeholders
+
+DEFAULT_DOCUMENT = """
+From: Sarah Johnson <sarah.johnson@techinnovate.com>
+To: Michael Chen <michael.chen@globex.com>
+Subject: Proposal for AI-driven Supply Chain Optimization
+
+Dear Michael,
+
+I hope this email finds you well. I'm reaching out to discuss an exciting opportunity for Globex
+Corporation to revolutionize its supply chain management using cutting-edge AI technology.
+
+Our team at TechInnovate Solutions has developed a state-of-the-art AI system that can
+significantly improve inventory forecasting, reduce logistics costs, and optimize warehouse
+operations. We believe this solution could save Globex up to 15% in annual supply chain expenses.
+
+Key benefits of our AI-driven system include:
+1. Real-time demand forecasting with 95% accuracy
+2. Automated inventory replenishment
+3. Dynamic route optimization for deliveries
+4. Predictive maintenance for warehouse equipment
+
+I'd love to schedule a meeting to discuss this further. Are you available next Tuesday at 2 PM EST
+for a video call? If not, please suggest a time that works better for you.
+
+Looking forward to potentially working together to transform Globex's supply chain operations.
+
+Best regards,
+Sarah Johnson
+Senior Solutions Architect
+TechInnovate Solutions
+Phone: +1 (555) 123-4567
+"""
+
+DEFAULT_QUESTIONS = [
+    "Who is the sender of the email?",
+    "What company does the sender work for?",
+    "Who is the recipient of the email?",
+    "What company does the recipient work for?",
+    "What is the main purpose of the email?",
+    "What are the key benefits of the AI-driven system mentioned in the email?",
+    "What is the proposed meeting time?",
+]
+
+SUMMARY_INSTRUCTION = "Please summarize the following text in 3-4 sentences:"
+QUESTION_INSTRUCTION = "Based on the following text, please answer this question:"
+
+_WORD = re.compile(r"\w+")
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+|\n+")
+
 
-def evaluate_anonymization_effect():
-    api_key = os.environ.get("ANTHROPIC_API_KEY")
-    if not api_key:
-        raise ValueError("Anthropic API key not set in environment variables")
+def summary_prompt(text: str) -> str:
+    """Builds the prompt asking for a summary of a text."""
+    return f"{SUMMARY_INSTRUCTION}\n\n{text.strip()}"
 
-    anthropic = Anthropic(api_key=api_key)
-    
-    original_text = """
-    From: Sarah Johnson <sarah.johnson@techinnovate.com>
-    To: Michael Chen <michael.chen@globex.com>
-    Subject: Proposal for AI-driven Supply Chain Optimization
 
-    Dear Michael,
+def question_prompt(question: str, text: str) -> str:
+    """Builds the prompt asking a question about a text."""
+    return f"{QUESTION_INSTRUCTION} {question}\n\nText: {text.strip()}"
 
-    I hope this email finds you well. I'm reaching out to discuss an exciting opportunity for Globex Corporation to revolutionize its supply chain management using cutting-edge AI technology.
 
-    Our team at TechInnovate Solutions has developed a state-of-the-art AI system that can significantly improve inventory forecasting, reduce logistics costs, and optimize warehouse operations. We believe this solution could save Globex up to 15% in annual supply chain expenses.
+class AnthropicClient:
+    """
+    Answers prompts with a model of the Anthropic Messages API.
+
+    Args:
+        model: The model to use.
+        max_tokens: The most tokens per response.
+        api_key: Defaults to the ``ANTHROPIC_API_KEY`` environment variable.
+    """
+
+    def __init__(
+        self,
+        model: str = "claude-3-haiku-20240307",
+        max_tokens: int = 300,
+        api_key: Optional[str] = None,
+    ):
+        from anthropic import AsyncAnthropic
+
+        api_key = api_key or os.environ.get("ANTHROPIC_API_KEY")
+        if not api_key:
+            raise ValueError("Anthropic API key not set in environment variables")
+        self._client = AsyncAnthropic(api_key=api_key)
+        self.model = model
+        self.max_tokens = max_tokens
+        self.name = f"anthropic:{model}:{max_tokens}"
 
-    Key benefits of our AI-driven system include:
-    1. Real-time demand forecasting with 95% accuracy
-    2. Automated inventory replenishment
-    3. Dynamic route optimization for deliveries
-    4. Predictive maintenance for warehouse equipment
+    async def complete(self, prompt: str) -> str:
+        response = await self._client.messages.create(
+            model=self.model,
+            max_tokens=self.max_tokens,
+            messages=[{"role": "user", "content": prompt}],
+        )
+        return "".join(block.text for block in response.content if block.type == "text").strip()
 
-    I'd love to schedule a meeting to discuss this further. Are you available next Tuesday at 2 PM EST for a video call? If not, please suggest a time that works better for you.
 
-    Looking forward to potentially working together to transform Globex's supply chain operations.
+class EchoClient:
+    """
+    A deterministic local stand-in for a model, for tests and offline runs.
+
+    Summaries are the first sentences of the text, and answers the sentence of the text that
+    shares the most words with the question. Placeholders in the text are kept, so the
+    de-anonymization path is exercised like with a real model.
 
-    Best regards,
-    Sarah Johnson
-    Senior Solutions Architect
-    TechInnovate Solutions
-    Phone: +1 (555) 123-4567
+    Args:
+        latency: Seconds every call waits, to simulate a remote model.
+        sentences: The number of sentences per summary.
     """
 
-    anonymized_text, anonymization_map = anonymize(original_text)
-    
-    # Summarization task
-    summary_prompt = f"{HUMAN_PROMPT} Please summarize the following text in 3-4 sentences: {original_text}{AI_PROMPT}"
-    original_summary = get_llm_response(anthropic, summary_prompt)
-
-    anonymized_summary_prompt = f"{HUMAN_PROMPT} Please summarize the following text in 3-4 sentences: {anonymized_text}{AI_PROMPT}"
-    anonymized_summary = get_llm_response(anthropic, anonymized_summary_prompt)
-    deanonymized_summary = deanonymize(anonymized_summary, anonymization_map)
-
-    # Information retrieval task
-    retrieval_questions = [
-        "Who is the sender of the email?",
-        "What company does the sender work for?",
-        "Who is the recipient of the email?",
-        "What company does the recipient work for?",
-        "What is the main purpose of the email?",
-        "What are the key benefits of the AI-driven system mentioned in the email?",
-        "What is the proposed meeting time?",
+    name = "echo"
+
+    def __init__(self, latency: float = 0.0, sentences: int = 3):
+        self.latency = latency
+        self.sentences = sentences
+        self.calls = 0
+
+    async def complete(self, prompt: str) -> str:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        instruction, _, text = prompt.partition("\n\n")
+        if text.startswith("Text: "):
+            text = text[len("Text: ") :]
+        sentences = [s.strip() for s in _SENTENCE_BOUNDARY.split(text) if s.strip()]
+        if not instruction.startswith(QUESTION_INSTRUCTION):
+            return " ".join(sentences[: self.sentences])
+        question = set(_words(instruction[len(QUESTION_INSTRUCTION) :]))
+        return max(
+            sentences, key=lambda sentence: len(question & set(_words(sentence))), default=""
+        )
+
+
+class ResponseCache:
+    """
+    Caches model responses on disk, one file per hash of the client name and prompt.
+
+    Args:
+        directory: Where the responses are stored. It is created if it does not exist.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, client_name: str, prompt: str) -> str:
+        digest = hashlib.sha256(f"{client_name}\0{prompt}".encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def get(self, client_name: str, prompt: str) -> Optional[str]:
+        """Returns the cached response to a prompt, or ``None``."""
+        try:
+            with open(self._path(client_name, prompt)) as f:
+                return json.load(f)["response"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def put(self, client_name: str, prompt: str, response: str) -> None:
+        """Stores a response. Concurrent writers of the same prompt are safe."""
+        path = self._path(client_name, prompt)
+        fd, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"client": client_name, "prompt": prompt, "response": response}, f)
+        os.replace(temporary, path)
+
+
+def _words(text: str) -> List[str]:
+    return _WORD.findall(text.lower())
+
+
+def token_f1(expected: str, actual: str) -> float:
+    """The F1 score of the words two texts have in common, from 0 to 1."""
+    expected_words, actual_words = _words(expected), _words(actual)
+    if not expected_words or not actual_words:
+        return float(expected_words == actual_words)
+    remaining: Dict[str, int] = {}
+    for word in expected_words:
+        remaining[word] = remaining.get(word, 0) + 1
+    common = 0
+    for word in actual_words:
+        if remaining.get(word):
+            remaining[word] -= 1
+            common += 1
+    if not common:
+        return 0.0
+    precision, recall = common / len(actual_words), common / len(expected_words)
+    return 2 * precision * recall / (precision + recall)
+
+
+def _mean(values: Sequence[float]) -> Optional[float]:
+    return sum(values) / len(values) if values else None
+
+
+async def _complete(
+    client,
+    prompt: str,
+    semaphore: asyncio.Semaphore,
+    cache: Optional[ResponseCache],
+) -> Tuple[str, Optional[float]]:
+    # Returns the response and the seconds the model took, or None for cached responses.
+    if cache is not None:
+        response = cache.get(client.name, prompt)
+        if response is not None:
+            return response, None
+    async with semaphore:
+        start = time.perf_counter()
+        response = await client.complete(prompt)
+        seconds = time.perf_counter() - start
+    if cache is not None:
+        cache.put(client.name, prompt, response)
+    return response, seconds
+
+
+def load_corpus(path: str) -> List[Dict]:
+    """
+    Reads the documents to evaluate.
+
+    Args:
+        path: A JSON Lines file of ``{"text": ..., "questions": [...]}`` objects, where the
+            questions are optional, or a text file holding a single document.
+
+    Returns:
+        The documents, each with its questions; the default questions where none are given.
+    """
+    with open(path) as f:
+        if not path.endswith(".jsonl"):
+            return [{"text": f.read(), "questions": list(DEFAULT_QUESTIONS)}]
+        documents = [json.loads(line) for line in f if line.strip()]
+    return [
+        {"text": document["text"], "questions": document.get("questions", DEFAULT_QUESTIONS)}
+        for document in documents
     ]
 
-    original_answers = []
-    anonymized_answers = []
-
-    for question in retrieval_questions:
-        original_prompt = f"{HUMAN_PROMPT} Based on the following text, please answer this question: {question}\n\nText: {original_text}{AI_PROMPT}"
-        original_answers.append(get_llm_response(anthropic, original_prompt))
-
-        anonymized_prompt = f"{HUMAN_PROMPT} Based on the following text, please answer this question: {question}\n\nText: {anonymized_text}{AI_PROMPT}"
-        anonymized_answers.append(get_llm_response(anthropic, anonymized_prompt))
-
-    deanonymized_answers = [deanonymize(answer, anonymization_map) for answer in anonymized_answers]
-
-    evaluation_results = {
-        "original_text": original_text,
-        "anonymized_text": anonymized_text,
-        "original_summary": original_summary,
-        "anonymized_summary": anonymized_summary,
-        "deanonymized_summary": deanonymized_summary,
-        "retrieval_questions": retrieval_questions,
-        "original_answers": original_answers,
-        "anonymized_answers": anonymized_answers,
-        "deanonymized_answers": deanonymized_answers,
-        "summary_length_difference": abs(len(original_summary) - len(deanonymized_summary)),
+
+async def evaluate_corpus(
+    documents: Sequence[Dict],
+    client,
+    anonymizer: Optional[Anonymizer] = None,
+    concurrency: int = 8,
+    cache: Optional[ResponseCache] = None,
+) -> Dict:
+    """
+    Evaluates the effect of anonymization on the responses of a model.
+
+    Args:
+        documents: Documents as returned by :func:`load_corpus`.
+        client: The model: an object with a ``name`` and an async ``complete(prompt)``
+            method, such as :class:`AnthropicClient` or :class:`EchoClient`.
+        anonymizer: Anonymizes the documents. Defaults to one without company terms.
+        concurrency: The most model calls in flight at once.
+        cache: Caches responses across runs.
+
+    Returns:
+        The report: aggregate quality and latency metrics, and the results per document.
+    """
+    anonymizer = anonymizer or Anonymizer()
+    semaphore = asyncio.Semaphore(concurrency)
+    start = time.perf_counter()
+
+    anonymized = []
+    for document in documents:
+        anonymize_start = time.perf_counter()
+        anonymized_text, anonymization_map = anonymizer.anonymize(document["text"])
+        anonymized.append(
+            (anonymized_text, anonymization_map, time.perf_counter() - anonymize_start)
+        )
+
+    # All prompts of the corpus, original and anonymized, are sent at once; the semaphore
+    # keeps at most `concurrency` of them waiting on the model.
+    prompts = []
+    for document, (anonymized_text, _, _) in zip(documents, anonymized):
+        for text in (document["text"], anonymized_text):
+            prompts.append(summary_prompt(text))
+            prompts.extend(question_prompt(question, text) for question in document["questions"])
+    responses = await asyncio.gather(
+        *(_complete(client, prompt, semaphore, cache) for prompt in prompts)
+    )
+
+    results = []
+    position = 0
+    for document, (anonymized_text, anonymization_map, anonymize_seconds) in zip(
+        documents, anonymized
+    ):
+        calls = 1 + len(document["questions"])
+        original = responses[position : position + calls]
+        masked = responses[position + calls : position + 2 * calls]
+        position += 2 * calls
+
+        deanonymize_start = time.perf_counter()
+        restored = [deanonymize(response, anonymization_map) for response, _ in masked]
+        deanonymize_seconds = time.perf_counter() - deanonymize_start
+
+        original_summary, original_answers = original[0][0], [r for r, _ in original[1:]]
+        answer_scores = [
+            token_f1(expected, actual) for expected, actual in zip(original_answers, restored[1:])
+        ]
+        results.append(
+            {
+                "original_text": document["text"],
+                "anonymized_text": anonymized_text,
+                "entities_anonymized": len(anonymization_map),
+                "original_summary": original_summary,
+                "anonymized_summary": masked[0][0],
+                "deanonymized_summary": restored[0],
+                "retrieval_questions": list(document["questions"]),
+                "original_answers": original_answers,
+                "anonymized_answers": [r for r, _ in masked[1:]],
+                "deanonymized_answers": restored[1:],
+                "summary_length_difference": abs(len(original_summary) - len(restored[0])),
+                "summary_f1": token_f1(original_summary, restored[0]),
+                "answer_f1": answer_scores,
+                "unresolved_placeholders": sum(
+                    len(find_unknown_placeholders(response, anonymization_map))
+                    for response in restored
+                ),
+                "anonymize_ms": anonymize_seconds * 1000,
+                "deanonymize_ms": deanonymize_seconds * 1000,
+                "llm_original_ms": [s * 1000 for _, s in original if s is not None],
+                "llm_anonymized_ms": [s * 1000 for _, s in masked if s is not None],
+            }
+        )
+
+    return _report(client, results, responses, time.perf_counter() - start)
+
+
+def _report(client, results: List[Dict], responses, wall_seconds: float) -> Dict:
+    overhead = [result["anonymize_ms"] + result["deanonymize_ms"] for result in results]
+    llm_anonymized = [ms for result in results for ms in result["llm_anonymized_ms"]]
+    llm_per_document = _mean(
+        [sum(result["llm_anonymized_ms"]) for result in results if result["llm_anonymized_ms"]]
+    )
+    mean_overhead = _mean(overhead)
+    return {
+        "client": client.name,
+        "documents": len(results),
+        "calls": len(responses),
+        "cache_hits": sum(1 for _, seconds in responses if seconds is None),
+        "wall_seconds": wall_seconds,
+        "quality": {
+            "mean_summary_f1": _mean([result["summary_f1"] for result in results]),
+            "mean_answer_f1": _mean([s for result in results for s in result["answer_f1"]]),
+            "mean_summary_length_difference": _mean(
+                [result["summary_length_difference"] for result in results]
+            ),
+            "unresolved_placeholders": sum(result["unresolved_placeholders"] for result in results),
+        },
+        "latency": {
+            "mean_anonymize_ms": _mean([result["anonymize_ms"] for result in results]),
+            "mean_deanonymize_ms": _mean([result["deanonymize_ms"] for result in results]),
+            "mean_llm_original_ms": _mean(
+                [ms for result in results for ms in result["llm_original_ms"]]
+            ),
+            "mean_llm_anonymized_ms": _mean(llm_anonymized),
+            # Anonymizing and de-anonymizing a document, against the model time of its
+            # anonymized prompts. Unknown when every response came from the cache.
+            "overhead_percent": (
+                100 * mean_overhead / llm_per_document
+                if llm_per_document and mean_overhead is not None
+                else None
+            ),
+        },
+        "results": results,
     }
-    
-    return evaluation_results
 
-def run_evaluation():
+
+def create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--corpus", help="JSON Lines or text file of documents (default: a sample email)"
+    )
+    parser.add_argument("--client", choices=("anthropic", "echo"), default="anthropic")
+    parser.add_argument("--model", default="claude-3-haiku-20240307", help="Anthropic model")
+    parser.add_argument("--concurrency", type=int, default=8, help="Most model calls at once")
+    parser.add_argument("--cache_dir", default=".llm_cache", help="Where responses are cached")
+    parser.add_argument("--no_cache", action="store_true", help="Always call the model")
+    parser.add_argument("--output", help="Report file (default: timestamped JSON file)")
+    return parser
+
+
+def run_evaluation(argv: Optional[Sequence[str]] = None) -> Optional[Dict]:
+    args = create_parser().parse_args(argv)
     try:
-        results = evaluate_anonymization_effect()
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        report_filename = f"llm_evaluation_report_{timestamp}.json"
-        
-        with open(report_filename, "w") as f:
-            json.dump(results, f, indent=2)
-        
-        print(f"Evaluation complete. Report saved to {report_filename}")
-        print("\nSummary:")
-        print(f"Summary length difference: {results['summary_length_difference']} characters")
-        print("\nRetrieval Quality Assessment:")
-        for i, question in enumerate(results['retrieval_questions']):
-            print(f"\nQuestion: {question}")
-            print(f"Original Answer: {results['original_answers'][i]}")
-            print(f"Deanonymized Answer: {results['deanonymized_answers'][i]}")
+        documents = (
+            load_corpus(args.corpus)
+            if args.corpus
+            else [{"text": DEFAULT_DOCUMENT, "questions": list(DEFAULT_QUESTIONS)}]
+        )
+        client = AnthropicClient(args.model) if args.client == "anthropic" else EchoClient()
+        cache = None if args.no_cache else ResponseCache(args.cache_dir)
+        report = asyncio.run(
+            evaluate_corpus(documents, client, concurrency=args.concurrency, cache=cache)
+        )
     except Exception as e:
         print(f"Error during evaluation: {str(e)}")
+        return None
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    report_filename = args.output or f"llm_evaluation_report_{timestamp}.json"
+    with open(report_filename, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"Evaluation complete. Report saved to {report_filename}")
+    print(f"\n{report['documents']} documents, {report['calls']} calls, "
+          f"{report['cache_hits']} cached, {report['wall_seconds']:.1f}s")
+    print("\nQuality:")
+    for name, value in report["quality"].items():
+        print(f"  {name}: {_format(value)}")
+    print("\nLatency:")
+    for name, value in report["latency"].items():
+        print(f"  {name}: {_format(value)}")
+    return report
+
+
+def _format(value) -> str:
+    if value is None:
+        return "n/a"
+    return f"{value:.3f}" if isinstance(value, float) else str(value)
+
 
 if __name__ == "__main__":
     run_evaluation()
@@ -2,7 +2,60 @@
 
 __version__ = "0.1.0"
 
-from .core import anonymize, deanonymize, recognize_entities
+from .anonymizer import Anonymizer
+from .cache import EntityCache
+from .conversation import Conversation
+from .core import (
+    UnknownPlaceholderError,
+    anonymize,
+    anonymize_batch,
+    anonymize_with_offsets,
+    deanonymize,
+    find_unknown_placeholders,
+    recognize_entities,
+    recognize_entities_batch,
+    recognize_spans,
+    recognize_spans_batch,
+)
+from .entities import Entity
+from .instrumentation import Instrumentation, default_instrumentation
 from .main import main
+from .model import ModelManager, configure, warm_up
+from .recognizers import PatternRecognizer, RecognizerRegistry, default_registry
+from .server import AnonymizationServer
+from .streaming import StreamingDeanonymizer, deanonymize_chunks, deanonymize_chunks_async
+from .terms import TermDictionary
+from .vault import EntityVault, SQLiteEntityVault
 
-__all__ = ["anonymize", "deanonymize", "recognize_entities", "main"]
+__all__ = [
+    "Anonymizer",
+    "EntityCache",
+    "Conversation",
+    "AnonymizationServer",
+    "anonymize",
+    "anonymize_batch",
+    "anonymize_with_offsets",
+    "deanonymize",
+    "find_unknown_placeholders",
+    "recognize_entities",
+    "recognize_entities_batch",
+    "recognize_spans",
+    "recognize_spans_batch",
+    "Entity",
+    "UnknownPlaceholderError",
+    "ModelManager",
+    "Instrumentation",
+    "default_instrumentation",
+    "PatternRecognizer",
+    "RecognizerRegistry",
+    "default_registry",
+    "StreamingDeanonymizer",
+    "TermDictionary",
+    "EntityVault",
+    "SQLiteEntityVault",
+    "deanonymize_chunks",
+    "deanonymize_chunks_async",
+    "configure",
+    "warm_up",
+    "main",
+]
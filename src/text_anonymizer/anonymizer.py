@@ -0,0 +1,330 @@
+from collections import deque
+from typing import Deque, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+from .cache import EntityCache
+from .chunking import DEFAULT_CHUNK_OVERLAP, DEFAULT_CHUNK_SIZE
+from .core import _pipe_entities, _replace_entities, deanonymize
+from .entities import Entity, to_dicts
+from .instrumentation import default_instrumentation
+from .model import ModelManager, default_manager
+from .offsets import OffsetMap
+from .prefilter import check_detection
+from .recognizers import RecognizerRegistry, default_registry
+from .terms import TermDictionary
+from .vault import EntityVault
+
+
+class Anonymizer:
+    """
+    Anonymizes texts with a configuration that is compiled once and reused for every call.
+
+    Use this instead of the module-level functions when passing large ``company_terms``
+    lists: the terms are compiled into a :class:`~text_anonymizer.terms.TermDictionary`
+    once, can be changed incrementally, and can be saved for fast worker startup.
+
+    Args:
+        company_terms: Terms to be anonymized as ``COMPANY`` entities.
+        case_sensitive: Whether company terms only match with the same capitalization.
+        terms: A compiled term dictionary to use instead of ``company_terms``.
+        registry: The pattern recognizers to run. Defaults to the shared registry.
+        model: The spaCy pipeline to use. Defaults to the shared pipeline.
+        chunk_size: See :func:`~text_anonymizer.core.recognize_entities`.
+        chunk_overlap: See :func:`~text_anonymizer.core.recognize_entities`.
+        cache: A cache of recognized entities shared by all calls.
+        cache_name: The name the cache statistics are reported under in instrumentation
+            snapshots, made unique if another cache already uses it.
+        detection: ``"full"``, ``"auto"`` or ``"fast"``, see
+            :func:`~text_anonymizer.core.recognize_entities`.
+        consistent: Whether all occurrences of the same entity share one placeholder.
+        vault: Assigns placeholders that are consistent across all calls, see
+            :func:`~text_anonymizer.core.anonymize`.
+    """
+
+    def __init__(
+        self,
+        company_terms: Iterable[str] = (),
+        case_sensitive: bool = True,
+        terms: Optional[TermDictionary] = None,
+        registry: Optional[RecognizerRegistry] = None,
+        model: Optional[ModelManager] = None,
+        chunk_size: Optional[int] = DEFAULT_CHUNK_SIZE,
+        chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+        cache: Optional[EntityCache] = None,
+        detection: str = "full",
+        consistent: bool = False,
+        vault: Optional[EntityVault] = None,
+        cache_name: str = "entities",
+    ):
+        check_detection(detection)
+        if terms is None:
+            terms = TermDictionary(company_terms, case_sensitive=case_sensitive)
+        self.terms = terms
+        self.registry = registry or default_registry
+        self.model = model or default_manager
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.cache = cache
+        self.detection = detection
+        self.consistent = consistent
+        self.vault = vault
+        self._fingerprint: Optional[Tuple[tuple, str]] = None
+        self.cache_name: Optional[str] = None
+        if cache is not None:
+            self.cache_name = default_instrumentation.watch_cache(cache_name, cache)
+
+    @classmethod
+    def from_terms_file(cls, path: str, **kwargs) -> "Anonymizer":
+        """
+        Creates an anonymizer from a term dictionary saved with :meth:`save_terms`.
+
+        Args:
+            path: The file to read.
+            **kwargs: Further arguments for the constructor.
+
+        Returns:
+            The anonymizer.
+        """
+        return cls(terms=TermDictionary.load(path), **kwargs)
+
+    def add_terms(self, *terms: str) -> None:
+        """Adds company terms."""
+        self.terms.add(*terms)
+
+    def remove_terms(self, *terms: str) -> None:
+        """Removes company terms."""
+        self.terms.remove(*terms)
+
+    def save_terms(self, path: str) -> None:
+        """Saves the compiled company terms to a file."""
+        self.terms.save(path)
+
+    @property
+    def fingerprint(self) -> str:
+        """Identifies everything that affects which entities are recognized."""
+        # Recomputed only when one of its parts is replaced or reports a change.
+        state = (
+            self.model,
+            self.model.version,
+            self.registry,
+            self.registry.version,
+            self.terms,
+            self.terms.version,
+            self.chunk_size,
+            self.chunk_overlap,
+            self.detection,
+        )
+        if self._fingerprint is None or self._fingerprint[0] != state:
+            # The model is not used, and not loaded, in the fast mode.
+            model = "" if self.detection == "fast" else self.model.fingerprint
+            fingerprint = "\0".join(
+                [
+                    model,
+                    self.registry.fingerprint,
+                    self.terms.fingerprint,
+                    f"{self.chunk_size}:{self.chunk_overlap}:{self.detection}",
+                ]
+            )
+            self._fingerprint = (state, fingerprint)
+        return self._fingerprint[1]
+
+    def _pipe(
+        self,
+        texts: Iterable[str],
+        batch_size: int,
+        n_process: int,
+        detection: Optional[str] = None,
+    ) -> Iterator[Tuple[str, List[Entity]]]:
+        if detection is not None:
+            check_detection(detection)
+        # The cache holds the results of the configured detection mode only.
+        if self.cache is None or detection not in (None, self.detection):
+            return self._recognize(texts, batch_size, n_process, detection)
+        return self._pipe_cached(self.cache, texts, batch_size, n_process)
+
+    def _pipe_cached(
+        self, cache: EntityCache, texts: Iterable[str], batch_size: int, n_process: int
+    ) -> Iterator[Tuple[str, List[Entity]]]:
+        fingerprint = self.fingerprint
+        # Texts wait here in input order, with their cached entities if they were hits.
+        # Misses go through the pipeline, which yields their entities in the same order.
+        # After a long run of hits an empty text is sent as well, so that results keep
+        # flowing and the waiting hits stay bounded.
+        slots: Deque[Optional[Tuple[str, str, Optional[List[Entity]]]]] = deque()
+
+        def misses():
+            hits_in_a_row = 0
+            for text in texts:
+                key = cache.key(text, fingerprint)
+                entities = cache.get(key)
+                slots.append((text, key, entities))
+                if entities is None:
+                    hits_in_a_row = 0
+                    yield text
+                else:
+                    hits_in_a_row += 1
+                    if hits_in_a_row >= batch_size:
+                        hits_in_a_row = 0
+                        slots.append(None)
+                        yield ""
+
+        for _, recognized in self._recognize(misses(), batch_size, n_process):
+            while True:
+                slot = slots.popleft()
+                if slot is None:
+                    break
+                text, key, entities = slot
+                if entities is None:
+                    cache.put(key, recognized)
+                    yield text, recognized
+                    break
+                yield text, entities
+        # Every miss got its result above, so the slots left over are all hits.
+        for slot in slots:
+            if slot is not None and slot[2] is not None:
+                yield slot[0], slot[2]
+
+    def _recognize(
+        self,
+        texts: Iterable[str],
+        batch_size: int,
+        n_process: int,
+        detection: Optional[str] = None,
+    ) -> Iterator[Tuple[str, List[Entity]]]:
+        terms = self.terms if len(self.terms) else None
+        return _pipe_entities(
+            texts,
+            terms,
+            batch_size,
+            n_process,
+            self.chunk_size,
+            self.chunk_overlap,
+            registry=self.registry,
+            model=self.model,
+            detection=detection or self.detection,
+        )
+
+    def recognize_entities(self, text: str) -> List[Dict]:
+        """
+        Identifies entities in a text.
+
+        Args:
+            text: The text to be processed.
+
+        Returns:
+            The entities, as returned by :func:`~text_anonymizer.core.recognize_entities`.
+        """
+        return to_dicts(text, self.recognize_spans(text))
+
+    def recognize_spans(self, text: str) -> List[Entity]:
+        """
+        Identifies entities in a text, reporting only their offsets.
+
+        Args:
+            text: The text to be processed.
+
+        Returns:
+            The entities, as returned by :func:`~text_anonymizer.core.recognize_spans`.
+        """
+        _, entities = next(self._pipe([text], 1, 1))
+        return entities
+
+    def recognize_entities_batch(
+        self,
+        texts: Iterable[str],
+        batch_size: int = 256,
+        n_process: int = 1,
+        detection: Optional[str] = None,
+    ) -> Iterator[List[Dict]]:
+        """
+        Recognizes entities in many texts at once using spaCy's batched ``nlp.pipe``.
+
+        Args:
+            texts: The texts to be processed.
+            batch_size: The number of texts (or chunks of long texts) buffered per batch.
+            n_process: The number of worker processes used by spaCy.
+            detection: Overrides the anonymizer's detection mode for this call, e.g.
+                ``"fast"`` to only run the recognizers and company terms. Results of another
+                mode than the configured one bypass the cache.
+
+        Returns:
+            A lazy iterator of entity lists, in the same order as the input texts.
+        """
+        for text, entities in self._pipe(texts, batch_size, n_process, detection):
+            yield to_dicts(text, entities)
+
+    def recognize_spans_batch(
+        self,
+        texts: Iterable[str],
+        batch_size: int = 256,
+        n_process: int = 1,
+        detection: Optional[str] = None,
+    ) -> Iterator[List[Entity]]:
+        """
+        Recognizes entities in many texts like :meth:`recognize_entities_batch`, reporting
+        only their offsets.
+
+        Returns:
+            A lazy iterator of :class:`~text_anonymizer.entities.Entity` lists, in the same
+            order as the input texts.
+        """
+        for _, entities in self._pipe(texts, batch_size, n_process, detection):
+            yield entities
+
+    def anonymize(self, text: str) -> Tuple[str, Dict[str, str]]:
+        """
+        Anonymizes the given text by replacing identified entities with placeholders.
+
+        Args:
+            text: The text to be anonymized.
+
+        Returns:
+            A tuple containing the anonymized text and the anonymization map.
+        """
+        anonymized_text, anonymization_map, _ = _replace_entities(
+            text, self.recognize_spans(text), self.consistent, self.vault
+        )
+        return anonymized_text, anonymization_map
+
+    def anonymize_with_offsets(self, text: str) -> Tuple[str, Dict[str, str], OffsetMap]:
+        """
+        Anonymizes the given text and describes where each placeholder went.
+
+        Args:
+            text: The text to be anonymized.
+
+        Returns:
+            A tuple containing the anonymized text, the anonymization map and an
+            :class:`~text_anonymizer.offsets.OffsetMap`.
+        """
+        anonymized_text, anonymization_map, spans = _replace_entities(
+            text, self.recognize_spans(text), self.consistent, self.vault
+        )
+        return anonymized_text, anonymization_map, OffsetMap(spans)
+
+    def anonymize_batch(
+        self, texts: Iterable[str], batch_size: int = 256, n_process: int = 1
+    ) -> Iterator[Tuple[str, Dict[str, str]]]:
+        """
+        Anonymizes many texts at once using spaCy's batched ``nlp.pipe``.
+
+        Args:
+            texts: The texts to be anonymized.
+            batch_size: The number of texts (or chunks of long texts) buffered per batch.
+            n_process: The number of worker processes used by spaCy.
+
+        Returns:
+            A lazy iterator of ``(anonymized_text, anonymization_map)`` pairs, in the same
+            order as the input texts.
+        """
+        for text, entities in self._pipe(texts, batch_size, n_process):
+            anonymized_text, anonymization_map, _ = _replace_entities(
+                text, entities, self.consistent, self.vault
+            )
+            yield anonymized_text, anonymization_map
+
+    @staticmethod
+    def deanonymize(
+        anonymized_text: str, anonymization_map: Mapping[str, str], on_unknown: str = "keep"
+    ) -> str:
+        """Restores an anonymized text, see :func:`~text_anonymizer.core.deanonymize`."""
+        return deanonymize(anonymized_text, anonymization_map, on_unknown)
@@ -0,0 +1,167 @@
+import hashlib
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from .entities import Entity
+
+
+class EntityCache:
+    """
+    Caches recognized entities by text content, so repeated documents skip recognition.
+
+    Entries are keyed by a hash of the text and a fingerprint of everything that affects
+    recognition (model, recognizers, company terms, chunking). A change to any of them
+    changes the fingerprint, so stale entries are never returned. Entities are stored as
+    :class:`~text_anonymizer.entities.Entity` spans, without their text.
+
+    The in-memory tier is an LRU bounded by entry count and, optionally, by the size of the
+    serialized spans. The optional on-disk tier is a SQLite database that several processes
+    can share. It is consulted on a memory miss and filled on every store.
+
+    Args:
+        max_entries: The maximum number of entries kept in memory.
+        max_bytes: The maximum total size of the serialized spans kept in memory.
+        path: Path to the SQLite database of the on-disk tier.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10_000,
+        max_bytes: Optional[int] = None,
+        path: Optional[str] = None,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.path = path
+        self._entries: "OrderedDict[str, Tuple[List[Entity], int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._db: Optional[sqlite3.Connection] = None
+        if path is not None:
+            self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS entities (key TEXT PRIMARY KEY, spans TEXT NOT NULL)"
+            )
+            self._db.commit()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def key(text: str, fingerprint: str) -> str:
+        """
+        Computes the cache key of a text.
+
+        Args:
+            text: The document.
+            fingerprint: The fingerprint of the recognition configuration.
+
+        Returns:
+            A hex digest identifying the text under that configuration.
+        """
+        digest = hashlib.sha256(fingerprint.encode())
+        digest.update(b"\0")
+        digest.update(text.encode("utf-8", "surrogatepass"))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[List[Entity]]:
+        """
+        Looks up the entities of a text.
+
+        Args:
+            key: The key from :meth:`key`.
+
+        Returns:
+            The entities, or ``None`` on a miss.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                spans = entry[0]
+            else:
+                loaded = self._load(key)
+                if loaded is None:
+                    self.misses += 1
+                    return None
+                spans = loaded
+                self.disk_hits += 1
+                self._remember(key, spans, len(json.dumps(spans)))
+        return list(spans)
+
+    def put(self, key: str, entities: List[Entity]) -> None:
+        """
+        Stores the entities of a text.
+
+        Args:
+            key: The key from :meth:`key`.
+            entities: The entities.
+        """
+        entities = list(entities)
+        serialized = json.dumps(entities)
+        with self._lock:
+            self._remember(key, entities, len(serialized))
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO entities (key, spans) VALUES (?, ?)",
+                    (key, serialized),
+                )
+                self._db.commit()
+
+    def _remember(self, key: str, spans: List[Entity], size: int) -> None:
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= previous[1]
+        self._entries[key] = (spans, size)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or (
+            self.max_bytes is not None and self._bytes > self.max_bytes and self._entries
+        ):
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self.evictions += 1
+
+    def _load(self, key: str) -> Optional[List[Entity]]:
+        if self._db is None:
+            return None
+        row = self._db.execute("SELECT spans FROM entities WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return [Entity(*span) for span in json.loads(row[0])]
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the hit, miss and eviction counters and the current size of the cache."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+    def clear(self) -> None:
+        """Drops all entries from both tiers. The counters are kept."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM entities")
+                self._db.commit()
+
+    def close(self) -> None:
+        """Closes the on-disk tier."""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
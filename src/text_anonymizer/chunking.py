@@ -0,0 +1,77 @@
+import re
+from typing import List, NamedTuple
+
+DEFAULT_CHUNK_SIZE = 100_000
+DEFAULT_CHUNK_OVERLAP = 500
+
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+class Chunk(NamedTuple):
+    """
+    A window of a long text that is processed on its own.
+
+    ``start``/``end`` delimit the text handed to the pipeline, including the overlap with
+    the neighbouring chunks. ``own_start``/``own_end`` delimit the part of the text this
+    chunk is responsible for: an entity found in the window is kept only if it starts
+    there, so entities in the overlap zones are reported exactly once.
+    """
+
+    start: int
+    end: int
+    own_start: int
+    own_end: int
+
+
+def _last_break(text: str, start: int, end: int) -> int:
+    for pattern in (_PARAGRAPH_BREAK, _SENTENCE_BREAK, _WHITESPACE):
+        breaks = [match.end() for match in pattern.finditer(text, start, end)]
+        if breaks:
+            return breaks[-1]
+    return end
+
+
+def plan_chunks(
+    text: str, chunk_size: int = DEFAULT_CHUNK_SIZE, overlap: int = DEFAULT_CHUNK_OVERLAP
+) -> List[Chunk]:
+    """
+    Splits a text into overlapping chunks of at most ``chunk_size`` characters.
+
+    Chunks end on a paragraph break where possible, then on a sentence break, then on
+    whitespace, and are only cut mid-word when a text has no whitespace at all.
+
+    Args:
+        text: The text to be split.
+        chunk_size: The maximum number of characters in a chunk, including its overlap.
+        overlap: The number of characters of context shared with each neighbouring chunk.
+
+    Returns:
+        The chunks, in text order. A text shorter than ``chunk_size`` is a single chunk.
+    """
+    length = len(text)
+    if length <= chunk_size:
+        return [Chunk(0, length, 0, length)]
+    own_size = chunk_size - 2 * overlap
+    if own_size <= 0:
+        raise ValueError("chunk_size must be larger than twice the overlap")
+
+    chunks = []
+    own_start = 0
+    while own_start < length:
+        own_end = min(own_start + own_size, length)
+        if own_end < length:
+            own_end = _last_break(text, own_start + own_size // 2, own_end)
+
+        start = max(own_start - overlap, 0)
+        match = _WHITESPACE.search(text, start, own_start)
+        if start > 0 and match:
+            start = match.end()
+        end = min(own_end + overlap, length)
+        if end < length:
+            end = max(_last_break(text, own_end, end), own_end)
+
+        chunks.append(Chunk(start, end, own_start, own_end))
+        own_start = own_end
+    return chunks
@@ -0,0 +1,109 @@
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+from .anonymizer import Anonymizer
+from .core import PLACEHOLDER_PATTERN, _deanonymize, _replace_entities
+from .streaming import deanonymize_chunks
+from .vault import EntityVault
+
+
+class Conversation:
+    """
+    Anonymizes a growing conversation one turn at a time.
+
+    Every turn is anonymized once, when it is added, so the cost of a turn depends on its
+    own length and not on the history. Placeholders come from one
+    :class:`~text_anonymizer.vault.EntityVault`, so an entity keeps its placeholder across
+    all turns, and the map of the conversation only ever grows. Responses that refer to
+    placeholders of any turn can be deanonymized with it.
+
+    Args:
+        anonymizer: Recognizes the entities. Defaults to one without company terms.
+        vault: Assigns the placeholders. Defaults to the anonymizer's vault, or a new one.
+            A vault shared by several conversations keeps their placeholders consistent too.
+    """
+
+    def __init__(
+        self, anonymizer: Optional[Anonymizer] = None, vault: Optional[EntityVault] = None
+    ):
+        self.anonymizer = anonymizer or Anonymizer()
+        if vault is None:
+            vault = self.anonymizer.vault if self.anonymizer.vault is not None else EntityVault()
+        self.vault = vault
+        self.anonymization_map: Dict[str, str] = {}
+        self.turns: List[str] = []
+        self.anonymized_turns: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.turns)
+
+    def add(self, *texts: str) -> List[str]:
+        """
+        Anonymizes new turns and appends them to the conversation.
+
+        Args:
+            *texts: The new turns, in order.
+
+        Returns:
+            The anonymized turns.
+        """
+        anonymized = []
+        for text, entities in zip(texts, self.anonymizer.recognize_spans_batch(texts)):
+            anonymized_text, anonymization_map, _ = _replace_entities(
+                text, entities, vault=self.vault
+            )
+            self.anonymization_map.update(anonymization_map)
+            self.turns.append(text)
+            self.anonymized_turns.append(anonymized_text)
+            anonymized.append(anonymized_text)
+        return anonymized
+
+    def sync(self, turns: Sequence[str]) -> List[str]:
+        """
+        Brings the conversation up to date with a transcript and returns it anonymized.
+
+        A drop-in for anonymizing the whole transcript on every turn: only the turns past
+        those already in the conversation are anonymized. To keep a call independent of the
+        length of the history, the transcript is checked against the conversation by its
+        length and its last known turn only; earlier turns are assumed unchanged.
+
+        Args:
+            turns: All turns of the conversation so far, oldest first.
+
+        Returns:
+            The anonymized turns, one per turn of ``turns``.
+
+        Raises:
+            ValueError: If the transcript is shorter than the conversation, or its last known
+                turn differs from the one added.
+        """
+        known = len(self.turns)
+        if len(turns) < known or (known and turns[known - 1] != self.turns[-1]):
+            raise ValueError("The transcript does not continue the conversation")
+        self.add(*turns[known:])
+        return list(self.anonymized_turns)
+
+    def deanonymize(self, anonymized_text: str, on_unknown: str = "keep") -> str:
+        """
+        Restores a text, such as a model response, with the map of the whole conversation.
+
+        Args:
+            anonymized_text: The anonymized text.
+            on_unknown: See :func:`~text_anonymizer.core.deanonymize`.
+
+        Returns:
+            The de-anonymized text.
+        """
+        # The map only holds placeholders assigned by the vault, which the precompiled
+        # pattern finds, so it is not looked through on every response.
+        return _deanonymize(
+            anonymized_text, self.anonymization_map, on_unknown, pattern=PLACEHOLDER_PATTERN
+        )
+
+    def deanonymize_chunks(
+        self, chunks: Iterable[str], on_unknown: str = "keep"
+    ) -> Iterator[str]:
+        """
+        Restores a streamed response chunk by chunk with the map of the whole conversation,
+        see :func:`~text_anonymizer.streaming.deanonymize_chunks`.
+        """
+        return deanonymize_chunks(chunks, self.anonymization_map, on_unknown)
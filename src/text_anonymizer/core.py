@@ -1,99 +1,626 @@
 import re
-from typing import List, Dict, Optional
-import spacy
-from spacy.matcher import PhraseMatcher
-from typing import List, Dict, Tuple
+from collections import deque
+from functools import lru_cache
+from typing import Deque, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
 
-nlp = spacy.load("en_core_web_sm")
+from .chunking import DEFAULT_CHUNK_OVERLAP, DEFAULT_CHUNK_SIZE, Chunk, plan_chunks
+from .entities import Entity, by_start, to_dicts
+from .instrumentation import default_instrumentation
+from .model import ModelManager, default_manager
+from .offsets import OffsetMap, ReplacedSpan
+from .prefilter import check_detection, needs_ner
+from .recognizers import RecognizerRegistry, default_registry
+from .terms import TermDictionary
+from .vault import EntityVault
 
+PLACEHOLDER_PATTERN = re.compile(r"\[ENTITY_[A-Z0-9_]+?_\d+\]")
 
-def recognize_entities(
-    text: str, company_terms: Optional[List[str]] = None, company_name=None
-) -> List[Dict]:
-    doc = nlp(text)
+
+@lru_cache(maxsize=8)
+def _company_dictionary(company_terms: Tuple[str, ...]) -> TermDictionary:
+    # Callers of the functional API usually pass the same terms with every call, so the
+    # last few compiled dictionaries are kept.
+    return TermDictionary(company_terms, label="COMPANY")
+
+
+def _company_terms(company_terms: Optional[List[str]]) -> Optional[TermDictionary]:
+    if not company_terms:
+        return None
+    return _company_dictionary(tuple(company_terms))
+
+
+def _doc_entities(doc, chunk: Chunk) -> List[Entity]:
+    # Entities found in one chunk, shifted to offsets in the full text and limited to the
+    # part of the text the chunk is responsible for.
+    offset = chunk.start
     entities = []
     for ent in doc.ents:
-        if ent.label_ not in ["MONEY"]:
-            entities.append(
-                {
-                    "type": ent.label_,
-                    "start": ent.start_char,
-                    "end": ent.end_char,
-                    "text": ent.text,
-                }
-            )
-    url_pattern = re.compile(
-        r"http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+"
+        start = ent.start_char + offset
+        if ent.label_ not in ["MONEY"] and chunk.own_start <= start < chunk.own_end:
+            entities.append(Entity(ent.label_, start, ent.end_char + offset))
+    return entities
+
+
+def _pipe_entities(
+    texts: Iterable[str],
+    terms: Optional[TermDictionary],
+    batch_size: int,
+    n_process: int,
+    chunk_size: Optional[int],
+    chunk_overlap: int,
+    registry: RecognizerRegistry = default_registry,
+    model: ModelManager = default_manager,
+    detection: str = "full",
+) -> Iterator[Tuple[str, List[Entity]]]:
+    check_detection(detection)
+    watch = default_instrumentation.stopwatch()
+    if detection == "fast":
+        for text in texts:
+            yield text, _pattern_entities(text, [], terms, registry, watch, ner=False)
+            watch.restart()
+        return
+
+    nlp = model.get()
+    chunk_size = min(chunk_size or nlp.max_length, nlp.max_length)
+
+    # Long texts are split into chunks that travel through nlp.pipe like separate texts.
+    # The texts whose chunks are still in flight wait here until their last chunk is back.
+    pending: Deque[str] = deque()
+
+    def segments():
+        for text in texts:
+            chunks = plan_chunks(text, chunk_size, chunk_overlap)
+            pending.append(text)
+            for index, chunk in enumerate(chunks):
+                segment = text[chunk.start : chunk.end]
+                skip = detection == "auto" and not needs_ner(segment)
+                # A skipped chunk still travels through nlp.pipe, as an empty text, so that
+                # results keep their order. Empty texts cost next to nothing.
+                yield ("" if skip else segment), (chunk, index == len(chunks) - 1, skip)
+
+    ner_entities: List[Entity] = []
+    ner = False
+    for doc, (chunk, last, skip) in nlp.pipe(
+        segments(), as_tuples=True, batch_size=batch_size, n_process=n_process
+    ):
+        ner_entities.extend(_doc_entities(doc, chunk))
+        ner = ner or not skip
+        watch.lap("ner")
+        if last:
+            text = pending.popleft()
+            yield text, _pattern_entities(text, ner_entities, terms, registry, watch, ner)
+            # The time the caller spends on the result is not recognition time.
+            watch.restart()
+            ner_entities = []
+            ner = False
+
+
+def _pattern_entities(
+    text: str,
+    entities: List[Entity],
+    terms: Optional[TermDictionary],
+    registry: RecognizerRegistry,
+    watch,
+    ner: bool,
+) -> List[Entity]:
+    # Adds the regex and term matches to the NER entities of a text and sorts them.
+    entities = entities + registry.scan_spans(text)
+    watch.lap("regex")
+    if terms is not None:
+        entities += terms.find_spans(text)
+        watch.lap("terms")
+    entities.sort(key=by_start)
+    watch.lap("sort")
+    if default_instrumentation.enabled:
+        default_instrumentation.count("documents")
+        default_instrumentation.count("characters", len(text))
+        default_instrumentation.count("entities", len(entities))
+        if not ner:
+            default_instrumentation.count("ner_skipped")
+    return entities
+
+
+def recognize_entities(
+    text: str,
+    company_terms: Optional[List[str]] = None,
+    company_name=None,
+    chunk_size: Optional[int] = DEFAULT_CHUNK_SIZE,
+    chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+    detection: str = "full",
+) -> List[Dict]:
+    """
+    Identifies entities in a text using NER, regular expressions and company terms.
+
+    Texts longer than ``chunk_size`` characters are split into overlapping chunks on
+    paragraph or sentence boundaries. Entities are reported with offsets in the full text,
+    and entities seen by two neighbouring chunks are reported once.
+
+    Args:
+        text: The text to be processed.
+        company_terms: Additional terms to be recognized as ``COMPANY`` entities.
+        chunk_size: The maximum number of characters handed to spaCy at once. ``None``
+            only splits texts longer than ``nlp.max_length``.
+        chunk_overlap: The number of characters of context shared by neighbouring chunks.
+        detection: ``"full"`` runs NER on every text. ``"auto"`` runs it only on texts, or
+            chunks, in which a cheap prefilter finds capitalized words, digits or number and
+            time words, see :func:`~text_anonymizer.prefilter.needs_ner`. ``"fast"`` never
+            runs it and relies on regular expressions and company terms alone.
+
+    Returns:
+        A list of dictionaries with the ``type``, ``start``, ``end`` and ``text`` of each
+        entity, sorted by start position.
+    """
+    entities = recognize_spans(
+        text,
+        company_terms,
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        detection=detection,
+    )
+    return to_dicts(text, entities)
+
+
+def recognize_spans(
+    text: str,
+    company_terms: Optional[List[str]] = None,
+    company_name=None,
+    chunk_size: Optional[int] = DEFAULT_CHUNK_SIZE,
+    chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+    detection: str = "full",
+) -> List[Entity]:
+    """
+    Identifies entities like :func:`recognize_entities`, but only reports their offsets.
+
+    No entity text is copied and no dictionaries are built, which saves memory and time when
+    the offsets are all that is needed, or when most entities are discarded later.
+
+    Args:
+        text: The text to be processed.
+        company_terms: Additional terms to be recognized as ``COMPANY`` entities.
+        chunk_size: See :func:`recognize_entities`.
+        chunk_overlap: See :func:`recognize_entities`.
+        detection: See :func:`recognize_entities`.
+
+    Returns:
+        A list of :class:`~text_anonymizer.entities.Entity` tuples, sorted by start position.
+        ``entity.text_in(text)`` returns the text of an entity.
+    """
+    _, entities = next(
+        _pipe_entities(
+            [text],
+            _company_terms(company_terms),
+            1,
+            1,
+            chunk_size,
+            chunk_overlap,
+            detection=detection,
+        )
     )
-    email_pattern = re.compile(r"\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b")
-    for pattern, entity_type in [(url_pattern, "URL"), (email_pattern, "EMAIL")]:
-        for match in pattern.finditer(text):
-            entities.append(
-                {
-                    "type": entity_type,
-                    "start": match.start(),
-                    "end": match.end(),
-                    "text": match.group(),
-                }
-            )
-    if company_terms:
-        matcher = PhraseMatcher(nlp.vocab)
-        patterns = [nlp.make_doc(term) for term in company_terms]
-        matcher.add(company_name, None, *patterns)
-        for match_id, start, end in matcher(doc):
-            span = doc[start:end]
-            entities.append(
-                {
-                    "type": "COMPANY",
-                    "start": span.start_char,
-                    "end": span.end_char,
-                    "text": span.text,
-                }
-            )
-    entities.sort(key=lambda x: x["start"])
     return entities
 
 
+def recognize_entities_batch(
+    texts: Iterable[str],
+    company_terms: Optional[List[str]] = None,
+    company_name=None,
+    batch_size: int = 256,
+    n_process: int = 1,
+    chunk_size: Optional[int] = DEFAULT_CHUNK_SIZE,
+    chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+    detection: str = "full",
+) -> Iterator[List[Dict]]:
+    """
+    Recognizes entities in many texts at once using spaCy's batched ``nlp.pipe``.
+
+    Args:
+        texts: The texts to be processed.
+        batch_size: The number of texts (or chunks of long texts) buffered per batch.
+        n_process: The number of worker processes used by spaCy.
+        chunk_size: See :func:`recognize_entities`.
+        chunk_overlap: See :func:`recognize_entities`.
+        detection: See :func:`recognize_entities`.
+
+    Returns:
+        A lazy iterator of entity lists, in the same order as the input texts.
+    """
+    for text, entities in _pipe_entities(
+        texts,
+        _company_terms(company_terms),
+        batch_size,
+        n_process,
+        chunk_size,
+        chunk_overlap,
+        detection=detection,
+    ):
+        yield to_dicts(text, entities)
+
+
+def recognize_spans_batch(
+    texts: Iterable[str],
+    company_terms: Optional[List[str]] = None,
+    company_name=None,
+    batch_size: int = 256,
+    n_process: int = 1,
+    chunk_size: Optional[int] = DEFAULT_CHUNK_SIZE,
+    chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+    detection: str = "full",
+) -> Iterator[List[Entity]]:
+    """
+    Recognizes entities in many texts like :func:`recognize_entities_batch`, but only
+    reports their offsets, see :func:`recognize_spans`.
+
+    Returns:
+        A lazy iterator of :class:`~text_anonymizer.entities.Entity` lists, in the same
+        order as the input texts.
+    """
+    for _, entities in _pipe_entities(
+        texts,
+        _company_terms(company_terms),
+        batch_size,
+        n_process,
+        chunk_size,
+        chunk_overlap,
+        detection=detection,
+    ):
+        yield entities
+
+
 def anonymize(
-    text: str, company_terms: Optional[List[str]] = None, company_name=None
+    text: str,
+    company_terms: Optional[List[str]] = None,
+    company_name=None,
+    chunk_size: Optional[int] = DEFAULT_CHUNK_SIZE,
+    chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+    detection: str = "full",
+    consistent: bool = False,
+    vault: Optional[EntityVault] = None,
 ) -> Tuple[str, Dict[str, str]]:
     """
     Anonymizes the given text by replacing identified entities with placeholders.
 
     Args:
         text: The text to be anonymized.
+        company_terms: Additional terms to be anonymized as ``COMPANY`` entities.
+        chunk_size: See :func:`recognize_entities`.
+        chunk_overlap: See :func:`recognize_entities`.
+        detection: See :func:`recognize_entities`.
+        consistent: Whether all occurrences of the same entity share one placeholder, so
+            that a name mentioned five times is ``[ENTITY_PERSON_1]`` each time. By default
+            every occurrence gets a placeholder of its own.
+        vault: An :class:`~text_anonymizer.vault.EntityVault` that assigns the placeholders,
+            so that they are consistent across all documents anonymized with it.
 
     Returns:
-        A tuple containing the anonymized text and the anonymization map.
+        A tuple containing the anonymized text and the anonymization map. With a vault, the
+        map only holds the placeholders of this text.
     """
-    entities = recognize_entities(
-        text=text, company_terms=company_terms, company_name=company_name
+    entities = recognize_spans(
+        text=text,
+        company_terms=company_terms,
+        company_name=company_name,
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        detection=detection,
     )
+    anonymized_text, anonymization_map, _ = _replace_entities(text, entities, consistent, vault)
+    return anonymized_text, anonymization_map
+
+
+def anonymize_with_offsets(
+    text: str,
+    company_terms: Optional[List[str]] = None,
+    company_name=None,
+    chunk_size: Optional[int] = DEFAULT_CHUNK_SIZE,
+    chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+    detection: str = "full",
+    consistent: bool = False,
+    vault: Optional[EntityVault] = None,
+) -> Tuple[str, Dict[str, str], OffsetMap]:
+    """
+    Anonymizes the given text like :func:`anonymize` and also describes where each
+    placeholder went.
+
+    Args:
+        text: The text to be anonymized.
+        company_terms: Additional terms to be anonymized as ``COMPANY`` entities.
+        chunk_size: See :func:`recognize_entities`.
+        chunk_overlap: See :func:`recognize_entities`.
+        detection: See :func:`recognize_entities`.
+        consistent: See :func:`anonymize`.
+        vault: See :func:`anonymize`.
+
+    Returns:
+        A tuple containing the anonymized text, the anonymization map and an
+        :class:`~text_anonymizer.offsets.OffsetMap` projecting offsets between the texts.
+    """
+    entities = recognize_spans(
+        text=text,
+        company_terms=company_terms,
+        company_name=company_name,
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        detection=detection,
+    )
+    anonymized_text, anonymization_map, spans = _replace_entities(text, entities, consistent, vault)
+    return anonymized_text, anonymization_map, OffsetMap(spans)
+
+
+def anonymize_batch(
+    texts: Iterable[str],
+    company_terms: Optional[List[str]] = None,
+    company_name=None,
+    batch_size: int = 256,
+    n_process: int = 1,
+    chunk_size: Optional[int] = DEFAULT_CHUNK_SIZE,
+    chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+    detection: str = "full",
+    consistent: bool = False,
+    vault: Optional[EntityVault] = None,
+) -> Iterator[Tuple[str, Dict[str, str]]]:
+    """
+    Anonymizes many texts at once using spaCy's batched ``nlp.pipe``.
+
+    Args:
+        texts: The texts to be anonymized.
+        batch_size: The number of texts (or chunks of long texts) buffered per batch.
+        n_process: The number of worker processes used by spaCy.
+        chunk_size: See :func:`recognize_entities`.
+        chunk_overlap: See :func:`recognize_entities`.
+        detection: See :func:`recognize_entities`.
+        consistent: See :func:`anonymize`.
+        vault: See :func:`anonymize`.
+
+    Returns:
+        A lazy iterator of ``(anonymized_text, anonymization_map)`` pairs, in the same order
+        as the input texts.
+    """
+    for text, entities in _pipe_entities(
+        texts,
+        _company_terms(company_terms),
+        batch_size,
+        n_process,
+        chunk_size,
+        chunk_overlap,
+        detection=detection,
+    ):
+        anonymized_text, anonymization_map, _ = _replace_entities(text, entities, consistent, vault)
+        yield anonymized_text, anonymization_map
+
+
+# Entity types that win over others when two entities cover exactly the same span, or
+# name the union of two partly overlapping ones.
+_TYPE_PRIORITY = {"COMPANY": 0, "EMAIL": 1, "URL": 1}
+
+
+def resolve_overlaps(entities: List[Dict]) -> List[Dict]:
+    """
+    Drops entities that overlap an entity kept earlier in the text.
+
+    Entities are considered in order of start position. Of those starting at the same
+    position the longest one is kept, and of spans of equal length a ``COMPANY`` term
+    beats ``EMAIL``/``URL`` matches, which beat NER entities. Entities nested in a kept
+    entity are dropped. An entity that starts inside a kept entity but ends after it is
+    merged with it, so that no part of either is left in the text; the union takes the
+    type that wins by the same priority, or the kept entity's type on a tie.
+
+    Args:
+        entities: Entities as returned by :func:`recognize_entities`.
+
+    Returns:
+        The non-overlapping entities, sorted by start position.
+    """
+    ordered = sorted(
+        entities,
+        key=lambda x: (x["start"], x["start"] - x["end"], _TYPE_PRIORITY.get(x["type"], 2)),
+    )
+    resolved = []
+    end = -1
+    for entity in ordered:
+        if entity["start"] >= end:
+            resolved.append(entity)
+            end = entity["end"]
+        elif entity["end"] > end:
+            kept = resolved[-1]
+            resolved[-1] = {
+                "type": _merged_type(kept["type"], entity["type"]),
+                "start": kept["start"],
+                "end": entity["end"],
+                "text": kept["text"] + entity["text"][end - entity["start"] :],
+            }
+            end = entity["end"]
+    return resolved
+
+
+def _merged_type(kept: str, other: str) -> str:
+    if _TYPE_PRIORITY.get(other, 2) < _TYPE_PRIORITY.get(kept, 2):
+        return other
+    return kept
+
+
+def _overlap_order(entity: Entity) -> Tuple[int, int, int]:
+    return entity.start, entity.start - entity.end, _TYPE_PRIORITY.get(entity.type, 2)
+
+
+def _resolve_spans(entities: List[Entity]) -> List[Entity]:
+    # resolve_overlaps for Entity tuples.
+    resolved = []
+    end = -1
+    for entity in sorted(entities, key=_overlap_order):
+        if entity.start >= end:
+            resolved.append(entity)
+            end = entity.end
+        elif entity.end > end:
+            kept = resolved[-1]
+            resolved[-1] = Entity(_merged_type(kept.type, entity.type), kept.start, entity.end)
+            end = entity.end
+    return resolved
+
+
+def _replace_entities(
+    text: str,
+    entities: List[Entity],
+    consistent: bool = False,
+    vault: Optional[EntityVault] = None,
+) -> Tuple[str, Dict[str, str], List[ReplacedSpan]]:
+    # Builds the anonymized text in one forward pass. Placeholders are numbered per type
+    # from the end of the text, and the map lists them in that order. Consistent
+    # placeholders number distinct values instead of occurrences; a vault numbers them
+    # across documents.
+    watch = default_instrumentation.stopwatch()
+    entities = _resolve_spans(entities)
+    if vault is not None:
+        placeholders = vault.placeholders(
+            [(entity_type, text[start:end]) for entity_type, start, end in entities]
+        )
+    else:
+        placeholders = _number_placeholders(text, entities, consistent)
+
+    parts = []
+    spans = []
+    position = 0
+    length = 0
+    for placeholder, (_, start, end) in zip(placeholders, entities):
+        parts.append(text[position:start])
+        length += start - position
+        spans.append(ReplacedSpan(start, end, length, length + len(placeholder)))
+        parts.append(placeholder)
+        length += len(placeholder)
+        position = end
+    parts.append(text[position:])
+
     anonymization_map = {}
-    entity_counters = {}
-    for entity in reversed(entities):  # Process entities from end to start
-        entity_type = entity["type"]
-        if entity_type not in entity_counters:
-            entity_counters[entity_type] = 1
-        else:
-            entity_counters[entity_type] += 1
-        placeholder = f"[ENTITY_{entity_type}_{entity_counters[entity_type]}]"
-        anonymization_map[placeholder] = entity["text"]
-        text = text[: entity["start"]] + placeholder + text[entity["end"] :]
-    return text, anonymization_map
+    for placeholder, (_, start, end) in zip(reversed(placeholders), reversed(entities)):
+        anonymization_map[placeholder] = text[start:end]
+    anonymized_text = "".join(parts)
+    watch.lap("substitute")
+    return anonymized_text, anonymization_map, spans
+
+
+def _number_placeholders(text: str, entities: List[Entity], consistent: bool) -> List[str]:
+    # Numbers the entities per type, counting from the end of the text.
+    type_totals: Dict[str, int] = {}
+    numbers: Dict[Tuple[str, str], int] = {}
+    placeholders = []
+    for entity_type, start, end in reversed(entities):
+        number = numbers.get((entity_type, text[start:end])) if consistent else None
+        if number is None:
+            number = type_totals[entity_type] = type_totals.get(entity_type, 0) + 1
+            if consistent:
+                numbers[entity_type, text[start:end]] = number
+        placeholders.append(f"[ENTITY_{entity_type}_{number}]")
+    placeholders.reverse()
+    return placeholders
+
+
+class UnknownPlaceholderError(LookupError):
+    """Raised when a text contains placeholders that are missing from the anonymization map."""
 
+    def __init__(self, placeholders: List[str]):
+        super().__init__(f"Unknown placeholders: {', '.join(placeholders)}")
+        self.placeholders = placeholders
 
-def deanonymize(anonymized_text: str, anonymization_map: Dict[str, str]) -> str:
+
+def _irregular_keys(anonymization_map: Mapping[str, str]) -> List[str]:
+    # The keys of a map that are not of the form [ENTITY_<TYPE>_<N>]. Vaults only hold
+    # regular placeholders, and may be too large to look through.
+    if isinstance(anonymization_map, EntityVault):
+        return []
+    return [key for key in anonymization_map if not PLACEHOLDER_PATTERN.fullmatch(key)]
+
+
+def _placeholder_pattern(
+    anonymization_map: Mapping[str, str], irregular: List[str]
+) -> "re.Pattern[str]":
+    # Maps produced by this library only hold placeholders of the form [ENTITY_<TYPE>_<N>],
+    # which the precompiled pattern finds without looking at the map. Hand-written maps
+    # with other keys, as listed by _irregular_keys, fall back to an alternation of their
+    # keys, longest first. Callers that restore many texts with one map build it once.
+    if not irregular:
+        return PLACEHOLDER_PATTERN
+    keys = sorted(anonymization_map, key=len, reverse=True)
+    return re.compile("|".join([re.escape(key) for key in keys] + [PLACEHOLDER_PATTERN.pattern]))
+
+
+def find_unknown_placeholders(
+    anonymized_text: str, anonymization_map: Mapping[str, str]
+) -> List[str]:
+    """
+    Lists the placeholders in a text that the anonymization map cannot restore.
+
+    Args:
+        anonymized_text: The anonymized text.
+        anonymization_map: A dictionary that maps placeholders to their original entities.
+
+    Returns:
+        The unknown placeholders, in order of first appearance.
+    """
+    unknown: Dict[str, None] = {}
+    for match in PLACEHOLDER_PATTERN.finditer(anonymized_text):
+        if match.group() not in anonymization_map:
+            unknown[match.group()] = None
+    return list(unknown)
+
+
+def deanonymize(
+    anonymized_text: str, anonymization_map: Mapping[str, str], on_unknown: str = "keep"
+) -> str:
     """
     Restores the original text by replacing placeholders with their corresponding original entities.
 
+    The text is scanned once and every placeholder is looked up in the map, so the cost does
+    not depend on the size of the map. Restored values are never scanned again, even if they
+    happen to contain placeholder-like text.
+
     Args:
         anonymized_text: The anonymized text.
-        anonymization_map: A dictionary that maps placeholders to their corresponding original entities.
+        anonymization_map: A dictionary that maps placeholders to their corresponding
+            original entities, or the :class:`~text_anonymizer.vault.EntityVault` the text
+            was anonymized with.
+        on_unknown: ``"keep"`` to leave placeholders missing from the map untouched, or
+            ``"raise"`` to raise :class:`UnknownPlaceholderError` listing them.
 
     Returns:
         The de-anonymized text.
     """
-    for placeholder, original_text in anonymization_map.items():
-        anonymized_text = anonymized_text.replace(placeholder, original_text)
-    return anonymized_text
+    return _deanonymize(anonymized_text, anonymization_map, on_unknown)
+
+
+def _deanonymize(
+    anonymized_text: str,
+    anonymization_map: Mapping[str, str],
+    on_unknown: str = "keep",
+    pattern: Optional["re.Pattern[str]"] = None,
+) -> str:
+    # deanonymize with the pattern of the map passed in, when the caller already has it.
+    if not anonymization_map and on_unknown == "keep":
+        return anonymized_text
+    watch = default_instrumentation.stopwatch()
+    if pattern is None:
+        pattern = _placeholder_pattern(anonymization_map, _irregular_keys(anonymization_map))
+    text = _restore_placeholders(anonymized_text, anonymization_map, pattern, on_unknown)
+    watch.lap("deanonymize")
+    return text
+
+
+def _restore_placeholders(
+    anonymized_text: str,
+    anonymization_map: Mapping[str, str],
+    pattern: "re.Pattern[str]",
+    on_unknown: str = "keep",
+) -> str:
+    if on_unknown not in ("keep", "raise"):
+        raise ValueError(f"on_unknown must be 'keep' or 'raise', not {on_unknown!r}")
+    unknown: Dict[str, None] = {}
+
+    def restore(match: "re.Match[str]") -> str:
+        placeholder = match.group()
+        original_text = anonymization_map.get(placeholder)
+        if original_text is None:
+            unknown[placeholder] = None
+            return placeholder
+        return original_text
+
+    text = pattern.sub(restore, anonymized_text)
+    if unknown and on_unknown == "raise":
+        raise UnknownPlaceholderError(list(unknown))
+    return text
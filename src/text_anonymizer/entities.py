@@ -0,0 +1,60 @@
+from operator import itemgetter
+from typing import Dict, Iterable, List, NamedTuple
+
+
+class Entity(NamedTuple):
+    """
+    An entity found in a text, as a span of that text.
+
+    Entities do not copy their text. It is sliced from the source text only when needed,
+    with :meth:`text_in` or when converting to the dictionary form.
+    """
+
+    type: str
+    start: int
+    end: int
+
+    def text_in(self, text: str) -> str:
+        """Returns the text of the entity, given the text it was found in."""
+        return text[self.start : self.end]
+
+    def to_dict(self, text: str) -> Dict:
+        """
+        Returns the entity in the dictionary form of :func:`~text_anonymizer.recognize_entities`.
+
+        Args:
+            text: The text the entity was found in.
+        """
+        return {
+            "type": self.type,
+            "start": self.start,
+            "end": self.end,
+            "text": text[self.start : self.end],
+        }
+
+
+# Sort key ordering entities by start position.
+by_start = itemgetter(1)
+
+
+def to_dicts(text: str, entities: Iterable[Entity]) -> List[Dict]:
+    """
+    Converts entities to the dictionary form, slicing their text from the source text.
+
+    Args:
+        text: The text the entities were found in.
+        entities: The entities.
+
+    Returns:
+        A list of dictionaries with the ``type``, ``start``, ``end`` and ``text`` of each
+        entity.
+    """
+    return [
+        {"type": entity_type, "start": start, "end": end, "text": text[start:end]}
+        for entity_type, start, end in entities
+    ]
+
+
+def from_dicts(entities: Iterable[Dict]) -> List[Entity]:
+    """Converts entities in the dictionary form to :class:`Entity` tuples."""
+    return [Entity(entity["type"], entity["start"], entity["end"]) for entity in entities]
@@ -0,0 +1,227 @@
+import threading
+import time
+import weakref
+from typing import Callable, Dict, List
+
+# Stages timed by the library. Others can be recorded as well.
+STAGES = ("load", "ner", "regex", "terms", "sort", "substitute", "deanonymize", "io")
+
+Observer = Callable[[str, str, float], None]
+
+
+class Stopwatch:
+    """
+    Attributes the time between laps to stages.
+
+    Created by :meth:`Instrumentation.stopwatch`.
+    """
+
+    __slots__ = ("_instrumentation", "_last")
+
+    def __init__(self, instrumentation: "Instrumentation"):
+        self._instrumentation = instrumentation
+        self._last = time.perf_counter()
+
+    def lap(self, stage: str) -> None:
+        """Records the time since the previous lap, or since the start, for a stage."""
+        now = time.perf_counter()
+        self._instrumentation.record(stage, now - self._last)
+        self._last = now
+
+    def restart(self) -> None:
+        """Starts timing anew without recording, e.g. after control went back to the caller."""
+        self._last = time.perf_counter()
+
+
+class _NullStopwatch:
+    __slots__ = ()
+
+    def lap(self, stage: str) -> None:
+        pass
+
+    def restart(self) -> None:
+        pass
+
+
+_NULL_STOPWATCH = _NullStopwatch()
+
+
+class Instrumentation:
+    """
+    Collects per-stage timings and counters of the library, when enabled.
+
+    Instrumentation is off by default. While it is off, instrumented code only checks the
+    :attr:`enabled` flag or calls the no-op methods of a null stopwatch, so it costs next to
+    nothing.
+
+    While it is on, every timing and counter update is added to cumulative totals, returned
+    by :meth:`snapshot` and :meth:`prometheus`, and passed to the observers as
+    ``observer(kind, name, value)``. ``kind`` is ``"stage"`` for timings in seconds and
+    ``"count"`` for counter increments.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._seconds: Dict[str, float] = {}
+        self._calls: Dict[str, int] = {}
+        self._counters: Dict[str, int] = {}
+        self._observers: List[Observer] = []
+        self._caches: "weakref.WeakValueDictionary" = weakref.WeakValueDictionary()
+
+    def enable(self) -> None:
+        """Starts collecting."""
+        self.enabled = True
+
+    def disable(self) -> None:
+        """Stops collecting. The totals collected so far are kept."""
+        self.enabled = False
+
+    def reset(self) -> None:
+        """Sets all totals back to zero."""
+        with self._lock:
+            self._seconds.clear()
+            self._calls.clear()
+            self._counters.clear()
+
+    def add_observer(self, observer: Observer) -> None:
+        """Calls ``observer(kind, name, value)`` for every timing and counter update."""
+        self._observers.append(observer)
+
+    def remove_observer(self, observer: Observer) -> None:
+        """Stops calling an observer."""
+        self._observers.remove(observer)
+
+    def watch_cache(self, name: str, cache) -> str:
+        """
+        Includes the statistics of a cache in snapshots, for as long as the cache exists.
+
+        Args:
+            name: The name the statistics are reported under. If another cache is already
+                watched under it, a number is appended, e.g. ``"entities_2"``.
+            cache: An object with a ``stats()`` method returning a dictionary of numbers,
+                such as :class:`~text_anonymizer.cache.EntityCache`.
+
+        Returns:
+            The name the statistics are reported under.
+        """
+        with self._lock:
+            unique = name
+            number = 1
+            while self._caches.get(unique) not in (None, cache):
+                number += 1
+                unique = f"{name}_{number}"
+            self._caches[unique] = cache
+        return unique
+
+    def stopwatch(self):
+        """
+        Returns a stopwatch for timing consecutive stages, or a no-op one when disabled.
+
+        Returns:
+            An object with ``lap(stage)`` and ``restart()`` methods.
+        """
+        return Stopwatch(self) if self.enabled else _NULL_STOPWATCH
+
+    def record(self, stage: str, seconds: float) -> None:
+        """Adds the duration of one run of a stage."""
+        with self._lock:
+            self._seconds[stage] = self._seconds.get(stage, 0.0) + seconds
+            self._calls[stage] = self._calls.get(stage, 0) + 1
+        for observer in self._observers:
+            observer("stage", stage, seconds)
+
+    def count(self, name: str, value: int = 1) -> None:
+        """Adds to a counter."""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+        for observer in self._observers:
+            observer("count", name, value)
+
+    def merge(self, snapshot: Dict) -> None:
+        """Adds the totals of a snapshot, e.g. one taken in a worker process."""
+        with self._lock:
+            for stage, totals in snapshot.get("stages", {}).items():
+                self._seconds[stage] = self._seconds.get(stage, 0.0) + totals["seconds"]
+                self._calls[stage] = self._calls.get(stage, 0) + totals["calls"]
+            for name, value in snapshot.get("counters", {}).items():
+                self._counters[name] = self._counters.get(name, 0) + value
+
+    def snapshot(self) -> Dict:
+        """
+        Returns the cumulative totals.
+
+        Returns:
+            A dictionary with ``stages`` (``seconds`` and ``calls`` per stage), ``counters``
+            and ``caches`` (the statistics of each watched cache).
+        """
+        with self._lock:
+            stages = {
+                stage: {"seconds": seconds, "calls": self._calls[stage]}
+                for stage, seconds in self._seconds.items()
+            }
+            counters = dict(self._counters)
+        caches = {name: cache.stats() for name, cache in list(self._caches.items())}
+        return {"stages": stages, "counters": counters, "caches": caches}
+
+    def prometheus(self, prefix: str = "text_anonymizer") -> str:
+        """
+        Renders the cumulative totals in the Prometheus text exposition format.
+
+        Args:
+            prefix: The prefix of all metric names.
+
+        Returns:
+            The metrics, one sample per line.
+        """
+        snapshot = self.snapshot()
+        lines = [
+            f"# HELP {prefix}_stage_seconds_total Time spent in each stage.",
+            f"# TYPE {prefix}_stage_seconds_total counter",
+        ]
+        for stage, totals in sorted(snapshot["stages"].items()):
+            lines.append(f'{prefix}_stage_seconds_total{{stage="{stage}"}} {totals["seconds"]}')
+        lines += [
+            f"# HELP {prefix}_stage_calls_total Number of times each stage ran.",
+            f"# TYPE {prefix}_stage_calls_total counter",
+        ]
+        for stage, totals in sorted(snapshot["stages"].items()):
+            lines.append(f'{prefix}_stage_calls_total{{stage="{stage}"}} {totals["calls"]}')
+        for name, value in sorted(snapshot["counters"].items()):
+            lines += [f"# TYPE {prefix}_{name}_total counter", f"{prefix}_{name}_total {value}"]
+        for statistic in sorted({key for stats in snapshot["caches"].values() for key in stats}):
+            lines.append(f"# TYPE {prefix}_cache_{statistic} gauge")
+            for name, stats in sorted(snapshot["caches"].items()):
+                if statistic in stats:
+                    lines.append(
+                        f'{prefix}_cache_{statistic}{{cache="{name}"}} {stats[statistic]}'
+                    )
+        return "\n".join(lines) + "\n"
+
+
+default_instrumentation = Instrumentation()
+
+
+def enable() -> None:
+    """Starts collecting timings and counters for the whole library."""
+    default_instrumentation.enable()
+
+
+def disable() -> None:
+    """Stops collecting timings and counters."""
+    default_instrumentation.disable()
+
+
+def snapshot() -> Dict:
+    """Returns the cumulative timings and counters, see :meth:`Instrumentation.snapshot`."""
+    return default_instrumentation.snapshot()
+
+
+def add_observer(observer: Observer) -> None:
+    """Calls ``observer(kind, name, value)`` for every timing and counter update."""
+    default_instrumentation.add_observer(observer)
+
+
+def prometheus(prefix: str = "text_anonymizer") -> str:
+    """Renders the cumulative timings and counters in the Prometheus text format."""
+    return default_instrumentation.prometheus(prefix)
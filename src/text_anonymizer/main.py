@@ -1,100 +1,14 @@
-import re
-import spacy
-from typing import List, Dict
-
-nlp = spacy.load("en_core_web_sm")
-
-
-def recognize_entities(text: str) -> List[Dict]:
-    """
-    Identifies various types of entities in a given text using NER and regex for URLs.
-
-    Args:
-        text: The text to be processed.
-
-    Returns:
-        A list of dictionaries, where each dictionary represents an entity and contains the following keys:
-        - type: The type of entity (e.g., "PERSON", "ORGANIZATION", "LOCATION", "PHONE", "EMAIL", "URL", "PRODUCT").
-        - start: The starting index of the entity in the text.
-        - end: The ending index of the entity in the text.
-        - text: The original text of the entity.
-    """
-    doc = nlp(text)
-    entities = []
-
-    # NER-based entity recognition
-    for ent in doc.ents:
-        if ent.label_ not in ["MONEY"]:
-            entity = {
-                "type": ent.label_,
-                "start": ent.start_char,
-                "end": ent.end_char,
-                "text": ent.text,
-            }
-            entities.append(entity)
-
-    url_pattern = re.compile(
-        r"http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+"
-    )
-    email_pattern = re.compile(r"\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b")
-
-    for pattern, entity_type in [
-        (url_pattern, "URL"),
-        (email_pattern, "EMAIL"),
-    ]:
-        for match in pattern.finditer(text):
-            entity = {
-                "type": entity_type,
-                "start": match.start(),
-                "end": match.end(),
-                "text": match.group(),
-            }
-            entities.append(entity)
-
-    # Sort entities by their starting position
-    entities.sort(key=lambda x: x["start"])
-
-    return entities
-
-
-def anonymize(text: str, entities: List[Dict]) -> tuple[str, Dict[str, str]]:
-    """
-    Replaces identified entities with placeholders.
-
-    Args:
-        text: The text to be anonymized.
-        entities: A list of dictionaries representing the entities to be anonymized.
-
-    Returns:
-        The anonymized text and the anonymization map.
-    """
-
-    anonymization_map = {}
-    for entity in reversed(entities):  # Process entities from end to start
-        placeholder = f"[ENTITY_{entity['type']}_{len(anonymization_map) + 1}]"
-        anonymization_map[placeholder] = entity["text"]
-        text = text[: entity["start"]] + placeholder + text[entity["end"] :]
-    return text, anonymization_map
-
-
-def deanonymize(text: str, anonymization_map: Dict[str, str]) -> str:
-    """
-    Restores the original text by replacing placeholders with their corresponding original entities.
-
-    Args:
-        text: The anonymized text.
-        anonymization_map: A dictionary that maps placeholders to their corresponding original entities.
-
-    Returns:
-        The de-anonymized text.
-    """
-
-    for placeholder, original_text in anonymization_map.items():
-        text = text.replace(placeholder, original_text)
-    return text
 import argparse
-import json
-from .core import recognize_entities, anonymize, deanonymize
+import sys
+from .anonymizer import Anonymizer
+from .core import anonymize, deanonymize
+from .instrumentation import default_instrumentation
+from .mapfile import MAP_FILE_SUFFIXES, MAP_FORMATS, convert_map, load_map, write_map
+from .parallel import run_directory
+from .prefilter import DETECTION_MODES
+from .server import DEFAULT_HOST, DEFAULT_MAX_BATCH_SIZE, DEFAULT_MAX_QUEUE, DEFAULT_PORT, serve
+from .streaming import STREAM_FORMATS, stream_anonymize, stream_deanonymize
+from .structured import MAP_SCOPES, stream_anonymize_structured, stream_deanonymize_structured
 
 
 def create_parser():
@@ -103,44 +17,173 @@ def create_parser():
 
     # Anonymize subcommand
     anonymize_parser = subparsers.add_parser("anonymize", help="Anonymize text")
-    anonymize_parser.add_argument("--input_file", required=True, help="Path to the input text file")
-    anonymize_parser.add_argument("--output_file", required=True, help="Path to the output text file")
+    anonymize_parser.add_argument("--input_file", help="Path to the input text file")
+    anonymize_parser.add_argument("--output_file", help="Path to the output text file")
+    _add_directory_arguments(anonymize_parser)
+    _add_metrics_argument(anonymize_parser)
+    _add_stream_arguments(anonymize_parser)
+    anonymize_parser.add_argument(
+        "--map_file", help="Path to the JSON Lines map file (streaming formats)"
+    )
+    anonymize_parser.add_argument(
+        "--batch_size", type=int, default=256, help="Records per batch (streaming formats)"
+    )
+    _add_detection_argument(anonymize_parser)
+    _add_structured_arguments(anonymize_parser, fields=True)
+    anonymize_parser.add_argument(
+        "--map_format",
+        choices=MAP_FORMATS,
+        default="json",
+        help="Format of the map file (text format): indented json, compact json or indexed sqlite",
+    )
 
     # De-anonymize subcommand
     deanonymize_parser = subparsers.add_parser("deanonymize", help="De-anonymize text")
-    deanonymize_parser.add_argument("--input_file", required=True, help="Path to the input text file")
-    deanonymize_parser.add_argument("--output_file", required=True, help="Path to the output text file")
-    deanonymize_parser.add_argument("--map_file", required=True, help="Path to the anonymization map file")
+    deanonymize_parser.add_argument("--input_file", help="Path to the input text file")
+    deanonymize_parser.add_argument("--output_file", help="Path to the output text file")
+    _add_directory_arguments(deanonymize_parser)
+    _add_metrics_argument(deanonymize_parser)
+    deanonymize_parser.add_argument("--map_file", help="Path to the anonymization map file")
+    deanonymize_parser.add_argument(
+        "--on_unknown",
+        choices=("keep", "raise"),
+        default="keep",
+        help="Keep placeholders missing from the map, or fail on them",
+    )
+    _add_stream_arguments(deanonymize_parser)
+    _add_structured_arguments(deanonymize_parser, fields=False)
+
+    # Convert-map subcommand
+    convert_parser = subparsers.add_parser(
+        "convert-map", help="Convert a map file to another format"
+    )
+    convert_parser.add_argument(
+        "--input_file", required=True, help="Path to the map file, in any format"
+    )
+    convert_parser.add_argument(
+        "--output_file", required=True, help="Path to the converted map file"
+    )
+    convert_parser.add_argument(
+        "--map_format", choices=MAP_FORMATS, required=True, help="Format to convert to"
+    )
+
+    # Serve subcommand
+    serve_parser = subparsers.add_parser("serve", help="Run a local anonymization service")
+    serve_parser.add_argument("--host", default=DEFAULT_HOST, help="Address to listen on")
+    serve_parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port to listen on")
+    serve_parser.add_argument("--unix_socket", help="Listen on this unix socket instead of a port")
+    serve_parser.add_argument("--terms_file", help="Company terms saved with Anonymizer.save_terms")
+    serve_parser.add_argument(
+        "--max_batch_size", type=int, default=DEFAULT_MAX_BATCH_SIZE, help="Most texts per batch"
+    )
+    serve_parser.add_argument(
+        "--max_wait_ms", type=float, default=5, help="How long a batch waits for more texts"
+    )
+    serve_parser.add_argument(
+        "--max_queue", type=int, default=DEFAULT_MAX_QUEUE, help="Most queued texts before 503s"
+    )
+    _add_detection_argument(serve_parser)
 
     return parser
 
-def anonymize_text(input_file, output_file):
+def _add_metrics_argument(parser):
+    parser.add_argument(
+        "--metrics_file", help="Write per-stage timings and counters here, in Prometheus format"
+    )
+
+def _add_detection_argument(parser):
+    parser.add_argument(
+        "--detection",
+        choices=DETECTION_MODES,
+        default="full",
+        help="Run NER on every text (full), only where a prefilter finds candidates (auto), "
+        "or never (fast)",
+    )
+
+def _add_directory_arguments(parser):
+    parser.add_argument("--input_dir", help="Process every matching file of this directory instead")
+    parser.add_argument(
+        "--glob", default="*", help="Files of --input_dir to process, e.g. '**/*.txt'"
+    )
+    parser.add_argument("--output_dir", help="Directory the results of --input_dir are written to")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes for --input_dir")
+
+def _add_stream_arguments(parser):
+    parser.add_argument(
+        "--format",
+        choices=("text",) + STREAM_FORMATS + ("csv",),
+        default="text",
+        help="Treat the input as one document (text) or stream it record by record (jsonl, lines, "
+        "csv); use - as the file name for stdin/stdout",
+    )
+    parser.add_argument("--text_field", default="text", help="Key of the text in JSONL records")
+    parser.add_argument(
+        "--map_field", default="anonymization_map", help="Key of the embedded map in JSONL records"
+    )
+
+def _add_structured_arguments(parser, fields):
+    if fields:
+        parser.add_argument(
+            "--include",
+            action="append",
+            help="Anonymize only this field of every record, e.g. 'user.name' or "
+            "'messages.*.text'; may be repeated (csv, and jsonl records as a whole)",
+        )
+        parser.add_argument(
+            "--exclude", action="append", default=[], help="Leave this field alone; may be repeated"
+        )
+    else:
+        parser.add_argument(
+            "--structured",
+            action="store_true",
+            help="Restore every field of jsonl records anonymized with --include/--exclude",
+        )
+    parser.add_argument(
+        "--map_scope",
+        choices=MAP_SCOPES,
+        default="record",
+        help="Number placeholders per record, per --batch_size records, or for the whole file "
+        "with one map file whatever the batch size (csv, jsonl with --include/--exclude)",
+    )
+
+def _is_structured(args):
+    if args.format == "csv" or args.map_scope != "record" or getattr(args, "structured", False):
+        return True
+    return bool(getattr(args, "include", None) or getattr(args, "exclude", None))
+
+def anonymize_text(input_file, output_file, detection="full", map_format="json"):
+    watch = default_instrumentation.stopwatch()
     with open(input_file, "r") as f:
         text = f.read()
+    watch.lap("io")
 
-    entities = recognize_entities(text)
-    anonymized_text, anonymization_map = anonymize(text)
+    anonymized_text, anonymization_map = anonymize(text, detection=detection)
+    watch.restart()
     
     with open(output_file, "w") as f:
         f.write(anonymized_text)
     
-    map_file = f"{output_file}.json"
-    with open(map_file, "w") as f:
-        json.dump(anonymization_map, f, indent=2)
+    map_file = f"{output_file}{MAP_FILE_SUFFIXES[map_format]}"
+    write_map(map_file, anonymization_map, map_format)
+    watch.lap("io")
     
     return output_file, map_file
 
-def deanonymize_text(input_file, output_file, map_file):
+def deanonymize_text(input_file, output_file, map_file, on_unknown="keep"):
+    watch = default_instrumentation.stopwatch()
     with open(input_file, "r") as f:
         text = f.read()
 
-    with open(map_file, "r") as f:
-        anonymization_map = json.load(f)
+    # Only the placeholders that occur in the text are read from indexed maps.
+    anonymization_map = load_map(map_file, text)
+    watch.lap("io")
 
-    de_anonymized_text = deanonymize(text, anonymization_map)
+    de_anonymized_text = deanonymize(text, anonymization_map, on_unknown=on_unknown)
+    watch.restart()
     
     with open(output_file, "w") as f:
         f.write(de_anonymized_text)
+    watch.lap("io")
     
     return output_file
 
@@ -148,13 +191,155 @@ def main():
     parser = create_parser()
     args = parser.parse_args()
 
+    if args.command is None:
+        parser.print_help()
+        return
+
+    metrics_file = getattr(args, "metrics_file", None)
+    if metrics_file:
+        default_instrumentation.enable()
+    try:
+        _run_command(parser, args)
+    finally:
+        if metrics_file:
+            with open(metrics_file, "w") as f:
+                f.write(default_instrumentation.prometheus())
+
+def _run_command(parser, args):
+    if args.command == "convert-map":
+        convert_map(args.input_file, args.output_file, args.map_format)
+        print(f"Map saved to {args.output_file} ({args.map_format})")
+        return
+
+    if args.command == "serve":
+        if args.terms_file:
+            anonymizer = Anonymizer.from_terms_file(args.terms_file, detection=args.detection)
+        else:
+            anonymizer = Anonymizer(detection=args.detection)
+        serve(
+            anonymizer,
+            host=args.host,
+            port=args.port,
+            path=args.unix_socket,
+            max_batch_size=args.max_batch_size,
+            max_wait=args.max_wait_ms / 1000,
+            max_queue=args.max_queue,
+        )
+        return
+
+    if args.input_dir:
+        if _is_structured(args):
+            parser.error("--input_dir does not support csv or --include/--exclude")
+        if args.input_file or args.output_file or not args.output_dir:
+            parser.error("--input_dir takes --output_dir instead of --input_file/--output_file")
+        try:
+            summary = run_directory(
+                args.command,
+                args.input_dir,
+                args.output_dir,
+                pattern=args.glob,
+                fmt=args.format,
+                workers=args.workers,
+                on_unknown=getattr(args, "on_unknown", "keep"),
+                detection=getattr(args, "detection", "full"),
+                map_format=getattr(args, "map_format", "json"),
+            )
+        except ValueError as error:
+            parser.error(str(error))
+        print(summary)
+        if summary.failed:
+            sys.exit(1)
+        return
+    if not args.input_file or not args.output_file:
+        parser.error("--input_file and --output_file are required")
+
+    # Keep status messages out of the data when results are written to stdout
+    status = sys.stderr if args.output_file == "-" else sys.stdout
+
+    if _is_structured(args):
+        if args.format not in ("jsonl", "csv"):
+            parser.error("field-aware anonymization requires --format jsonl or csv")
+        try:
+            _run_structured(args, status)
+        except ValueError as error:
+            parser.error(str(error))
+        return
+
     if args.command == "anonymize":
-        output_file, map_file = anonymize_text(args.input_file, args.output_file)
-        print(f"Anonymized text saved to {output_file}")
-        print(f"Anonymization map saved to {map_file}")
+        if args.format == "text":
+            output_file, map_file = anonymize_text(
+                args.input_file,
+                args.output_file,
+                detection=args.detection,
+                map_format=args.map_format,
+            )
+        else:
+            try:
+                output_file, map_file = stream_anonymize(
+                    args.input_file,
+                    args.output_file,
+                    args.format,
+                    map_file=args.map_file,
+                    text_field=args.text_field,
+                    map_field=args.map_field,
+                    batch_size=args.batch_size,
+                    detection=args.detection,
+                )
+            except ValueError as error:
+                parser.error(str(error))
+        print(f"Anonymized text saved to {output_file}", file=status)
+        if map_file:
+            print(f"Anonymization map saved to {map_file}", file=status)
     elif args.command == "deanonymize":
-        output_file = deanonymize_text(args.input_file, args.output_file, args.map_file)
-        print(f"De-anonymized text saved to {output_file}")
+        if args.format == "text":
+            if not args.map_file:
+                parser.error("--map_file is required for the text format")
+            output_file = deanonymize_text(
+                args.input_file, args.output_file, args.map_file, on_unknown=args.on_unknown
+            )
+        else:
+            try:
+                output_file = stream_deanonymize(
+                    args.input_file,
+                    args.output_file,
+                    args.format,
+                    map_file=args.map_file,
+                    text_field=args.text_field,
+                    map_field=args.map_field,
+                    on_unknown=args.on_unknown,
+                )
+            except ValueError as error:
+                parser.error(str(error))
+        print(f"De-anonymized text saved to {output_file}", file=status)
+
+def _run_structured(args, status):
+    if args.command == "anonymize":
+        output_file, map_file = stream_anonymize_structured(
+            args.input_file,
+            args.output_file,
+            args.format,
+            map_file=args.map_file,
+            include=args.include,
+            exclude=args.exclude,
+            map_field=args.map_field,
+            map_scope=args.map_scope,
+            batch_size=args.batch_size,
+            detection=args.detection,
+        )
+        print(f"Anonymized records saved to {output_file}", file=status)
+        if map_file:
+            print(f"Anonymization maps saved to {map_file}", file=status)
+    else:
+        output_file = stream_deanonymize_structured(
+            args.input_file,
+            args.output_file,
+            args.format,
+            map_file=args.map_file,
+            map_field=args.map_field,
+            map_scope=args.map_scope,
+            on_unknown=args.on_unknown,
+        )
+        print(f"De-anonymized records saved to {output_file}", file=status)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,125 @@
+import json
+import os
+import sqlite3
+from pathlib import Path
+from typing import Dict, Iterable, List, Mapping, Optional
+
+from .core import PLACEHOLDER_PATTERN
+
+# Formats an anonymization map can be saved in:
+#   "json": indented JSON, the original format.
+#   "compact": JSON without whitespace.
+#   "sqlite": a SQLite database indexed by placeholder, from which only the placeholders of
+#             a text are read.
+MAP_FORMATS = ("json", "compact", "sqlite")
+
+# The suffix of map files written next to an output file, per map format.
+MAP_FILE_SUFFIXES = {"json": ".json", "compact": ".json", "sqlite": ".db"}
+
+# Every SQLite database starts with this header; JSON never does.
+_SQLITE_MAGIC = b"SQLite format 3\x00"
+
+# Placeholders looked up per query, below SQLite's limit on query parameters.
+_LOOKUP_BATCH = 500
+
+
+def write_map(path: str, anonymization_map: Mapping[str, str], fmt: str = "json") -> None:
+    """
+    Saves an anonymization map.
+
+    Args:
+        path: The file to write. An existing file is replaced.
+        anonymization_map: The map.
+        fmt: One of :data:`MAP_FORMATS`.
+    """
+    if fmt == "sqlite":
+        _write_sqlite(path, anonymization_map.items())
+    elif fmt in ("json", "compact"):
+        with open(path, "w") as f:
+            if fmt == "json":
+                json.dump(anonymization_map, f, indent=2)
+            else:
+                json.dump(anonymization_map, f, ensure_ascii=False, separators=(",", ":"))
+    else:
+        raise ValueError(f"map format must be one of {', '.join(MAP_FORMATS)}, not {fmt!r}")
+
+
+def load_map(path: str, text: Optional[str] = None) -> Dict[str, str]:
+    """
+    Reads an anonymization map in any of the :data:`MAP_FORMATS`, detected from its content.
+
+    Args:
+        path: The map file.
+        text: The anonymized text the map is needed for. SQLite maps then only read the
+            entries of the placeholders that occur in it, instead of the whole map.
+
+    Returns:
+        The map, or the part of it that ``text`` needs.
+    """
+    with open(path, "rb") as f:
+        if f.read(len(_SQLITE_MAGIC)) != _SQLITE_MAGIC:
+            f.seek(0)
+            anonymization_map: Dict[str, str] = json.load(f)
+            return anonymization_map
+    return _read_sqlite(path, text)
+
+
+def convert_map(input_file: str, output_file: str, fmt: str) -> None:
+    """
+    Saves a map file in another format.
+
+    Args:
+        input_file: The map to read, in any format.
+        output_file: The file to write.
+        fmt: One of :data:`MAP_FORMATS`.
+    """
+    write_map(output_file, load_map(input_file), fmt)
+
+
+def _write_sqlite(path: str, entries: Iterable) -> None:
+    if os.path.exists(path):
+        os.remove(path)
+    db = sqlite3.connect(path)
+    try:
+        db.execute("PRAGMA journal_mode=OFF")
+        # Stored in placeholder order, so that a lookup reads a single page. The position
+        # keeps the order of the map. Placeholders that do not follow the
+        # [ENTITY_<TYPE>_<N>] pattern, from hand-written maps, are indexed separately:
+        # they have to be searched for by name.
+        db.execute(
+            "CREATE TABLE map (placeholder TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "position INTEGER NOT NULL, regular INTEGER NOT NULL) WITHOUT ROWID"
+        )
+        db.execute("CREATE INDEX irregular ON map (placeholder) WHERE regular = 0")
+        db.executemany(
+            "INSERT INTO map (placeholder, value, position, regular) VALUES (?, ?, ?, ?)",
+            (
+                (key, value, position, PLACEHOLDER_PATTERN.fullmatch(key) is not None)
+                for position, (key, value) in enumerate(entries)
+            ),
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def _read_sqlite(path: str, text: Optional[str]) -> Dict[str, str]:
+    db = sqlite3.connect(Path(path).resolve().as_uri() + "?mode=ro", uri=True)
+    try:
+        if text is None:
+            return dict(db.execute("SELECT placeholder, value FROM map ORDER BY position"))
+        irregular = db.execute("SELECT placeholder, value FROM map WHERE regular = 0")
+        anonymization_map = {key: value for key, value in irregular if key in text}
+        placeholders: List[str] = list(set(PLACEHOLDER_PATTERN.findall(text)))
+        for start in range(0, len(placeholders), _LOOKUP_BATCH):
+            batch = placeholders[start : start + _LOOKUP_BATCH]
+            anonymization_map.update(
+                db.execute(
+                    "SELECT placeholder, value FROM map WHERE placeholder IN "
+                    f"({','.join('?' * len(batch))})",
+                    batch,
+                )
+            )
+        return anonymization_map
+    finally:
+        db.close()
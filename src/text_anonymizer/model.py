@@ -0,0 +1,118 @@
+import os
+import threading
+from typing import Iterable, Optional
+
+import spacy
+from spacy.language import Language
+
+from .instrumentation import default_instrumentation
+
+DEFAULT_MODEL = "en_core_web_sm"
+
+# Components of the trained English pipelines that named entity recognition does not
+# read from. The ``ner`` component in the sm/md/lg pipelines carries its own internal
+# tok2vec layer, so the shared ``tok2vec`` can be excluded as well.
+DEFAULT_EXCLUDE = ("tok2vec", "tagger", "parser", "senter", "attribute_ruler", "lemmatizer")
+
+
+class ModelManager:
+    """
+    Loads a spaCy pipeline once, on first use, and shares it between callers.
+
+    Args:
+        model_name: Name or path of the spaCy pipeline. Defaults to the
+            ``TEXT_ANONYMIZER_MODEL`` environment variable, or ``en_core_web_sm``.
+        exclude: Pipeline components that are not loaded at all.
+    """
+
+    def __init__(
+        self, model_name: Optional[str] = None, exclude: Iterable[str] = DEFAULT_EXCLUDE
+    ):
+        self.model_name: str = (
+            model_name or os.environ.get("TEXT_ANONYMIZER_MODEL") or DEFAULT_MODEL
+        )
+        self.exclude = tuple(exclude)
+        self._nlp: Optional[Language] = None
+        self._lock = threading.Lock()
+        self._fingerprint: Optional[str] = None
+        self.version = 0
+
+    @property
+    def loaded(self) -> bool:
+        """Whether the pipeline has been loaded already."""
+        return self._nlp is not None
+
+    def get(self) -> Language:
+        """
+        Returns the shared pipeline, loading it on the first call.
+
+        Returns:
+            The loaded spaCy pipeline.
+        """
+        if self._nlp is None:
+            with self._lock:
+                if self._nlp is None:
+                    watch = default_instrumentation.stopwatch()
+                    self._nlp = spacy.load(self.model_name, exclude=list(self.exclude))
+                    watch.lap("load")
+        return self._nlp
+
+    @property
+    def fingerprint(self) -> str:
+        """Identifies the pipeline by name, installed version and excluded components."""
+        if self._fingerprint is None:
+            version = spacy.util.get_package_version(self.model_name)
+            if version is None:
+                # Not an installed package, e.g. a path: ask the pipeline itself.
+                version = self.get().meta.get("version")
+            self._fingerprint = f"{self.model_name}\0{version}\0{','.join(sorted(self.exclude))}"
+        return self._fingerprint
+
+    def warm_up(self) -> Language:
+        """
+        Loads the pipeline and runs it once so that the first real call is not slowed down.
+
+        Returns:
+            The loaded spaCy pipeline.
+        """
+        nlp = self.get()
+        nlp("John Smith visited Berlin.")
+        return nlp
+
+    def configure(
+        self, model_name: Optional[str] = None, exclude: Optional[Iterable[str]] = None
+    ) -> None:
+        """
+        Changes the model name or excluded components, dropping a pipeline that was
+        loaded with the previous settings.
+
+        Args:
+            model_name: Name or path of the spaCy pipeline.
+            exclude: Pipeline components that are not loaded at all.
+        """
+        with self._lock:
+            if model_name is not None:
+                self.model_name = model_name
+            if exclude is not None:
+                self.exclude = tuple(exclude)
+            self._nlp = None
+            self._fingerprint = None
+            self.version += 1
+
+
+default_manager = ModelManager()
+
+
+def get_nlp() -> Language:
+    """Returns the pipeline shared by every entry point of the library."""
+    return default_manager.get()
+
+
+def warm_up() -> Language:
+    """Loads and exercises the shared pipeline before the first document arrives."""
+    return default_manager.warm_up()
+
+
+def configure(model_name: Optional[str] = None, exclude: Optional[Iterable[str]] = None) -> None:
+    """Changes the model name or excluded components of the shared pipeline."""
+    default_manager.configure(model_name=model_name, exclude=exclude)
@@ -0,0 +1,74 @@
+from bisect import bisect_right
+from typing import List, NamedTuple
+
+
+class ReplacedSpan(NamedTuple):
+    """A span of the original text and the placeholder that replaced it."""
+
+    original_start: int
+    original_end: int
+    anonymized_start: int
+    anonymized_end: int
+
+
+class OffsetMap:
+    """
+    Projects character offsets between an original text and its anonymized version.
+
+    Offsets outside replaced spans move by the accumulated difference in length of the
+    preceding replacements. Offsets inside a replaced span map to the start of the span
+    it was replaced with.
+
+    Args:
+        spans: The replaced spans, in text order.
+    """
+
+    def __init__(self, spans: List[ReplacedSpan]):
+        self.spans = spans
+        self._original_starts = [span.original_start for span in spans]
+        self._anonymized_starts = [span.anonymized_start for span in spans]
+
+    def __len__(self) -> int:
+        return len(self.spans)
+
+    def __iter__(self):
+        return iter(self.spans)
+
+    def __repr__(self) -> str:
+        return f"OffsetMap({self.spans!r})"
+
+    def to_anonymized(self, offset: int) -> int:
+        """
+        Projects an offset in the original text onto the anonymized text.
+
+        Args:
+            offset: A character offset in the original text.
+
+        Returns:
+            The corresponding character offset in the anonymized text.
+        """
+        index = bisect_right(self._original_starts, offset) - 1
+        if index < 0:
+            return offset
+        span = self.spans[index]
+        if offset < span.original_end:
+            return span.anonymized_start
+        return offset - span.original_end + span.anonymized_end
+
+    def to_original(self, offset: int) -> int:
+        """
+        Projects an offset in the anonymized text back onto the original text.
+
+        Args:
+            offset: A character offset in the anonymized text.
+
+        Returns:
+            The corresponding character offset in the original text.
+        """
+        index = bisect_right(self._anonymized_starts, offset) - 1
+        if index < 0:
+            return offset
+        span = self.spans[index]
+        if offset < span.anonymized_end:
+            return span.original_start
+        return offset - span.anonymized_end + span.original_end
@@ -0,0 +1,302 @@
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+from .instrumentation import default_instrumentation
+from .mapfile import MAP_FILE_SUFFIXES
+from .model import warm_up
+from .streaming import stream_anonymize, stream_deanonymize
+
+# Suffix of the map written next to each output file, per format. JSONL records carry
+# their maps inline. The maps of text files can also be saved in other map formats, see
+# MAP_FILE_SUFFIXES.
+MAP_SUFFIXES = {"text": ".json", "lines": ".jsonl", "jsonl": None}
+
+_PARTIAL_SUFFIX = ".part"
+
+
+class FileJob(NamedTuple):
+    """One input file of a directory run and where its results go."""
+
+    input_file: str
+    output_file: str
+    map_file: Optional[str]
+    size: int
+
+
+class RunSummary(NamedTuple):
+    """What a directory run did and how fast."""
+
+    files: int
+    skipped: int
+    failed: int
+    bytes: int
+    seconds: float
+
+    @property
+    def files_per_second(self) -> float:
+        return self.files / self.seconds if self.seconds else 0.0
+
+    @property
+    def bytes_per_second(self) -> float:
+        return self.bytes / self.seconds if self.seconds else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.files} files ({self.bytes} bytes) in {self.seconds:.2f}s: "
+            f"{self.files_per_second:.1f} files/s, {self.bytes_per_second:.0f} bytes/s; "
+            f"{self.skipped} skipped, {self.failed} failed"
+        )
+
+
+def plan_files(
+    command: str,
+    input_dir: str,
+    output_dir: str,
+    pattern: str = "*",
+    fmt: str = "text",
+    map_format: str = "json",
+) -> List[FileJob]:
+    """
+    Lists the files of a directory run, largest first.
+
+    Large files are started first so that a single big file does not keep one worker busy
+    after all others have finished. Output paths mirror the input paths below ``input_dir``.
+    When deanonymizing, the map of each input is expected next to it, where ``anonymize``
+    wrote it, in whichever map format it was saved, and map files are not treated as inputs.
+
+    Args:
+        command: ``"anonymize"`` or ``"deanonymize"``.
+        input_dir: The directory to read from.
+        output_dir: The directory to write to.
+        pattern: A glob pattern relative to ``input_dir``, e.g. ``"**/*.txt"``.
+        fmt: The input format, see :data:`MAP_SUFFIXES`.
+        map_format: The format of the maps of text files written when anonymizing, see
+            :data:`~text_anonymizer.mapfile.MAP_FORMATS`.
+
+    Returns:
+        The jobs, sorted by input size in descending order.
+    """
+    source = Path(input_dir).resolve()
+    target = Path(output_dir).resolve()
+    if source == target:
+        raise ValueError("--output_dir must differ from --input_dir")
+    map_suffix = MAP_SUFFIXES[fmt]
+    map_suffixes = (map_suffix,) if map_suffix else ()
+    if fmt == "text":
+        map_suffix = MAP_FILE_SUFFIXES[map_format]
+        map_suffixes = tuple(dict.fromkeys(MAP_FILE_SUFFIXES.values()))
+
+    paths = [
+        path
+        for path in source.glob(pattern)
+        if path.is_file()
+        and target not in path.parents
+        and not path.name.endswith(_PARTIAL_SUFFIX)
+    ]
+    if command == "deanonymize" and map_suffixes:
+        names = {str(path) for path in paths}
+        paths = [
+            path
+            for path in paths
+            if not any(
+                path.name.endswith(suffix) and str(path)[: -len(suffix)] in names
+                for suffix in map_suffixes
+            )
+        ]
+
+    jobs = []
+    for path in paths:
+        output_file = target / path.relative_to(source)
+        if command == "anonymize":
+            map_file = f"{output_file}{map_suffix}" if map_suffix else None
+        elif map_suffixes:
+            candidates = [f"{path}{suffix}" for suffix in map_suffixes]
+            map_file = next((name for name in candidates if os.path.exists(name)), candidates[0])
+        else:
+            map_file = None
+        jobs.append(FileJob(str(path), str(output_file), map_file, path.stat().st_size))
+    jobs.sort(key=lambda job: job.size, reverse=True)
+    return jobs
+
+
+def is_complete(command: str, job: FileJob) -> bool:
+    """
+    Whether a job's results exist and are at least as new as its input.
+
+    Results are renamed into place only once fully written, so an interrupted run never
+    leaves a file that looks complete.
+    """
+    outputs = [job.output_file]
+    if command == "anonymize" and job.map_file:
+        outputs.append(job.map_file)
+    try:
+        input_mtime = os.stat(job.input_file).st_mtime
+        return all(os.stat(output).st_mtime >= input_mtime for output in outputs)
+    except FileNotFoundError:
+        return False
+
+
+def run_job(
+    command: str,
+    job: FileJob,
+    fmt: str = "text",
+    on_unknown: str = "keep",
+    detection: str = "full",
+    map_format: str = "json",
+) -> int:
+    """
+    Processes one file, writing to temporary files that are renamed into place at the end.
+
+    Args:
+        command: ``"anonymize"`` or ``"deanonymize"``.
+        job: The file to process.
+        fmt: ``"text"``, ``"jsonl"`` or ``"lines"``.
+        on_unknown: See :func:`~text_anonymizer.core.deanonymize`.
+        detection: See :func:`~text_anonymizer.core.recognize_entities`.
+        map_format: The format of the maps of text files, see
+            :data:`~text_anonymizer.mapfile.MAP_FORMATS`.
+
+    Returns:
+        The size of the input in bytes.
+    """
+    # Imported here, as main imports this module for the CLI.
+    from .main import anonymize_text, deanonymize_text
+
+    os.makedirs(os.path.dirname(job.output_file), exist_ok=True)
+    partial_output = job.output_file + _PARTIAL_SUFFIX
+    renames: List[Tuple[str, str]] = []
+    if command == "anonymize":
+        partial_map = job.map_file + _PARTIAL_SUFFIX if job.map_file else None
+        if fmt == "text":
+            # anonymize_text names the map after the output it was given.
+            _, written_map = anonymize_text(
+                job.input_file, partial_output, detection=detection, map_format=map_format
+            )
+            if partial_map is not None:
+                os.replace(written_map, partial_map)
+        else:
+            stream_anonymize(
+                job.input_file, partial_output, fmt, map_file=partial_map, detection=detection
+            )
+        if partial_map and job.map_file:
+            renames.append((partial_map, job.map_file))
+    else:
+        if fmt == "text":
+            deanonymize_text(job.input_file, partial_output, job.map_file, on_unknown=on_unknown)
+        else:
+            stream_deanonymize(
+                job.input_file, partial_output, fmt, map_file=job.map_file, on_unknown=on_unknown
+            )
+    # The output goes last: once it is in place, the job counts as complete.
+    renames.append((partial_output, job.output_file))
+    for partial, final in renames:
+        os.replace(partial, final)
+    return job.size
+
+
+def _print_error(message: str) -> None:
+    print(message, file=sys.stderr)
+
+
+def _start_worker(command: str, instrument: bool, detection: str) -> None:
+    if instrument:
+        default_instrumentation.enable()
+    if command == "anonymize" and detection != "fast":
+        warm_up()
+
+
+def _run_job_in_worker(
+    command: str, job: FileJob, fmt: str, on_unknown: str, detection: str, map_format: str
+):
+    size = run_job(command, job, fmt, on_unknown, detection, map_format)
+    if not default_instrumentation.enabled:
+        return size, None
+    # Hand this job's timings to the parent and start from zero for the next one.
+    snapshot = default_instrumentation.snapshot()
+    default_instrumentation.reset()
+    return size, snapshot
+
+
+def run_directory(
+    command: str,
+    input_dir: str,
+    output_dir: str,
+    pattern: str = "*",
+    fmt: str = "text",
+    workers: int = 1,
+    on_unknown: str = "keep",
+    detection: str = "full",
+    map_format: str = "json",
+    log: Optional[Callable[[str], None]] = None,
+) -> RunSummary:
+    """
+    Anonymizes or deanonymizes every matching file of a directory.
+
+    With more than one worker, files are processed by a pool of processes that each load
+    the model once, when they start, and keep it for all their files. Timings and counters
+    collected in the workers are added to the instrumentation of this process. Files whose
+    results are already complete are skipped, so an interrupted run can simply be restarted.
+
+    Args:
+        command: ``"anonymize"`` or ``"deanonymize"``.
+        input_dir: The directory to read from.
+        output_dir: The directory to write to.
+        pattern: A glob pattern relative to ``input_dir``.
+        fmt: ``"text"``, ``"jsonl"`` or ``"lines"``.
+        workers: The number of worker processes.
+        on_unknown: See :func:`~text_anonymizer.core.deanonymize`.
+        detection: See :func:`~text_anonymizer.core.recognize_entities`.
+        map_format: See :func:`plan_files`.
+        log: Called with a message for every file that fails.
+
+    Returns:
+        A summary of the run.
+    """
+    if log is None:
+        log = _print_error
+
+    started = time.perf_counter()
+    jobs = plan_files(command, input_dir, output_dir, pattern, fmt, map_format)
+    pending = [job for job in jobs if not is_complete(command, job)]
+    skipped = len(jobs) - len(pending)
+    files = failed = processed_bytes = 0
+
+    if workers <= 1 or len(pending) <= 1:
+        for job in pending:
+            try:
+                processed_bytes += run_job(
+                    command, job, fmt, on_unknown, detection, map_format
+                )
+                files += 1
+            except Exception as error:
+                failed += 1
+                log(f"Failed to {command} {job.input_file}: {error}")
+    else:
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(pending)),
+            initializer=_start_worker,
+            initargs=(command, default_instrumentation.enabled, detection),
+        ) as executor:
+            # Submitted largest first; the pool hands work out in submission order.
+            futures = {
+                executor.submit(
+                    _run_job_in_worker, command, job, fmt, on_unknown, detection, map_format
+                ): job
+                for job in pending
+            }
+            for future in as_completed(futures):
+                try:
+                    size, snapshot = future.result()
+                    processed_bytes += size
+                    files += 1
+                    if snapshot is not None:
+                        default_instrumentation.merge(snapshot)
+                except Exception as error:
+                    failed += 1
+                    log(f"Failed to {command} {futures[future].input_file}: {error}")
+
+    return RunSummary(files, skipped, failed, processed_bytes, time.perf_counter() - started)
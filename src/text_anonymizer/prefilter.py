@@ -0,0 +1,85 @@
+import re
+
+# How entities are detected:
+#   "full": NER, regular expressions and terms run on every text.
+#   "auto": regular expressions and terms run on every text, NER only on texts (or chunks of
+#           long texts) in which the prefilter finds something NER could report.
+#   "fast": regular expressions and terms only. The spaCy model is never loaded.
+DETECTION_MODES = ("full", "auto", "fast")
+
+# Capitalized words that are never names: the pronoun "I", acknowledgements and log levels.
+_NEVER_NAMES = "I OK Ok INFO WARN WARNING ERROR DEBUG TRACE FATAL".split()
+
+# Capitalized words that start sentences or lines without being part of a name. They are only
+# skipped at the start of a sentence; elsewhere a capital means a name ("ask Can about it").
+# Words that are also common names, like "May" and "Will", are not listed at all.
+_SENTENCE_STARTS = (
+    "A An The This That These Those It Its We Our You Your He His She Her They Their My Me "
+    "There Here What When Where Which Who Why How If In On At By For From To Of With As And "
+    "But Or So No Not Yes Please Thanks Thank Hi Hello Dear Is Are Was Were Be Been Do Does "
+    "Did Can Could Would Should Might Must All Some Any Each Every After Before Then Also"
+).split()
+
+# A capital letter that does not start one of the words above in its place. Those words are
+# matched by the first two alternatives and skipped, so a match of the group is what counts.
+# A sentence starts at the beginning of a line, or after ".", "!", "?", ":" or ";", possibly
+# behind quotes, brackets or list markers.
+_CAPITAL = re.compile(
+    r"\b(?:%s)\b|(?:^|[.!?:;]\s+)[\s\"'(\[*-]*(?:%s)\b|([A-Z])"
+    % ("|".join(_NEVER_NAMES), "|".join(_SENTENCE_STARTS)),
+    re.MULTILINE,
+)
+
+# Digits, and the lowercase words spaCy's numeric and temporal labels (DATE, TIME, CARDINAL,
+# ORDINAL, QUANTITY, PERCENT) are commonly made of.
+_NUMERIC = re.compile(
+    r"\d|\b(?:zero|one|two|three|four|five|six|seven|eight|nine|ten|eleven|twelve|thirteen|"
+    r"fourteen|fifteen|sixteen|seventeen|eighteen|nineteen|twenty|thirty|forty|fifty|sixty|"
+    r"seventy|eighty|ninety|hundred|thousand|million|billion|trillion|dozen|half|quarter|"
+    r"first|second|third|fourth|fifth|sixth|seventh|eighth|ninth|tenth|once|twice|percent|"
+    r"yesterday|today|tonight|tomorrow|morning|afternoon|evening|night|noon|midnight|"
+    r"minute|hour|day|week|weekend|fortnight|month|year|decade|century|ago|annual|annually|"
+    r"daily|weekly|monthly|quarterly|yearly|spring|summer|autumn|fall|winter|"
+    r"january|february|march|april|may|june|july|august|september|october|november|december|"
+    r"jan|feb|apr|jun|jul|aug|sep|sept|oct|nov|dec|monday|tuesday|wednesday|thursday|"
+    r"friday|saturday|sunday|tue|tues|thu|thur|thurs|fri)s?\b",
+    re.IGNORECASE,
+)
+
+
+def _has_capital(text: str) -> bool:
+    for match in _CAPITAL.finditer(text):
+        if match.group(1):
+            return True
+    if not text.isascii():
+        # Capitals outside ASCII are rare enough to be checked one character at a time.
+        return any(character.isupper() for character in text if ord(character) > 127)
+    return False
+
+
+def needs_ner(text: str) -> bool:
+    """
+    Decides whether NER could find anything in a text.
+
+    This is a conservative, regex-only check: names, organizations and places are written
+    with a capital letter, and numeric and temporal entities contain a digit or one of a
+    small set of number, time, month and weekday words. Texts without either, like most
+    status messages, cannot yield NER entities and may skip the spaCy pipeline. Capitalized
+    function words do not count at the start of a sentence ("The", "This", ...), and log
+    levels ("ERROR", ...) nowhere.
+
+    Args:
+        text: The text, or a chunk of it.
+
+    Returns:
+        ``True`` if NER should run on the text.
+    """
+    return _NUMERIC.search(text) is not None or _has_capital(text)
+
+
+def check_detection(detection: str) -> None:
+    """Raises ``ValueError`` for an unknown detection mode."""
+    if detection not in DETECTION_MODES:
+        raise ValueError(
+            f"detection must be one of {', '.join(DETECTION_MODES)}, not {detection!r}"
+        )
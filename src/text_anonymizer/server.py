@@ -0,0 +1,428 @@
+import asyncio
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from typing import Dict, List, Optional, Tuple
+
+from .anonymizer import Anonymizer
+from .core import UnknownPlaceholderError, deanonymize
+from .instrumentation import default_instrumentation
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8000
+DEFAULT_MAX_BATCH_SIZE = 64
+DEFAULT_MAX_WAIT = 0.005
+DEFAULT_MAX_QUEUE = 1024
+DEFAULT_MAX_BODY = 10 * 1024 * 1024
+
+
+class ServiceOverloadedError(RuntimeError):
+    """Raised when a request would exceed the number of texts the service may hold."""
+
+
+class _HTTPError(Exception):
+    def __init__(self, status: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class MicroBatcher:
+    """
+    Groups texts from concurrent requests into batches for :meth:`Anonymizer.anonymize_batch`.
+
+    A batch is started with the first waiting text and closed when it holds
+    ``max_batch_size`` texts or ``max_wait`` seconds have passed, whichever comes first.
+    Batches run one at a time on a worker thread, so the event loop keeps accepting
+    requests while the model is busy, and the next batch fills up in the meantime.
+
+    Args:
+        anonymizer: The anonymizer that processes the batches.
+        max_batch_size: The largest number of texts passed to the pipeline at once.
+        max_wait: How long, in seconds, a batch waits for more texts.
+        max_queue: The largest number of texts waiting or being processed. Requests that
+            would exceed it are rejected with :class:`ServiceOverloadedError`.
+    """
+
+    def __init__(
+        self,
+        anonymizer: Anonymizer,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        max_wait: float = DEFAULT_MAX_WAIT,
+        max_queue: int = DEFAULT_MAX_QUEUE,
+    ):
+        self.anonymizer = anonymizer
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.pending = 0
+        self.batches = 0
+        self.batched_texts = 0
+        self.rejected = 0
+        # Created in start(), on the loop that will use it.
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="anonymizer")
+
+    async def start(self) -> None:
+        """Starts collecting batches on the running event loop."""
+        self._queue = asyncio.Queue()
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        """Stops collecting batches. Texts still waiting are failed."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        while self._queue is not None and not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(ServiceOverloadedError("The service is shutting down"))
+        self._executor.shutdown(wait=False)
+
+    async def anonymize(self, texts: List[str]) -> List[Tuple[str, Dict[str, str]]]:
+        """
+        Anonymizes texts as part of the next batches.
+
+        Args:
+            texts: The texts to be anonymized.
+
+        Returns:
+            The ``(anonymized_text, anonymization_map)`` pairs, in the order of ``texts``.
+
+        Raises:
+            ServiceOverloadedError: If the texts do not fit into the queue.
+        """
+        if self.pending + len(texts) > self.max_queue:
+            self.rejected += 1
+            raise ServiceOverloadedError(
+                f"{self.pending} texts are already queued, the limit is {self.max_queue}"
+            )
+        queue = self._queue
+        if queue is None:
+            raise RuntimeError("The service has not been started")
+        loop = asyncio.get_running_loop()
+        futures = []
+        for text in texts:
+            future = loop.create_future()
+            queue.put_nowait((text, future))
+            futures.append(future)
+        self.pending += len(texts)
+        return list(await asyncio.gather(*futures))
+
+    async def _next_batch(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            texts = [text for text, _ in batch]
+            try:
+                results = await loop.run_in_executor(
+                    self._executor,
+                    lambda: list(self.anonymizer.anonymize_batch(texts, batch_size=len(texts))),
+                )
+            except Exception as error:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+            else:
+                for (_, future), result in zip(batch, results):
+                    # The client may have gone away in the meantime.
+                    if not future.done():
+                        future.set_result(result)
+            finally:
+                self.pending -= len(batch)
+                self.batches += 1
+                self.batched_texts += len(batch)
+
+
+class AnonymizationServer:
+    """
+    A small HTTP/1.1 JSON service that keeps the model loaded between requests.
+
+    Endpoints:
+
+    - ``POST /anonymize`` with ``{"text": ...}`` returns ``{"anonymized_text": ...,
+      "anonymization_map": {...}}``.
+    - ``POST /anonymize/batch`` with ``{"texts": [...]}`` returns ``{"results": [...]}``.
+    - ``POST /deanonymize`` with ``{"text": ..., "anonymization_map": {...}}`` and an
+      optional ``"on_unknown"`` returns ``{"text": ...}``.
+    - ``POST /deanonymize/batch`` with ``{"items": [...]}`` of such objects returns
+      ``{"texts": [...]}``.
+    - ``GET /health`` and ``GET /metrics``, the latter in the Prometheus text format with
+      ``?format=prometheus``.
+
+    Anonymization requests are micro-batched across connections, see :class:`MicroBatcher`.
+    When the queue is full, requests fail fast with ``503 Service Unavailable``.
+
+    Args:
+        anonymizer: The anonymizer to use. Defaults to one without company terms.
+        max_batch_size: See :class:`MicroBatcher`.
+        max_wait: See :class:`MicroBatcher`.
+        max_queue: See :class:`MicroBatcher`.
+        max_body: The largest accepted request body, in bytes.
+    """
+
+    def __init__(
+        self,
+        anonymizer: Optional[Anonymizer] = None,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        max_wait: float = DEFAULT_MAX_WAIT,
+        max_queue: int = DEFAULT_MAX_QUEUE,
+        max_body: int = DEFAULT_MAX_BODY,
+    ):
+        self.anonymizer = anonymizer or Anonymizer()
+        self.batcher = MicroBatcher(self.anonymizer, max_batch_size, max_wait, max_queue)
+        self.max_body = max_body
+        self.requests: Dict[str, int] = {}
+        self.errors = 0
+        self.started = time.monotonic()
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._routes = {
+            "/anonymize": ("POST", self._anonymize),
+            "/anonymize/batch": ("POST", self._anonymize_batch),
+            "/deanonymize": ("POST", self._deanonymize),
+            "/deanonymize/batch": ("POST", self._deanonymize_batch),
+            "/health": ("GET", self._health),
+            "/metrics": ("GET", self._metrics),
+        }
+
+    async def start(
+        self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, path: Optional[str] = None
+    ) -> asyncio.AbstractServer:
+        """
+        Starts listening on a TCP port, or on a unix socket if ``path`` is given.
+
+        Args:
+            host: The address to bind to.
+            port: The port to bind to; ``0`` picks a free one.
+            path: The path of a unix socket to listen on instead.
+
+        Returns:
+            The listening server.
+        """
+        await self.batcher.start()
+        if path is not None:
+            self._server = await asyncio.start_unix_server(self._handle, path=path)
+        else:
+            self._server = await asyncio.start_server(self._handle, host, port)
+        return self._server
+
+    async def stop(self) -> None:
+        """Stops listening and fails the requests that are still queued."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        await self.batcher.stop()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                parts = request_line.decode("latin-1").split()
+                keep_alive = (
+                    len(parts) == 3
+                    and parts[2] == "HTTP/1.1"
+                    and headers.get("connection", "").lower() != "close"
+                )
+                try:
+                    if len(parts) != 3:
+                        raise _HTTPError(HTTPStatus.BAD_REQUEST, "Malformed request line")
+                    length = int(headers.get("content-length", 0))
+                    if length > self.max_body:
+                        keep_alive = False
+                        raise _HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Body too large")
+                    body = await reader.readexactly(length) if length > 0 else b""
+                    status, payload = HTTPStatus.OK, await self._dispatch(parts[0], parts[1], body)
+                except _HTTPError as error:
+                    self.errors += 1
+                    status, payload = error.status, {"error": str(error)}
+                except ValueError as error:
+                    self.errors += 1
+                    status, payload = HTTPStatus.BAD_REQUEST, {"error": str(error)}
+                except Exception as error:
+                    self.errors += 1
+                    status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": repr(error)}
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method: str, target: str, body: bytes):
+        path, _, query = target.partition("?")
+        route = self._routes.get(path)
+        if route is None:
+            raise _HTTPError(HTTPStatus.NOT_FOUND, f"No endpoint {path}")
+        expected_method, handler = route
+        if method != expected_method:
+            raise _HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, f"Use {expected_method} for {path}")
+        self.requests[path] = self.requests.get(path, 0) + 1
+        if path == "/metrics" and "format=prometheus" in query.split("&"):
+            return self._prometheus()
+        payload = json.loads(body) if body else {}
+        if not isinstance(payload, dict):
+            raise ValueError("The request body must be a JSON object")
+        try:
+            return await handler(payload)
+        except ServiceOverloadedError as error:
+            raise _HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, str(error))
+        except UnknownPlaceholderError as error:
+            raise _HTTPError(HTTPStatus.UNPROCESSABLE_ENTITY, str(error))
+        except (KeyError, TypeError) as error:
+            raise _HTTPError(HTTPStatus.BAD_REQUEST, f"Invalid request: {error!r}")
+
+    @staticmethod
+    async def _respond(writer, status: HTTPStatus, payload, keep_alive: bool) -> None:
+        if isinstance(payload, str):
+            body = payload.encode()
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            body = json.dumps(payload, ensure_ascii=False).encode()
+            content_type = "application/json"
+        head = (
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+    @staticmethod
+    def _texts(values) -> List[str]:
+        if not isinstance(values, list) or not all(isinstance(text, str) for text in values):
+            raise TypeError("expected a list of strings")
+        return values
+
+    async def _anonymize(self, payload: Dict) -> Dict:
+        [(anonymized_text, anonymization_map)] = await self.batcher.anonymize(
+            self._texts([payload["text"]])
+        )
+        return {"anonymized_text": anonymized_text, "anonymization_map": anonymization_map}
+
+    async def _anonymize_batch(self, payload: Dict) -> Dict:
+        results = await self.batcher.anonymize(self._texts(payload["texts"]))
+        return {
+            "results": [
+                {"anonymized_text": anonymized_text, "anonymization_map": anonymization_map}
+                for anonymized_text, anonymization_map in results
+            ]
+        }
+
+    @staticmethod
+    def _restore(item: Dict) -> str:
+        return deanonymize(
+            item["text"], item["anonymization_map"], on_unknown=item.get("on_unknown", "keep")
+        )
+
+    async def _deanonymize(self, payload: Dict) -> Dict:
+        # Restoring placeholders is a single regex scan, cheap enough for the event loop.
+        return {"text": self._restore(payload)}
+
+    async def _deanonymize_batch(self, payload: Dict) -> Dict:
+        return {"texts": [self._restore(item) for item in payload["items"]]}
+
+    async def _health(self, payload: Dict) -> Dict:
+        return {"status": "ok", "model_loaded": self.anonymizer.model.loaded}
+
+    async def _metrics(self, payload: Dict) -> Dict:
+        batcher = self.batcher
+        return {
+            "uptime_seconds": time.monotonic() - self.started,
+            "requests": dict(self.requests),
+            "errors": self.errors,
+            "rejected": batcher.rejected,
+            "queued_texts": batcher.pending,
+            "batches": batcher.batches,
+            "batched_texts": batcher.batched_texts,
+            "mean_batch_size": batcher.batched_texts / batcher.batches if batcher.batches else 0.0,
+            "instrumentation": default_instrumentation.snapshot(),
+        }
+
+    def _prometheus(self) -> str:
+        batcher = self.batcher
+        lines = ["# TYPE text_anonymizer_requests_total counter"]
+        for path, count in sorted(self.requests.items()):
+            lines.append(f'text_anonymizer_requests_total{{endpoint="{path}"}} {count}')
+        for name, kind, value in (
+            ("errors_total", "counter", self.errors),
+            ("rejected_total", "counter", batcher.rejected),
+            ("queued_texts", "gauge", batcher.pending),
+            ("batches_total", "counter", batcher.batches),
+            ("batched_texts_total", "counter", batcher.batched_texts),
+        ):
+            lines += [f"# TYPE text_anonymizer_{name} {kind}", f"text_anonymizer_{name} {value}"]
+        return "\n".join(lines) + "\n" + default_instrumentation.prometheus()
+
+
+def serve(
+    anonymizer: Optional[Anonymizer] = None,
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    path: Optional[str] = None,
+    **options,
+) -> None:
+    """
+    Loads the model and serves requests until interrupted, with instrumentation enabled.
+
+    The model is not loaded when the anonymizer's detection is ``"fast"``.
+
+    Args:
+        anonymizer: The anonymizer to use. Defaults to one without company terms.
+        host: The address to bind to.
+        port: The port to bind to.
+        path: The path of a unix socket to listen on instead of a TCP port.
+        **options: Further arguments for :class:`AnonymizationServer`.
+    """
+    default_instrumentation.enable()
+    server = AnonymizationServer(anonymizer, **options)
+    if server.anonymizer.detection != "fast":
+        server.anonymizer.model.warm_up()
+
+    async def run():
+        listener = await server.start(host, port, path)
+        where = path or "http://{}:{}".format(*listener.sockets[0].getsockname()[:2])
+        print(f"Serving on {where}", file=sys.stderr)
+        try:
+            await listener.serve_forever()
+        finally:
+            await server.stop()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,420 @@
+import contextlib
+import itertools
+import json
+import re
+import sys
+from typing import (
+    IO,
+    AsyncIterable,
+    AsyncIterator,
+    Dict,
+    Iterable,
+    Iterator,
+    Mapping,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from .core import (
+    _irregular_keys,
+    _placeholder_pattern,
+    _restore_placeholders,
+    anonymize_batch,
+    deanonymize,
+)
+
+STREAM_FORMATS = ("jsonl", "lines")
+
+Record = Union[str, Dict]
+
+# A text ending in one of these may be the first part of a placeholder split by a chunk
+# boundary, e.g. "[ENT" or "[ENTITY_PERSON_1".
+_PARTIAL_PLACEHOLDER = re.compile(r"\[(?:E(?:N(?:T(?:I(?:T(?:Y(?:_[A-Z0-9_]*)?)?)?)?)?)?)?\Z")
+
+# Placeholders longer than this are not expected; anything held back longer is released.
+_MAX_PLACEHOLDER_LENGTH = 64
+
+
+@contextlib.contextmanager
+def open_stream(path: str, mode: str = "r", newline: Optional[str] = None) -> Iterator[IO[str]]:
+    """
+    Opens a file for streaming, treating ``-`` as standard input or output.
+
+    Args:
+        path: Path to the file, or ``-``.
+        mode: ``"r"`` or ``"w"``.
+        newline: See :func:`open`. Standard input and output are used as they are.
+
+    Returns:
+        A context manager yielding the open text stream.
+    """
+    if path == "-":
+        yield sys.stdin if "r" in mode else sys.stdout
+    else:
+        with open(path, mode, newline=newline) as f:
+            yield f
+
+
+def read_records(
+    stream: IO[str], fmt: str, required_field: Optional[str] = None
+) -> Iterator[Record]:
+    """
+    Reads records from a stream one line at a time.
+
+    Args:
+        stream: The text stream to read from.
+        fmt: ``"lines"`` to yield each line as a string, ``"jsonl"`` to yield each line
+            parsed as a JSON object.
+        required_field: A key every JSONL record must have, such as the text field.
+
+    Returns:
+        A lazy iterator of records. Blank JSONL lines are skipped.
+
+    Raises:
+        ValueError: If a JSONL line is not a JSON object or lacks ``required_field``. The
+            message names the line number.
+    """
+    for number, line in enumerate(stream, 1):
+        line = line.rstrip("\n")
+        if fmt == "lines":
+            yield line
+        elif line.strip():
+            try:
+                record = json.loads(line)
+            except ValueError as error:
+                raise ValueError(f"line {number}: invalid JSON ({error})") from None
+            if not isinstance(record, dict):
+                raise ValueError(
+                    f"line {number}: expected a JSON object, not {type(record).__name__}"
+                )
+            if required_field is not None and required_field not in record:
+                raise ValueError(f"line {number}: the record has no {required_field!r} field")
+            yield record
+
+
+def read_maps(stream: IO[str]) -> Iterator[Dict[str, str]]:
+    """Reads a JSON Lines map file, one anonymization map per line."""
+    for record in read_records(stream, "jsonl"):
+        if isinstance(record, dict):
+            yield record
+
+
+def anonymize_records(
+    records: Iterable[Record],
+    text_field: str = "text",
+    batch_size: int = 256,
+    n_process: int = 1,
+    detection: str = "full",
+) -> Iterator[Tuple[Record, Dict[str, str]]]:
+    """
+    Anonymizes a stream of records in batches.
+
+    Args:
+        records: Strings, or dictionaries holding the text under ``text_field``.
+        text_field: The key of the text to be anonymized in dictionary records.
+        batch_size: The number of records buffered per batch.
+        n_process: The number of worker processes used by spaCy.
+        detection: See :func:`~text_anonymizer.core.recognize_entities`.
+
+    Returns:
+        A lazy iterator of ``(anonymized_record, anonymization_map)`` pairs, in input order.
+        Only the records of the batch in flight are held in memory.
+
+    Raises:
+        ValueError: If a record is neither a string nor a dictionary with a ``text_field``.
+    """
+    records, pending = itertools.tee(records)
+    texts = (_text_of(record, text_field, number) for number, record in enumerate(pending, 1))
+    results = anonymize_batch(
+        texts, batch_size=batch_size, n_process=n_process, detection=detection
+    )
+    for record, (anonymized_text, anonymization_map) in zip(records, results):
+        if isinstance(record, dict):
+            record = {**record, text_field: anonymized_text}
+        else:
+            record = anonymized_text
+        yield record, anonymization_map
+
+
+def _text_of(record: Record, text_field: str, number: int) -> str:
+    if isinstance(record, str):
+        return record
+    if not isinstance(record, dict):
+        raise ValueError(
+            f"record {number}: expected a string or dictionary, not {type(record).__name__}"
+        )
+    if text_field not in record:
+        raise ValueError(f"record {number}: the record has no {text_field!r} field")
+    text: str = record[text_field]
+    return text
+
+
+def deanonymize_records(
+    records: Iterable[Record],
+    anonymization_maps: Optional[Iterable[Mapping[str, str]]] = None,
+    text_field: str = "text",
+    map_field: str = "anonymization_map",
+    on_unknown: str = "keep",
+) -> Iterator[Record]:
+    """
+    Restores a stream of anonymized records.
+
+    Args:
+        records: Strings, or dictionaries holding the text under ``text_field``.
+        anonymization_maps: One anonymization map per record, in the same order. Without
+            it, each dictionary record must carry its map under ``map_field``.
+        text_field: The key of the anonymized text in dictionary records.
+        map_field: The key of the embedded map in dictionary records.
+        on_unknown: See :func:`~text_anonymizer.core.deanonymize`.
+
+    Returns:
+        A lazy iterator of de-anonymized records.
+    """
+    if anonymization_maps is None:
+        for number, record in enumerate(records, 1):
+            if not isinstance(record, dict):
+                raise ValueError(f"record {number}: expected a dictionary with {map_field!r}")
+            record = dict(record)
+            anonymization_map = record.pop(map_field, {})
+            record[text_field] = deanonymize(record[text_field], anonymization_map, on_unknown)
+            yield record
+        return
+    for record, anonymization_map in zip(records, anonymization_maps):
+        if isinstance(record, dict):
+            text = deanonymize(record[text_field], anonymization_map, on_unknown)
+            yield {**record, text_field: text}
+        else:
+            yield deanonymize(record, anonymization_map, on_unknown)
+
+
+def write_record(stream: IO[str], record: Record) -> None:
+    """Writes a single record as one line of text or JSON."""
+    if isinstance(record, dict):
+        stream.write(json.dumps(record, ensure_ascii=False))
+    else:
+        stream.write(record)
+    stream.write("\n")
+
+
+def stream_anonymize(
+    input_file: str,
+    output_file: str,
+    fmt: str,
+    map_file: Optional[str] = None,
+    text_field: str = "text",
+    map_field: str = "anonymization_map",
+    batch_size: int = 256,
+    detection: str = "full",
+) -> Tuple[str, Optional[str]]:
+    """
+    Anonymizes a line-oriented file record by record, writing results as they are produced.
+
+    In ``jsonl`` format the map of each record is stored in the record under ``map_field``
+    unless ``map_file`` is given. In ``lines`` format the maps are written to ``map_file``
+    as JSON Lines, one map per input line.
+
+    Args:
+        input_file: Path to the input file, or ``-`` for standard input.
+        output_file: Path to the output file, or ``-`` for standard output.
+        fmt: ``"jsonl"`` or ``"lines"``.
+        map_file: Path to the JSON Lines map file.
+        text_field: The key of the text to be anonymized in JSONL records.
+        map_field: The key the map is stored under in JSONL records.
+        batch_size: The number of records buffered per batch.
+        detection: See :func:`~text_anonymizer.core.recognize_entities`.
+
+    Returns:
+        The output file and the map file, if any.
+    """
+    if fmt == "lines" and map_file is None:
+        if output_file == "-":
+            raise ValueError("--map_file is required when writing lines to standard output")
+        map_file = f"{output_file}.jsonl"
+
+    with contextlib.ExitStack() as stack:
+        source = stack.enter_context(open_stream(input_file, "r"))
+        sink = stack.enter_context(open_stream(output_file, "w"))
+        map_sink = stack.enter_context(open_stream(map_file, "w")) if map_file else None
+
+        records = read_records(source, fmt, required_field=text_field)
+        for record, anonymization_map in anonymize_records(
+            records, text_field=text_field, batch_size=batch_size, detection=detection
+        ):
+            if map_sink is not None:
+                write_record(map_sink, anonymization_map)
+            elif isinstance(record, dict):
+                record = {**record, map_field: anonymization_map}
+            write_record(sink, record)
+
+    return output_file, map_file
+
+
+def stream_deanonymize(
+    input_file: str,
+    output_file: str,
+    fmt: str,
+    map_file: Optional[str] = None,
+    text_field: str = "text",
+    map_field: str = "anonymization_map",
+    on_unknown: str = "keep",
+) -> str:
+    """
+    Restores a line-oriented file produced by :func:`stream_anonymize`.
+
+    Args:
+        input_file: Path to the anonymized file, or ``-`` for standard input.
+        output_file: Path to the output file, or ``-`` for standard output.
+        fmt: ``"jsonl"`` or ``"lines"``.
+        map_file: Path to the JSON Lines map file. Without it, JSONL records must carry
+            their map under ``map_field``.
+        text_field: The key of the anonymized text in JSONL records.
+        map_field: The key the map is stored under in JSONL records.
+        on_unknown: See :func:`~text_anonymizer.core.deanonymize`.
+
+    Returns:
+        The output file.
+    """
+    if fmt == "lines" and map_file is None:
+        raise ValueError("--map_file is required to de-anonymize lines")
+
+    with contextlib.ExitStack() as stack:
+        source = stack.enter_context(open_stream(input_file, "r"))
+        sink = stack.enter_context(open_stream(output_file, "w"))
+
+        maps: Optional[Iterator[Dict[str, str]]] = None
+        if map_file:
+            maps = read_maps(stack.enter_context(open_stream(map_file, "r")))
+        records = read_records(source, fmt, required_field=text_field)
+        for record in deanonymize_records(
+            records, maps, text_field=text_field, map_field=map_field, on_unknown=on_unknown
+        ):
+            write_record(sink, record)
+
+    return output_file
+
+
+class StreamingDeanonymizer:
+    """
+    Restores placeholders in text that arrives in chunks, such as a streamed LLM completion.
+
+    Each call to :meth:`feed` returns the text that can safely be restored so far. Only a
+    trailing fragment that may be the start of a placeholder split across chunks, such as
+    ``"[ENTITY_PER"``, is held back until the next chunk completes or rules it out. The
+    work per chunk is proportional to the chunk, not to the text seen so far.
+
+    Args:
+        anonymization_map: A dictionary that maps placeholders to their original entities, or
+            an :class:`~text_anonymizer.vault.EntityVault`.
+        on_unknown: See :func:`~text_anonymizer.core.deanonymize`.
+    """
+
+    def __init__(self, anonymization_map: Mapping[str, str], on_unknown: str = "keep"):
+        self.anonymization_map = anonymization_map
+        self.on_unknown = on_unknown
+        # Hand-written maps may hold keys outside the placeholder grammar; any prefix of
+        # those keys has to be held back as well.
+        irregular = _irregular_keys(anonymization_map)
+        self._pattern = _placeholder_pattern(anonymization_map, irregular)
+        self._key_prefixes = {key[:i] for key in irregular for i in range(1, len(key))}
+        self._key_starts = {key[0] for key in irregular if key}
+        self._max_length = max([_MAX_PLACEHOLDER_LENGTH] + [len(key) for key in irregular])
+        self._pending = ""
+
+    def _restore(self, text: str) -> str:
+        if not text:
+            return text
+        return _restore_placeholders(text, self.anonymization_map, self._pattern, self.on_unknown)
+
+    def _holdback(self, text: str) -> int:
+        # Returns the position of the earliest suffix of text that may still grow into a
+        # placeholder. Only the last few characters can be such a suffix.
+        start = max(len(text) - self._max_length + 1, 0)
+        if self._key_prefixes:
+            for position in range(start, len(text)):
+                char = text[position]
+                if char == "[" and _PARTIAL_PLACEHOLDER.match(text, position):
+                    return position
+                if char in self._key_starts and text[position:] in self._key_prefixes:
+                    return position
+            return len(text)
+        position = text.find("[", start)
+        while position != -1:
+            if _PARTIAL_PLACEHOLDER.match(text, position):
+                return position
+            position = text.find("[", position + 1)
+        return len(text)
+
+    def feed(self, chunk: str) -> str:
+        """
+        Adds the next chunk of anonymized text.
+
+        Args:
+            chunk: The next piece of the anonymized text.
+
+        Returns:
+            The restored text that is safe to emit now, possibly empty.
+        """
+        text = self._pending + chunk
+        position = self._holdback(text)
+        self._pending = text[position:]
+        return self._restore(text[:position])
+
+    def flush(self) -> str:
+        """
+        Ends the stream.
+
+        Returns:
+            The restored remainder of the text held back so far.
+        """
+        text, self._pending = self._pending, ""
+        return self._restore(text)
+
+
+def deanonymize_chunks(
+    chunks: Iterable[str], anonymization_map: Mapping[str, str], on_unknown: str = "keep"
+) -> Iterator[str]:
+    """
+    Restores a stream of anonymized text chunks as they arrive.
+
+    Args:
+        chunks: The anonymized text, in pieces.
+        anonymization_map: A dictionary that maps placeholders to their original entities.
+        on_unknown: See :func:`~text_anonymizer.core.deanonymize`.
+
+    Returns:
+        A lazy iterator of non-empty restored text pieces.
+    """
+    deanonymizer = StreamingDeanonymizer(anonymization_map, on_unknown)
+    for chunk in chunks:
+        text = deanonymizer.feed(chunk)
+        if text:
+            yield text
+    text = deanonymizer.flush()
+    if text:
+        yield text
+
+
+async def deanonymize_chunks_async(
+    chunks: AsyncIterable[str], anonymization_map: Mapping[str, str], on_unknown: str = "keep"
+) -> AsyncIterator[str]:
+    """
+    Restores an asynchronous stream of anonymized text chunks as they arrive, e.g. the
+    text deltas of a streamed LLM response.
+
+    Args:
+        chunks: The anonymized text, in pieces.
+        anonymization_map: A dictionary that maps placeholders to their original entities.
+        on_unknown: See :func:`~text_anonymizer.core.deanonymize`.
+
+    Returns:
+        An asynchronous iterator of non-empty restored text pieces.
+    """
+    deanonymizer = StreamingDeanonymizer(anonymization_map, on_unknown)
+    async for chunk in chunks:
+        text = deanonymizer.feed(chunk)
+        if text:
+            yield text
+    text = deanonymizer.flush()
+    if text:
+        yield text
@@ -0,0 +1,354 @@
+import contextlib
+import csv
+import itertools
+import re
+from fnmatch import fnmatchcase
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple, Union
+
+from .anonymizer import Anonymizer
+from .core import _deanonymize, _irregular_keys, _placeholder_pattern, _replace_entities
+from .entities import Entity
+from .mapfile import load_map, write_map
+from .streaming import open_stream, read_maps, read_records, write_record
+from .vault import EntityVault
+
+STRUCTURED_FORMATS = ("jsonl", "csv")
+
+# How placeholders are numbered. Every record's map only holds the placeholders it uses.
+#   "record": every record has its own placeholder numbering.
+#   "batch": the records of a batch share the numbering: an entity has one placeholder.
+#   "file": all records share the numbering, whatever the batch size.
+MAP_SCOPES = ("record", "batch", "file")
+
+FieldPath = Tuple[Union[str, int], ...]
+
+# Values with a letter in them are text. Others, like numbers, amounts, dates, phone numbers
+# and IDs, only go through the regular expressions and company terms.
+_LETTER = re.compile(r"[^\W\d_]")
+
+
+def parse_paths(paths: Iterable[str]) -> List[Tuple[str, ...]]:
+    """
+    Parses dotted field paths like ``"user.name"`` or ``"messages.*.text"``.
+
+    Every part of a path is matched against one level of the record, as a key of an object
+    or an index of a list, and may hold ``fnmatch`` wildcards. A path selects the field it
+    names and everything nested in it.
+    """
+    return [tuple(path.split(".")) for path in paths]
+
+
+def _selects(patterns: List[Tuple[str, ...]], path: FieldPath) -> bool:
+    return any(
+        len(pattern) <= len(path)
+        and all(fnmatchcase(str(part), glob) for part, glob in zip(path, pattern))
+        for pattern in patterns
+    )
+
+
+def iter_fields(
+    record: Any,
+    include: Optional[Sequence[str]] = None,
+    exclude: Sequence[str] = (),
+) -> Iterator[Tuple[FieldPath, Any]]:
+    """
+    Lists the leaves of a nested record that are to be anonymized.
+
+    Args:
+        record: A JSON-like value: dictionaries, lists, strings, numbers, booleans and
+            ``None``.
+        include: Field paths to anonymize, see :func:`parse_paths`. Defaults to all.
+        exclude: Field paths to leave alone, even if included.
+
+    Returns:
+        A lazy iterator of ``(path, value)`` pairs for the string leaves, in document order.
+    """
+    included = parse_paths(include) if include is not None else None
+    excluded = parse_paths(exclude)
+
+    def walk(value: Any, path: FieldPath) -> Iterator[Tuple[FieldPath, Any]]:
+        if excluded and _selects(excluded, path):
+            return
+        if isinstance(value, dict):
+            for key, item in value.items():
+                yield from walk(item, path + (key,))
+        elif isinstance(value, list):
+            for index, item in enumerate(value):
+                yield from walk(item, path + (index,))
+        elif isinstance(value, str):
+            if included is None or _selects(included, path):
+                yield path, value
+
+    return walk(record, ())
+
+
+def _rebuild(value: Any, replacements: Dict[FieldPath, str], path: FieldPath = ()) -> Any:
+    if isinstance(value, dict):
+        return {key: _rebuild(item, replacements, path + (key,)) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_rebuild(item, replacements, path + (index,)) for index, item in enumerate(value)]
+    return replacements.get(path, value)
+
+
+def anonymize_structured(
+    records: Iterable[Any],
+    include: Optional[Sequence[str]] = None,
+    exclude: Sequence[str] = (),
+    anonymizer: Optional[Anonymizer] = None,
+    map_scope: str = "record",
+    vault: Optional[EntityVault] = None,
+    batch_size: int = 256,
+) -> Iterator[Tuple[Any, Dict[str, str]]]:
+    """
+    Anonymizes the fields of nested records, such as JSON events or CSV rows, in batches.
+
+    The text fields of all records of a batch go through a single ``nlp.pipe`` call. Values
+    without letters are only scanned by the regular expressions and company terms.
+    Anonymized values are written back to where they were found. Only strings are
+    anonymized: numbers, booleans and ``None`` are left as they are, so that restored
+    records keep their types. Identifiers that must be anonymized have to be strings, as
+    they always are in CSV files.
+
+    Args:
+        records: The records.
+        include: Field paths to anonymize, see :func:`parse_paths`. Defaults to all.
+        exclude: Field paths to leave alone, even if included.
+        anonymizer: Recognizes the entities. Defaults to one without company terms.
+        map_scope: ``"record"`` to number placeholders per record, ``"batch"`` to share
+            the numbering between the records of a batch, or ``"file"`` to share it between
+            all records. The ``"file"`` scope does not depend on ``batch_size``.
+        vault: Assigns placeholders across all records instead, see
+            :class:`~text_anonymizer.vault.EntityVault`.
+        batch_size: The number of records per batch.
+
+    Returns:
+        A lazy iterator of ``(anonymized_record, anonymization_map)`` pairs, in input order.
+        Whatever the scope, a record's map only holds the placeholders of that record, so
+        no record carries the values of another.
+    """
+    if map_scope not in MAP_SCOPES:
+        raise ValueError(f"map_scope must be one of {', '.join(MAP_SCOPES)}, not {map_scope!r}")
+    anonymizer = anonymizer or Anonymizer()
+    vault = vault if vault is not None else anonymizer.vault
+    if map_scope == "file" and vault is None:
+        vault = EntityVault()
+    records = iter(records)
+    while True:
+        batch = list(itertools.islice(records, batch_size))
+        if not batch:
+            return
+        yield from _anonymize_batch(batch, include, exclude, anonymizer, map_scope, vault)
+
+
+def _anonymize_batch(
+    batch: List[Any],
+    include: Optional[Sequence[str]],
+    exclude: Sequence[str],
+    anonymizer: Anonymizer,
+    map_scope: str,
+    vault: Optional[EntityVault],
+) -> Iterator[Tuple[Any, Dict[str, str]]]:
+    fields = [
+        (index, path, value)
+        for index, record in enumerate(batch)
+        for path, value in iter_fields(record, include, exclude)
+    ]
+    is_text = [_LETTER.search(text) is not None for _, _, text in fields]
+    texts = [text for (_, _, text), text_field in zip(fields, is_text) if text_field]
+    others = [text for (_, _, text), text_field in zip(fields, is_text) if not text_field]
+    recognized = iter(anonymizer.recognize_spans_batch(texts, batch_size=max(len(texts), 1)))
+    scanned = anonymizer.recognize_spans_batch(others, detection="fast")
+
+    replacements: List[Dict[FieldPath, str]] = [{} for _ in batch]
+    maps: List[Dict[str, str]] = [{} for _ in batch]
+    batch_vault = vault if vault is not None else EntityVault()
+    record_vaults: Dict[int, EntityVault] = {}
+    for (index, path, text), text_field in zip(fields, is_text):
+        entities: List[Entity] = next(recognized) if text_field else next(scanned)
+        if not entities:
+            continue
+        if map_scope == "record" and vault is None:
+            field_vault = record_vaults.setdefault(index, EntityVault())
+        else:
+            field_vault = batch_vault
+        anonymized_text, anonymization_map, _ = _replace_entities(
+            text, entities, vault=field_vault
+        )
+        replacements[index][path] = anonymized_text
+        maps[index].update(anonymization_map)
+
+    for record, record_replacements, anonymization_map in zip(batch, replacements, maps):
+        if record_replacements:
+            record = _rebuild(record, record_replacements)
+        yield record, anonymization_map
+
+
+def deanonymize_structured(
+    records: Iterable[Any],
+    anonymization_maps: Iterable[Mapping[str, str]],
+    on_unknown: str = "keep",
+) -> Iterator[Any]:
+    """
+    Restores records anonymized with :func:`anonymize_structured`.
+
+    Args:
+        records: The anonymized records.
+        anonymization_maps: One map per record, in the same order. Pass
+            ``itertools.repeat(anonymization_map)`` to use one map for all records.
+        on_unknown: See :func:`~text_anonymizer.core.deanonymize`.
+
+    Returns:
+        A lazy iterator of the restored records.
+    """
+    last_map = None
+    for record, anonymization_map in zip(records, anonymization_maps):
+        # Build the pattern once per map, not per field, and keep it while the same map
+        # is repeated across records.
+        if anonymization_map is not last_map:
+            last_map = anonymization_map
+            pattern = _placeholder_pattern(anonymization_map, _irregular_keys(anonymization_map))
+        replacements = {
+            path: _deanonymize(value, anonymization_map, on_unknown, pattern=pattern)
+            for path, value in iter_fields(record)
+            if isinstance(value, str) and "[" in value
+        }
+        yield _rebuild(record, replacements) if replacements else record
+
+
+def _read_structured(stack: contextlib.ExitStack, path: str, fmt: str):
+    source = stack.enter_context(open_stream(path, "r", newline=""))
+    if fmt == "csv":
+        reader = csv.DictReader(source)
+        return reader, reader.fieldnames
+    return read_records(source, "jsonl"), None
+
+
+def _structured_writer(stack: contextlib.ExitStack, path: str, fmt: str, fieldnames):
+    sink = stack.enter_context(open_stream(path, "w", newline=""))
+    if fmt == "csv":
+        writer = csv.DictWriter(sink, fieldnames=fieldnames or [], lineterminator="\n")
+        writer.writeheader()
+        return writer.writerow
+    return lambda record: write_record(sink, record)
+
+
+def stream_anonymize_structured(
+    input_file: str,
+    output_file: str,
+    fmt: str,
+    map_file: Optional[str] = None,
+    include: Optional[Sequence[str]] = None,
+    exclude: Sequence[str] = (),
+    map_field: str = "anonymization_map",
+    map_scope: str = "record",
+    batch_size: int = 256,
+    anonymizer: Optional[Anonymizer] = None,
+    detection: str = "full",
+) -> Tuple[str, Optional[str]]:
+    """
+    Anonymizes the fields of a JSON Lines or CSV file with :func:`anonymize_structured`.
+
+    With the ``"record"`` and ``"batch"`` scopes, JSONL records carry their map under
+    ``map_field`` unless ``map_file`` is given, and the maps of CSV rows are written to
+    ``map_file`` as JSON Lines, one per row. With the ``"file"`` scope, one map for the whole
+    file is written to ``map_file`` as JSON, however many batches the file takes.
+
+    Args:
+        input_file: Path to the input file, or ``-`` for standard input.
+        output_file: Path to the output file, or ``-`` for standard output.
+        fmt: ``"jsonl"`` or ``"csv"``.
+        map_file: Path to the map file.
+        include: Field paths to anonymize. CSV columns are paths of one part.
+        exclude: Field paths to leave alone.
+        map_field: The key the map is stored under in JSONL records.
+        map_scope: One of :data:`MAP_SCOPES`, see :func:`anonymize_structured`.
+        batch_size: The number of records per batch.
+        anonymizer: Recognizes the entities. Defaults to one without company terms.
+        detection: The detection mode of the default anonymizer, see
+            :func:`~text_anonymizer.core.recognize_entities`.
+
+    Returns:
+        The output file and the map file, if any.
+    """
+    if map_scope not in MAP_SCOPES:
+        raise ValueError(f"map_scope must be one of {', '.join(MAP_SCOPES)}, not {map_scope!r}")
+    if map_file is None and (fmt == "csv" or map_scope == "file"):
+        if output_file == "-":
+            raise ValueError("--map_file is required when writing to standard output")
+        map_file = f"{output_file}.json" if map_scope == "file" else f"{output_file}.jsonl"
+
+    anonymizer = anonymizer or Anonymizer(detection=detection)
+    vault = EntityVault() if map_scope == "file" else None
+    with contextlib.ExitStack() as stack:
+        records, fieldnames = _read_structured(stack, input_file, fmt)
+        write = _structured_writer(stack, output_file, fmt, fieldnames)
+        map_sink = None
+        if map_file and map_scope != "file":
+            map_sink = stack.enter_context(open_stream(map_file, "w"))
+        for record, anonymization_map in anonymize_structured(
+            records,
+            include,
+            exclude,
+            anonymizer,
+            map_scope=map_scope,
+            vault=vault,
+            batch_size=batch_size,
+        ):
+            if map_sink is not None:
+                write_record(map_sink, anonymization_map)
+            elif vault is None:
+                record = {**record, map_field: anonymization_map}
+            write(record)
+    if vault is not None and map_file is not None:
+        write_map(map_file, dict(vault))
+    return output_file, map_file
+
+
+def stream_deanonymize_structured(
+    input_file: str,
+    output_file: str,
+    fmt: str,
+    map_file: Optional[str] = None,
+    map_field: str = "anonymization_map",
+    map_scope: str = "record",
+    on_unknown: str = "keep",
+) -> str:
+    """
+    Restores a file produced by :func:`stream_anonymize_structured`.
+
+    Args:
+        input_file: Path to the anonymized file, or ``-`` for standard input.
+        output_file: Path to the output file, or ``-`` for standard output.
+        fmt: ``"jsonl"`` or ``"csv"``.
+        map_file: Path to the map file. Without it, JSONL records must carry their map
+            under ``map_field``.
+        map_field: The key the map is stored under in JSONL records.
+        map_scope: One of :data:`MAP_SCOPES`, as when anonymizing.
+        on_unknown: See :func:`~text_anonymizer.core.deanonymize`.
+
+    Returns:
+        The output file.
+    """
+    if map_scope not in MAP_SCOPES:
+        raise ValueError(f"map_scope must be one of {', '.join(MAP_SCOPES)}, not {map_scope!r}")
+    if map_file is None and (fmt == "csv" or map_scope == "file"):
+        raise ValueError("--map_file is required to de-anonymize this file")
+
+    with contextlib.ExitStack() as stack:
+        records, fieldnames = _read_structured(stack, input_file, fmt)
+        write = _structured_writer(stack, output_file, fmt, fieldnames)
+        maps: Iterable[Dict[str, str]]
+        if map_file is not None and map_scope == "file":
+            maps = itertools.repeat(load_map(map_file))
+        elif map_file is not None:
+            maps = read_maps(stack.enter_context(open_stream(map_file, "r")))
+        else:
+            records, pending = itertools.tee(records)
+            maps = (record.get(map_field, {}) for record in pending)
+            records = (
+                {key: value for key, value in record.items() if key != map_field}
+                for record in records
+            )
+        for record in deanonymize_structured(records, maps, on_unknown):
+            write(record)
+    return output_file
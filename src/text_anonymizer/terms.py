@@ -0,0 +1,183 @@
+import hashlib
+import json
+import re
+from typing import Dict, Iterable, List, Optional
+
+from .entities import Entity, to_dicts
+
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+# Marks a trie node at which a complete term ends. Tokens never contain NUL characters.
+_END = "\0"
+
+_FORMAT_VERSION = 1
+
+
+class TermDictionary:
+    """
+    A dictionary of terms compiled into a token trie and matched directly against text.
+
+    Texts and terms are split into word and punctuation tokens, so terms only match at token
+    boundaries ("Acme" matches "Acme's" but not "Acmeco"). Matching walks the trie once per
+    token and prefers the longest term starting at a token, so the cost depends on the
+    length of the text and the length of the terms, not on the number of terms. No spaCy
+    document is needed.
+
+    Args:
+        terms: The initial terms.
+        case_sensitive: Whether terms only match with the same capitalization.
+        label: The entity type reported for matches.
+    """
+
+    def __init__(self, terms: Iterable[str] = (), case_sensitive: bool = True, label="COMPANY"):
+        self.case_sensitive = case_sensitive
+        self.label = label
+        self._trie: Dict = {}
+        self._terms: Dict[str, None] = {}
+        self._fingerprint: Optional[str] = None
+        self.version = 0
+        self.add(*terms)
+
+    def __len__(self) -> int:
+        return len(self._terms)
+
+    def __contains__(self, term: str) -> bool:
+        return term in self._terms
+
+    def __iter__(self):
+        return iter(list(self._terms))
+
+    def _tokens(self, text: str) -> List[str]:
+        tokens = _TOKEN.findall(text)
+        if not self.case_sensitive:
+            tokens = [token.casefold() for token in tokens]
+        return tokens
+
+    def add(self, *terms: str) -> None:
+        """Adds terms to the dictionary."""
+        for term in terms:
+            tokens = self._tokens(term)
+            if not tokens or term in self._terms:
+                continue
+            node = self._trie
+            for token in tokens:
+                node = node.setdefault(token, {})
+            node[_END] = node.get(_END, 0) + 1
+            self._terms[term] = None
+            self._fingerprint = None
+            self.version += 1
+
+    def remove(self, *terms: str) -> None:
+        """Removes terms from the dictionary. Unknown terms are ignored."""
+        for term in terms:
+            if term not in self._terms:
+                continue
+            del self._terms[term]
+            path = [self._trie]
+            tokens = self._tokens(term)
+            for token in tokens:
+                path.append(path[-1][token])
+            # Several terms may share a node, e.g. "ACME" and "Acme" when matching
+            # without case, so a node keeps a count of the terms ending there.
+            path[-1][_END] -= 1
+            if not path[-1][_END]:
+                del path[-1][_END]
+            for token, parent, node in zip(reversed(tokens), reversed(path[:-1]), reversed(path)):
+                if node:
+                    break
+                del parent[token]
+            self._fingerprint = None
+            self.version += 1
+
+    @property
+    def fingerprint(self) -> str:
+        """A digest of the terms and matching options, which changes whenever they do."""
+        if self._fingerprint is None:
+            digest = hashlib.sha256(f"{self.case_sensitive}\0{self.label}".encode())
+            for term in sorted(self._terms):
+                digest.update(b"\0")
+                digest.update(term.encode("utf-8", "surrogatepass"))
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def find(self, text: str) -> List[Dict]:
+        """
+        Finds all occurrences of the terms in a text.
+
+        Args:
+            text: The text to be searched.
+
+        Returns:
+            A list of dictionaries with the ``type``, ``start``, ``end`` and ``text`` of each
+            match, in text order. Overlapping matches are resolved in favour of the earliest,
+            then the longest term.
+        """
+        return to_dicts(text, self.find_spans(text))
+
+    def find_spans(self, text: str) -> List[Entity]:
+        """Like :meth:`find`, but returns :class:`~text_anonymizer.entities.Entity` spans."""
+        entities: List[Entity] = []
+        if not self._trie:
+            return entities
+        matches = list(_TOKEN.finditer(text))
+        tokens = [match.group() for match in matches]
+        if not self.case_sensitive:
+            tokens = [token.casefold() for token in tokens]
+        trie = self._trie
+        index = 0
+        count = len(tokens)
+        while index < count:
+            node = trie.get(tokens[index])
+            last = -1
+            position = index
+            while node is not None:
+                if _END in node:
+                    last = position
+                position += 1
+                if position == count:
+                    break
+                node = node.get(tokens[position])
+            if last < 0:
+                index += 1
+                continue
+            entities.append(Entity(self.label, matches[index].start(), matches[last].end()))
+            index = last + 1
+        return entities
+
+    def save(self, path: str) -> None:
+        """
+        Saves the compiled dictionary so that workers can load it without rebuilding it.
+
+        Args:
+            path: The file to write.
+        """
+        data = {
+            "format": _FORMAT_VERSION,
+            "case_sensitive": self.case_sensitive,
+            "label": self.label,
+            "terms": list(self._terms),
+            "trie": self._trie,
+        }
+        with open(path, "w") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+
+    @classmethod
+    def load(cls, path: str) -> "TermDictionary":
+        """
+        Loads a dictionary written by :meth:`save`.
+
+        Args:
+            path: The file to read.
+
+        Returns:
+            The compiled dictionary.
+        """
+        with open(path, "r") as f:
+            data = json.load(f)
+        if data.get("format") != _FORMAT_VERSION:
+            raise ValueError(f"Unsupported term dictionary format in {path}")
+        dictionary = cls(case_sensitive=data["case_sensitive"], label=data["label"])
+        dictionary._terms = dict.fromkeys(data["terms"])
+        dictionary._trie = data["trie"]
+        dictionary.version = len(dictionary._terms)
+        return dictionary
@@ -0,0 +1,175 @@
+import re
+import sqlite3
+import threading
+from collections.abc import Mapping
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Placeholders of the form [ENTITY_<TYPE>_<N>], with the type and number captured.
+_PLACEHOLDER = re.compile(r"\[ENTITY_([A-Z0-9_]+?)_(\d+)\]")
+
+
+def _parse(placeholder: str) -> Optional[Tuple[str, int]]:
+    match = _PLACEHOLDER.fullmatch(placeholder)
+    if match is None:
+        return None
+    return match.group(1), int(match.group(2))
+
+
+class EntityVault(Mapping):
+    """
+    Gives every distinct entity one placeholder, across all the documents it is used for.
+
+    Values are numbered per type in the order the vault first sees them, so "John Smith" is
+    ``[ENTITY_PERSON_1]`` in every document and conversation turn anonymized with the same
+    vault. Each value is stored once, however often it occurs.
+
+    The vault is a read-only mapping from placeholders to values, so it can be passed to
+    :func:`~text_anonymizer.core.deanonymize` and
+    :class:`~text_anonymizer.streaming.StreamingDeanonymizer` in place of an anonymization
+    map. Both directions are dictionary lookups.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._placeholders: Dict[Tuple[str, str], str] = {}
+        self._values: Dict[str, str] = {}
+        self._counts: Dict[str, int] = {}
+
+    def placeholder(self, entity_type: str, value: str) -> str:
+        """
+        Returns the placeholder of a value, assigning the next free one on first use.
+
+        Args:
+            entity_type: The type of the entity, e.g. ``"PERSON"``.
+            value: The text of the entity.
+
+        Returns:
+            The placeholder, e.g. ``"[ENTITY_PERSON_3]"``.
+        """
+        return self.placeholders([(entity_type, value)])[0]
+
+    def placeholders(self, entities: Iterable[Tuple[str, str]]) -> List[str]:
+        """
+        Returns the placeholders of many values at once, see :meth:`placeholder`.
+
+        Args:
+            entities: ``(entity_type, value)`` pairs.
+
+        Returns:
+            The placeholders, in the same order.
+        """
+        result = []
+        with self._lock:
+            for key in entities:
+                placeholder = self._placeholders.get(key)
+                if placeholder is None:
+                    entity_type, value = key
+                    number = self._counts.get(entity_type, 0) + 1
+                    self._counts[entity_type] = number
+                    placeholder = f"[ENTITY_{entity_type}_{number}]"
+                    self._placeholders[key] = placeholder
+                    self._values[placeholder] = value
+                result.append(placeholder)
+        return result
+
+    def __getitem__(self, placeholder: str) -> str:
+        return self._values[placeholder]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._values))
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def close(self) -> None:
+        """Releases the resources of the vault."""
+
+
+class SQLiteEntityVault(EntityVault):
+    """
+    An :class:`EntityVault` kept in a SQLite database, for mappings larger than memory.
+
+    Both directions are index lookups: placeholders by ``(type, number)``, the primary key,
+    and values by a unique ``(type, value)`` index. New placeholders are assigned in a
+    write transaction, so several processes can share one vault.
+
+    Args:
+        path: Path to the database. It is created if it does not exist.
+    """
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS vault ("
+            "type TEXT NOT NULL, number INTEGER NOT NULL, value TEXT NOT NULL, "
+            "PRIMARY KEY (type, number), UNIQUE (type, value))"
+        )
+        self._db.commit()
+
+    def placeholders(self, entities: Iterable[Tuple[str, str]]) -> List[str]:
+        entities = list(entities)
+        if not entities:
+            return []
+        numbers: Dict[Tuple[str, str], int] = {}
+        with self._lock:
+            # One write transaction per call: other processes see either none or all of the
+            # new values, and never the same number twice.
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                for key in entities:
+                    if key in numbers:
+                        continue
+                    row = self._db.execute(
+                        "SELECT number FROM vault WHERE type = ? AND value = ?", key
+                    ).fetchone()
+                    if row is None:
+                        row = self._db.execute(
+                            "SELECT COALESCE(MAX(number), 0) + 1 FROM vault WHERE type = ?",
+                            (key[0],),
+                        ).fetchone()
+                        self._db.execute(
+                            "INSERT INTO vault (type, number, value) VALUES (?, ?, ?)",
+                            (key[0], row[0], key[1]),
+                        )
+                    numbers[key] = row[0]
+                self._db.commit()
+            except BaseException:
+                self._db.rollback()
+                raise
+        return [f"[ENTITY_{key[0]}_{numbers[key]}]" for key in entities]
+
+    def __getitem__(self, placeholder: str) -> str:
+        parsed = _parse(placeholder)
+        if parsed is not None:
+            with self._lock:
+                row = self._db.execute(
+                    "SELECT value FROM vault WHERE type = ? AND number = ?", parsed
+                ).fetchone()
+            if row is not None:
+                value: str = row[0]
+                return value
+        raise KeyError(placeholder)
+
+    def __iter__(self) -> Iterator[str]:
+        with self._lock:
+            rows = self._db.execute("SELECT type, number FROM vault").fetchall()
+        return (f"[ENTITY_{entity_type}_{number}]" for entity_type, number in rows)
+
+    def __len__(self) -> int:
+        with self._lock:
+            count: int = self._db.execute("SELECT COUNT(*) FROM vault").fetchone()[0]
+        return count
+
+    def __bool__(self) -> bool:
+        # Cheaper than counting the rows.
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM vault LIMIT 1").fetchone() is not None
+
+    def close(self) -> None:
+        """Closes the database."""
+        with self._lock:
+            self._db.close()
@@ -1,9 +1,63 @@
 import pytest
+import asyncio
+import io
+import itertools
+import json
 import os
+import re
 from unittest.mock import mock_open, patch
-from text_anonymizer.core import recognize_entities, anonymize, deanonymize
+from text_anonymizer.core import (
+    recognize_entities,
+    recognize_entities_batch,
+    recognize_spans,
+    recognize_spans_batch,
+    anonymize,
+    anonymize_batch,
+    anonymize_with_offsets,
+    deanonymize,
+    find_unknown_placeholders,
+    resolve_overlaps,
+    UnknownPlaceholderError,
+)
 from text_anonymizer.main import create_parser, anonymize_text, deanonymize_text
-from anthropic import Anthropic, HUMAN_PROMPT, AI_PROMPT
+from text_anonymizer.anonymizer import Anonymizer
+from text_anonymizer.cache import EntityCache
+from text_anonymizer.conversation import Conversation
+from text_anonymizer.entities import Entity
+from text_anonymizer.chunking import plan_chunks
+from text_anonymizer.mapfile import convert_map, load_map, write_map
+from text_anonymizer.parallel import plan_files, run_directory
+from text_anonymizer.prefilter import _SENTENCE_STARTS, needs_ner
+from text_anonymizer.server import AnonymizationServer
+from evaluations.llm_evaluation import EchoClient, ResponseCache, evaluate_corpus
+from text_anonymizer.structured import (
+    MAP_SCOPES,
+    anonymize_structured,
+    deanonymize_structured,
+    stream_anonymize_structured,
+    stream_deanonymize_structured,
+)
+from text_anonymizer.instrumentation import default_instrumentation
+from text_anonymizer.terms import TermDictionary
+from text_anonymizer.vault import EntityVault, SQLiteEntityVault
+from text_anonymizer.recognizers import (
+    PatternRecognizer,
+    RecognizerRegistry,
+    default_recognizers,
+    default_registry,
+    iban_valid,
+    luhn_valid,
+)
+from text_anonymizer.model import ModelManager, DEFAULT_EXCLUDE, get_nlp
+from text_anonymizer.streaming import (
+    StreamingDeanonymizer,
+    deanonymize_chunks,
+    deanonymize_chunks_async,
+    read_records,
+    anonymize_records,
+    stream_anonymize,
+    stream_deanonymize,
+)
 
 @pytest.fixture
 def sample_text():
@@ -48,6 +102,30 @@ def test_deanonymize():
     
     assert de_anonymized_text == "Jane Doe works at Tech Corp in San Francisco."
 
+def test_deanonymize_does_not_rescan_restored_values():
+    anonymization_map = {"[ENTITY_PERSON_1]": "[ENTITY_ORG_1] fan", "[ENTITY_ORG_1]": "Tech Corp"}
+    de_anonymized_text = deanonymize("[ENTITY_PERSON_1] at [ENTITY_ORG_1]", anonymization_map)
+    assert de_anonymized_text == "[ENTITY_ORG_1] fan at Tech Corp"
+
+def test_deanonymize_unknown_placeholders():
+    anonymized_text = "[ENTITY_PERSON_1] met [ENTITY_PERSON_2] at [ENTITY_WORK_OF_ART_1]."
+    anonymization_map = {"[ENTITY_PERSON_1]": "Jane Doe"}
+
+    de_anonymized_text = deanonymize(anonymized_text, anonymization_map)
+    assert de_anonymized_text == "Jane Doe met [ENTITY_PERSON_2] at [ENTITY_WORK_OF_ART_1]."
+    assert find_unknown_placeholders(anonymized_text, anonymization_map) == [
+        "[ENTITY_PERSON_2]",
+        "[ENTITY_WORK_OF_ART_1]",
+    ]
+    with pytest.raises(UnknownPlaceholderError) as excinfo:
+        deanonymize(anonymized_text, anonymization_map, on_unknown="raise")
+    assert excinfo.value.placeholders == ["[ENTITY_PERSON_2]", "[ENTITY_WORK_OF_ART_1]"]
+
+def test_deanonymize_custom_placeholders():
+    anonymization_map = {"<NAME>": "Jane Doe", "<NAME>_2": "John Doe", "[ENTITY_ORG_1]": "Tech Corp"}
+    de_anonymized_text = deanonymize("<NAME> and <NAME>_2 at [ENTITY_ORG_1]", anonymization_map)
+    assert de_anonymized_text == "Jane Doe and John Doe at Tech Corp"
+
 def test_full_process(sample_text):
     anonymized_text, anonymization_map = anonymize(sample_text)
     de_anonymized_text = deanonymize(anonymized_text, anonymization_map)
@@ -106,6 +184,348 @@ def test_email_recognition():
     assert "[ENTITY_EMAIL_1]" in anonymized_text
     assert anonymization_map["[ENTITY_EMAIL_1]"] == "support@example.com"
 
+def test_recognize_entities_batch_matches_single(sample_text):
+    texts = [sample_text, "Contact us at support@example.com for assistance.", ""]
+    results = recognize_entities_batch(texts, batch_size=2)
+    assert not isinstance(results, list)
+    assert list(results) == [recognize_entities(text) for text in texts]
+
+def test_anonymize_batch_matches_single(sample_text):
+    texts = [sample_text, "Visit our website at https://www.example.com for more information."]
+    assert list(anonymize_batch(texts)) == [anonymize(text) for text in texts]
+
+def test_anonymize_batch_multiprocess(sample_text):
+    texts = [sample_text] * 4
+    results = list(anonymize_batch(texts, batch_size=1, n_process=2))
+    assert results == [anonymize(sample_text)] * 4
+
+def test_anonymize_batch_company_terms():
+    texts = ["We use Globex tools.", "Globex and Initech merged."]
+    results = list(anonymize_batch(texts, company_terms=["Globex", "Initech"]))
+    assert all("Globex" not in text for text, _ in results)
+    assert "Initech" in results[1][1].values()
+
+def test_plan_chunks_short_text():
+    assert plan_chunks("short text", chunk_size=100, overlap=10) == [(0, 10, 0, 10)]
+
+def test_plan_chunks_covers_text():
+    text = "First sentence here. Second one follows.\n\nNew paragraph starts. " * 20
+    chunks = plan_chunks(text, chunk_size=120, overlap=20)
+    assert chunks[0].own_start == 0
+    assert chunks[-1].own_end == len(text)
+    assert all(a.own_end == b.own_start for a, b in zip(chunks, chunks[1:]))
+    assert all(c.end - c.start <= 120 for c in chunks)
+    assert all(c.start <= c.own_start < c.own_end <= c.end for c in chunks)
+
+def test_plan_chunks_without_whitespace():
+    chunks = plan_chunks("x" * 250, chunk_size=100, overlap=10)
+    assert [c.own_end for c in chunks] == [80, 160, 240, 250]
+
+def test_plan_chunks_rejects_large_overlap():
+    with pytest.raises(ValueError):
+        plan_chunks("word " * 100, chunk_size=100, overlap=50)
+
+def test_recognize_entities_chunked_matches_unchunked(sample_text):
+    text = "\n\n".join([sample_text] * 20)
+    expected = recognize_entities(text, chunk_size=None)
+    assert recognize_entities(text, chunk_size=400, chunk_overlap=100) == expected
+
+def test_anonymize_batch_chunked(sample_text):
+    text = " ".join([sample_text] * 10)
+    results = list(anonymize_batch([text, sample_text], chunk_size=300, chunk_overlap=50))
+    assert results[0] == anonymize(text, chunk_size=None)
+    assert results[1] == anonymize(sample_text)
+
+def test_model_manager_is_lazy():
+    manager = ModelManager()
+    assert not manager.loaded
+    nlp = manager.get()
+    assert manager.loaded
+    assert manager.get() is nlp
+
+def test_model_manager_loads_ner_only():
+    nlp = ModelManager().warm_up()
+    assert "ner" in nlp.pipe_names
+    assert not set(DEFAULT_EXCLUDE) & set(nlp.pipe_names)
+
+def test_model_manager_configure_drops_loaded_pipeline():
+    manager = ModelManager()
+    manager.get()
+    manager.configure(exclude=())
+    assert not manager.loaded
+
+def test_model_shared_between_calls(sample_text):
+    recognize_entities(sample_text)
+    nlp = get_nlp()
+    anonymize(sample_text)
+    assert get_nlp() is nlp
+
+def test_recognize_spans_matches_entities(sample_text):
+    spans = recognize_spans(sample_text, company_terms=["Acme"])
+    entities = recognize_entities(sample_text, company_terms=["Acme"])
+    assert all(isinstance(span, Entity) for span in spans)
+    assert [span.to_dict(sample_text) for span in spans] == entities
+    assert spans[0].text_in(sample_text) == entities[0]["text"]
+
+def test_resolve_overlaps():
+    entities = [
+        {"type": "PERSON", "start": 0, "end": 4, "text": "john"},
+        {"type": "EMAIL", "start": 0, "end": 12, "text": "john@acme.io"},
+        {"type": "ORG", "start": 5, "end": 9, "text": "acme"},
+        {"type": "GPE", "start": 20, "end": 26, "text": "London"},
+        {"type": "COMPANY", "start": 20, "end": 26, "text": "London"},
+    ]
+    assert [e["type"] for e in resolve_overlaps(entities)] == ["EMAIL", "COMPANY"]
+
+    entities = [
+        {"type": "PERSON", "start": 0, "end": 10, "text": "John Smith"},
+        {"type": "EMAIL", "start": 5, "end": 22, "text": "Smith@example.com"},
+    ]
+    assert resolve_overlaps(entities) == [
+        {"type": "EMAIL", "start": 0, "end": 22, "text": "John Smith@example.com"}
+    ]
+
+def test_anonymize_merges_partly_overlapping_entities():
+    text = "Mail John Smith@example.com today"
+    entities = [Entity("PERSON", 5, 15), Entity("EMAIL", 10, 27)]
+    with patch("text_anonymizer.core.recognize_spans", return_value=entities):
+        anonymized_text, anonymization_map = anonymize(text)
+    assert anonymized_text == "Mail [ENTITY_EMAIL_1] today"
+    assert anonymization_map == {"[ENTITY_EMAIL_1]": "John Smith@example.com"}
+
+def test_anonymize_overlapping_company_term():
+    text = "Our office in London is closed, email info@london.example.com instead."
+    anonymized_text, anonymization_map = anonymize(text, company_terms=["London"])
+    assert deanonymize(anonymized_text, anonymization_map) == text
+    assert anonymization_map["[ENTITY_EMAIL_1]"] == "info@london.example.com"
+
+def test_anonymize_numbers_placeholders_from_the_end():
+    text = "Write to a@example.com, b@example.com or c@example.com."
+    anonymized_text, anonymization_map = anonymize(text)
+    assert anonymized_text == "Write to [ENTITY_EMAIL_3], [ENTITY_EMAIL_2] or [ENTITY_EMAIL_1]."
+    assert list(anonymization_map) == ["[ENTITY_EMAIL_1]", "[ENTITY_EMAIL_2]", "[ENTITY_EMAIL_3]"]
+
+def test_anonymize_with_offsets(sample_text):
+    anonymized_text, anonymization_map, offsets = anonymize_with_offsets(sample_text)
+    assert (anonymized_text, anonymization_map) == anonymize(sample_text)
+    assert len(offsets) == len(anonymization_map)
+    for span in offsets:
+        placeholder = anonymized_text[span.anonymized_start : span.anonymized_end]
+        original = sample_text[span.original_start : span.original_end]
+        assert anonymization_map[placeholder] == original
+        assert offsets.to_anonymized(span.original_start) == span.anonymized_start
+        assert offsets.to_original(span.anonymized_start) == span.original_start
+    start = sample_text.index("called")
+    assert anonymized_text[offsets.to_anonymized(start) :].startswith("called")
+    assert offsets.to_original(offsets.to_anonymized(start)) == start
+
+def test_anonymize_consistent_placeholders():
+    text = "Alice met Bob. Later Alice wrote to a@example.com and to Bob."
+    anonymized_text, anonymization_map = anonymize(text, consistent=True)
+    assert anonymized_text == (
+        "[ENTITY_PERSON_2] met [ENTITY_PERSON_1]. Later [ENTITY_PERSON_2] wrote to "
+        "[ENTITY_EMAIL_1] and to [ENTITY_PERSON_1]."
+    )
+    assert anonymization_map == {
+        "[ENTITY_PERSON_1]": "Bob",
+        "[ENTITY_PERSON_2]": "Alice",
+        "[ENTITY_EMAIL_1]": "a@example.com",
+    }
+    assert deanonymize(anonymized_text, anonymization_map) == text
+    assert anonymize("Alice met Bob.", consistent=True) == anonymize("Alice met Bob.")
+
+@pytest.mark.parametrize("store", ["memory", "sqlite"])
+def test_entity_vault_across_documents(tmp_path, store):
+    path = str(tmp_path / "vault.db")
+    vault = EntityVault() if store == "memory" else SQLiteEntityVault(path)
+    anonymizer = Anonymizer(vault=vault)
+    first, first_map = anonymizer.anonymize("Alice met Bob, and Bob left.")
+    assert first == "[ENTITY_PERSON_1] met [ENTITY_PERSON_2], and [ENTITY_PERSON_2] left."
+    second, second_map = anonymizer.anonymize("Bob called Jane Doe.")
+    assert second == "[ENTITY_PERSON_2] called [ENTITY_PERSON_3]."
+    assert second_map == {"[ENTITY_PERSON_2]": "Bob", "[ENTITY_PERSON_3]": "Jane Doe"}
+    assert len(vault) == 3 and vault["[ENTITY_PERSON_3]"] == "Jane Doe"
+    assert deanonymize(first + " " + second, vault, on_unknown="raise") == (
+        "Alice met Bob, and Bob left. Bob called Jane Doe."
+    )
+    assert "".join(deanonymize_chunks(["[ENTITY_PERS", "ON_1] waved"], vault)) == "Alice waved"
+    if store == "sqlite":
+        vault.close()
+        reopened = SQLiteEntityVault(path)
+        assert reopened.placeholder("PERSON", "Bob") == "[ENTITY_PERSON_2]"
+        assert reopened.placeholder("PERSON", "Carol") == "[ENTITY_PERSON_4]"
+        assert dict(reopened)["[ENTITY_PERSON_1]"] == "Alice"
+        reopened.close()
+
+def test_default_registry_enables_url_and_email():
+    assert default_registry.enabled == ["URL", "EMAIL"]
+
+def test_registry_scans_enabled_recognizers():
+    registry = RecognizerRegistry(default_recognizers())
+    registry.enable("IBAN", "CREDIT_CARD", "IPV4", "IPV6", "PHONE")
+    text = (
+        "Pay 4111 1111 1111 1111 to DE89 3704 0044 0532 0130 00 from 192.168.0.1 "
+        "or 2001:db8::1, call +1 (555) 123-4567, mail a@example.com."
+    )
+    found = {(e["type"], e["text"]) for e in registry.scan(text)}
+    assert found == {
+        ("CREDIT_CARD", "4111 1111 1111 1111"),
+        ("IBAN", "DE89 3704 0044 0532 0130 00"),
+        ("IP_ADDRESS", "192.168.0.1"),
+        ("IP_ADDRESS", "2001:db8::1"),
+        ("PHONE", "+1 (555) 123-4567"),
+        ("EMAIL", "a@example.com"),
+    }
+    registry.disable("CREDIT_CARD")
+    assert "CREDIT_CARD" not in {e["type"] for e in registry.scan(text)}
+
+def test_registry_falls_back_when_validator_rejects():
+    registry = RecognizerRegistry(
+        [
+            PatternRecognizer("CARD", r"\d{4}-\d{4}", validator=lambda c: c.startswith("4")),
+            PatternRecognizer("CODE", r"\d{4}-\d{2}"),
+        ]
+    )
+    assert [(e["type"], e["text"]) for e in registry.scan("1234-5678 4234-5678")] == [
+        ("CODE", "1234-56"),
+        ("CARD", "4234-5678"),
+    ]
+
+def test_registry_separate_passes_match_fused_scan():
+    separate = RecognizerRegistry(default_recognizers())
+    separate.enable("IPV4", "SSN")
+    # A validator that accepts everything forces the fused scan.
+    fused = RecognizerRegistry(
+        PatternRecognizer(r.name, r.pattern, entity_type=r.entity_type, validator=lambda c: True)
+        for r in separate
+        if r.enabled
+    )
+    texts = [
+        "mail a@example.com or see https://example.com/a from 10.0.0.1, SSN 123-45-6789",
+        # Overlapping URL and EMAIL matches are settled like the fused scan does.
+        "open https://example.com/x?u=bob@example.com and bob@example.com",
+        "nothing to find here",
+    ]
+    for text in texts:
+        assert separate.scan_spans(text) == fused.scan_spans(text)
+    assert [e.type for e in separate.scan_spans(texts[1])] == ["URL", "EMAIL"]
+
+def test_registry_custom_recognizer_with_groups_and_flags():
+    registry = RecognizerRegistry(default_recognizers())
+    registry.register(PatternRecognizer("TICKET", r"(tkt)-(\d+)", flags=re.IGNORECASE))
+    entities = registry.scan("See TKT-42 or mail a@example.com")
+    assert [(e["type"], e["text"]) for e in entities] == [
+        ("TICKET", "TKT-42"),
+        ("EMAIL", "a@example.com"),
+    ]
+
+def test_checksum_validators():
+    assert luhn_valid("4111 1111 1111 1111")
+    assert not luhn_valid("4111 1111 1111 1112")
+    assert iban_valid("DE89 3704 0044 0532 0130 00")
+    assert not iban_valid("DE88 3704 0044 0532 0130 00")
+
+def test_term_dictionary_matches_longest_term_at_token_boundaries():
+    terms = TermDictionary(["Acme", "Acme Labs", "Labs"])
+    found = [(e["text"], e["start"]) for e in terms.find("Acme Labs, Acmeco and Acme's Labs")]
+    assert found == [("Acme Labs", 0), ("Acme", 22), ("Labs", 29)]
+
+def test_term_dictionary_case_insensitive_add_remove():
+    terms = TermDictionary(["Globex", "GLOBEX"], case_sensitive=False)
+    assert [e["text"] for e in terms.find("globex and Globex")] == ["globex", "Globex"]
+    terms.remove("GLOBEX")
+    assert len(terms.find("globex")) == 1
+    terms.remove("Globex")
+    assert terms.find("globex") == []
+    terms.add("Initech Systems")
+    assert [e["text"] for e in terms.find("initech SYSTEMS")] == ["initech SYSTEMS"]
+
+def test_term_dictionary_save_and_load(tmp_path):
+    terms = TermDictionary(["Globex", "Initech Systems"], case_sensitive=False)
+    path = str(tmp_path / "terms.json")
+    terms.save(path)
+    loaded = TermDictionary.load(path)
+    assert list(loaded) == ["Globex", "Initech Systems"]
+    assert loaded.find("GLOBEX and initech systems") == terms.find("GLOBEX and initech systems")
+
+def test_anonymizer_reuses_terms(sample_text):
+    anonymizer = Anonymizer(company_terms=["Globex"])
+    text = "Globex signed with Initech."
+    anonymized_text, anonymization_map = anonymizer.anonymize(text)
+    assert anonymization_map["[ENTITY_COMPANY_1]"] == "Globex"
+
+    anonymizer.add_terms("Initech")
+    anonymizer.remove_terms("Globex")
+    anonymized_text, anonymization_map = anonymizer.anonymize(text)
+    assert "Initech" not in anonymized_text
+    assert "Initech" in anonymization_map.values()
+
+    assert anonymizer.anonymize(sample_text) == anonymize(sample_text)
+    assert list(anonymizer.anonymize_batch([sample_text])) == [anonymize(sample_text)]
+    assert anonymizer.deanonymize(*anonymizer.anonymize(sample_text)) == sample_text
+
+def test_anonymizer_from_terms_file(tmp_path):
+    path = str(tmp_path / "terms.json")
+    Anonymizer(company_terms=["Globex"], case_sensitive=False).save_terms(path)
+    anonymizer = Anonymizer.from_terms_file(path)
+    assert anonymizer.recognize_entities("GLOBEX rocks")[0]["type"] == "COMPANY"
+
+def test_entity_cache_evicts_least_recently_used():
+    cache = EntityCache(max_entries=2)
+    entities = [Entity("PERSON", 0, 4)]
+    cache.put("a", entities)
+    cache.put("b", [])
+    assert cache.get("a") == entities
+    cache.put("c", [])
+    assert cache.get("b") is None
+    assert cache.stats()["evictions"] == 1
+
+    cache = EntityCache(max_bytes=30)
+    cache.put("a", entities)
+    cache.put("b", entities)
+    assert len(cache) == 1 and cache.get("b") == entities
+
+def test_entity_cache_disk_tier_is_shared(tmp_path):
+    path = str(tmp_path / "entities.db")
+    entities = [Entity("PERSON", 0, 4)]
+    EntityCache(path=path).put("a", entities)
+    cache = EntityCache(path=path)
+    assert cache.get("a") == entities
+    assert cache.get("a")[0].type == "PERSON"
+    assert cache.stats()["disk_hits"] == 1 and cache.stats()["hits"] == 1
+
+def test_anonymizer_cache_hits_and_invalidation(sample_text):
+    cache = EntityCache()
+    anonymizer = Anonymizer(company_terms=["Globex"], cache=cache)
+    texts = [sample_text, "Globex hired Bob.", sample_text] * 3
+    expected = [anonymize(text, company_terms=["Globex"]) for text in texts]
+    assert list(anonymizer.anonymize_batch(texts, batch_size=2)) == expected
+    assert cache.stats()["misses"] == 2 and cache.stats()["hits"] == 7
+
+    anonymizer.add_terms("Bob")
+    anonymized_text, _ = anonymizer.anonymize("Globex hired Bob.")
+    assert "Bob" not in anonymized_text
+    assert cache.stats()["misses"] == 3
+
+def test_anonymizer_fingerprint_is_memoized_and_invalidated():
+    model = ModelManager()
+    registry = RecognizerRegistry(default_recognizers())
+    anonymizer = Anonymizer(company_terms=["Globex"], registry=registry, model=model)
+    fingerprint = anonymizer.fingerprint
+    with patch("spacy.util.get_package_version") as get_package_version:
+        assert anonymizer.fingerprint == fingerprint
+        get_package_version.assert_not_called()
+
+    fingerprints = {fingerprint}
+    for change in (
+        lambda: anonymizer.add_terms("Initech"),
+        lambda: registry.enable("SSN"),
+        lambda: model.configure(exclude=()),
+    ):
+        change()
+        fingerprints.add(anonymizer.fingerprint)
+    assert len(fingerprints) == 4
+
 def test_create_parser():
     parser = create_parser()
     assert parser.description == "Text Anonymizer"
@@ -147,4 +567,568 @@ def test_deanonymize_text(mock_json_load, mock_file):
     assert mock_file.call_count == 3  # Once for reading input, once for reading map, once for writing output
     mock_json_load.assert_called_once()
 
-# The LLM evaluation test has been moved to evaluations/llm_evaluation.py
+# The LLM evaluation lives in evaluations/llm_evaluation.py; its harness is tested offline below.
+
+@pytest.mark.parametrize("fmt", ["json", "compact", "sqlite"])
+def test_map_formats(tmp_path, fmt):
+    anonymization_map = {"[ENTITY_PERSON_1]": "Jörg", "[ENTITY_PERSON_2]": "Bob", "<<ceo>>": "Ann"}
+    path = str(tmp_path / "map")
+    write_map(path, anonymization_map, fmt)
+    assert load_map(path) == anonymization_map
+    assert list(load_map(path)) == list(anonymization_map)
+    needed = load_map(path, "[ENTITY_PERSON_2] and <<ceo>> met [ENTITY_PERSON_9].")
+    if fmt == "sqlite":
+        assert needed == {"[ENTITY_PERSON_2]": "Bob", "<<ceo>>": "Ann"}
+    else:
+        assert needed == anonymization_map
+
+def test_sqlite_map_round_trip_and_conversion(tmp_path, sample_text):
+    input_file = str(tmp_path / "input.txt")
+    with open(input_file, "w") as f:
+        f.write(sample_text)
+    output_file, map_file = anonymize_text(input_file, str(tmp_path / "out.txt"), map_format="sqlite")
+    assert map_file.endswith(".db")
+    restored = deanonymize_text(output_file, str(tmp_path / "restored.txt"), map_file)
+    with open(restored) as f:
+        assert f.read() == sample_text
+
+    convert_map(map_file, str(tmp_path / "map.json"), "compact")
+    convert_map(str(tmp_path / "map.json"), str(tmp_path / "map.db"), "sqlite")
+    assert load_map(str(tmp_path / "map.db")) == load_map(map_file)
+
+def test_read_records():
+    assert list(read_records(io.StringIO("a\n\nb\n"), "lines")) == ["a", "", "b"]
+    assert list(read_records(io.StringIO('{"text": "a"}\n\n'), "jsonl")) == [{"text": "a"}]
+
+@pytest.mark.parametrize("line", ['["a"]', '"text"', "{not json"])
+def test_read_records_rejects_non_objects(line):
+    with pytest.raises(ValueError, match="line 2"):
+        list(read_records(io.StringIO(f'{{"text": "a"}}\n{line}\n'), "jsonl"))
+
+def test_stream_anonymize_rejects_record_without_text_field(tmp_path):
+    input_file = tmp_path / "input.jsonl"
+    input_file.write_text('{"text": "a"}\n{"body": "b"}\n')
+    with pytest.raises(ValueError, match="line 2: the record has no 'text' field"):
+        stream_anonymize(str(input_file), str(tmp_path / "out.jsonl"), "jsonl")
+
+def test_anonymize_records_rejects_record_without_text_field():
+    with pytest.raises(ValueError, match="record 2"):
+        list(anonymize_records([{"text": "a"}, {"body": "b"}]))
+
+def test_anonymize_records_is_lazy(sample_text):
+    consumed = []
+
+    def records():
+        for i in range(10):
+            consumed.append(i)
+            yield {"id": i, "text": sample_text}
+
+    results = anonymize_records(records(), batch_size=2)
+    record, anonymization_map = next(results)
+    assert len(consumed) < 10
+    assert record["id"] == 0
+    assert record["text"] == anonymize(sample_text)[0]
+    assert anonymization_map == anonymize(sample_text)[1]
+
+def test_stream_jsonl_round_trip(tmp_path, sample_text):
+    input_file = tmp_path / "input.jsonl"
+    records = [{"id": 1, "text": sample_text}, {"id": 2, "text": "Nothing to see here."}]
+    input_file.write_text("".join(json.dumps(r) + "\n" for r in records))
+
+    output_file, map_file = stream_anonymize(str(input_file), str(tmp_path / "out.jsonl"), "jsonl")
+    assert map_file is None
+    anonymized = [json.loads(line) for line in open(output_file)]
+    assert "John Smith" not in anonymized[0]["text"]
+    assert anonymized[0]["anonymization_map"]["[ENTITY_PERSON_1]"] == "John Smith"
+
+    restored_file = stream_deanonymize(output_file, str(tmp_path / "restored.jsonl"), "jsonl")
+    assert [json.loads(line) for line in open(restored_file)] == records
+
+def test_plan_files_largest_first_and_skips_maps(tmp_path):
+    (tmp_path / "in").mkdir()
+    (tmp_path / "in" / "small.txt").write_text("a")
+    (tmp_path / "in" / "large.txt").write_text("a" * 100)
+    (tmp_path / "in" / "large.txt.json").write_text("{}")
+    jobs = plan_files("deanonymize", str(tmp_path / "in"), str(tmp_path / "out"))
+    assert [os.path.basename(job.input_file) for job in jobs] == ["large.txt", "small.txt"]
+    assert jobs[0].map_file.endswith(os.path.join("in", "large.txt.json"))
+    with pytest.raises(ValueError):
+        plan_files("anonymize", str(tmp_path / "in"), str(tmp_path / "in"))
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_run_directory_round_trip_and_resume(tmp_path, sample_text, workers):
+    source = tmp_path / "raw"
+    (source / "nested").mkdir(parents=True)
+    (source / "a.txt").write_text(sample_text)
+    (source / "nested" / "b.txt").write_text("Nothing to see here.")
+    (source / "notes.md").write_text(sample_text)
+
+    summary = run_directory(
+        "anonymize", str(source), str(tmp_path / "anon"), pattern="**/*.txt", workers=workers
+    )
+    assert (summary.files, summary.skipped, summary.failed) == (2, 0, 0)
+    assert "John Smith" not in (tmp_path / "anon" / "a.txt").read_text()
+    assert not list((tmp_path / "anon").rglob("*.part"))
+
+    summary = run_directory("anonymize", str(source), str(tmp_path / "anon"), pattern="**/*.txt")
+    assert (summary.files, summary.skipped) == (0, 2)
+
+    summary = run_directory(
+        "deanonymize", str(tmp_path / "anon"), str(tmp_path / "restored"), workers=workers
+    )
+    assert (summary.files, summary.failed) == (1, 0)
+    assert (tmp_path / "restored" / "a.txt").read_text() == sample_text
+
+def test_run_directory_with_sqlite_maps(tmp_path, sample_text):
+    (tmp_path / "raw").mkdir()
+    (tmp_path / "raw" / "a.txt").write_text(sample_text)
+    run_directory("anonymize", str(tmp_path / "raw"), str(tmp_path / "anon"), map_format="sqlite")
+    assert sorted(path.name for path in (tmp_path / "anon").iterdir()) == ["a.txt", "a.txt.db"]
+    summary = run_directory("deanonymize", str(tmp_path / "anon"), str(tmp_path / "restored"))
+    assert (summary.files, summary.failed) == (1, 0)
+    assert (tmp_path / "restored" / "a.txt").read_text() == sample_text
+
+def test_stream_lines_round_trip(tmp_path, sample_text):
+    input_file = tmp_path / "input.txt"
+    input_file.write_text(f"{sample_text}\n\nContact us at support@example.com.\n")
+
+    output_file, map_file = stream_anonymize(str(input_file), str(tmp_path / "out.txt"), "lines")
+    assert map_file == f"{output_file}.jsonl"
+    assert len(open(map_file).readlines()) == 3
+
+    restored_file = stream_deanonymize(
+        output_file, str(tmp_path / "restored.txt"), "lines", map_file=map_file
+    )
+    assert open(restored_file).read() == input_file.read_text()
+
+def test_stream_lines_to_stdout_requires_map_file(tmp_path):
+    input_file = tmp_path / "input.txt"
+    input_file.write_text("hello\n")
+    with pytest.raises(ValueError):
+        stream_anonymize(str(input_file), "-", "lines")
+
+def test_streaming_deanonymizer_holds_back_split_placeholder():
+    deanonymizer = StreamingDeanonymizer({"[ENTITY_PERSON_1]": "Jane Doe"})
+    assert deanonymizer.feed("Hello [ENTITY_PER") == "Hello "
+    assert deanonymizer.feed("SON_1], see [") == "Jane Doe, see "
+    assert deanonymizer.feed("1] and [ENTITY_ORG") == "[1] and "
+    assert deanonymizer.flush() == "[ENTITY_ORG"
+    assert deanonymizer.flush() == ""
+
+def test_deanonymize_chunks_matches_deanonymize():
+    anonymization_map = {"[ENTITY_PERSON_1]": "Jane Doe", "[ENTITY_GPE_12]": "San Francisco"}
+    text = "[ENTITY_PERSON_1] moved to [ENTITY_GPE_12] [in] [ENTITY_ORG_1]."
+    expected = deanonymize(text, anonymization_map)
+    for size in range(1, 8):
+        chunks = [text[i : i + size] for i in range(0, len(text), size)]
+        assert "".join(deanonymize_chunks(chunks, anonymization_map)) == expected
+
+def test_deanonymize_chunks_custom_placeholders():
+    anonymization_map = {"<<NAME>>": "Jane Doe"}
+    chunks = ["Dear <", "<NA", "ME>>, hi <", "3"]
+    assert "".join(deanonymize_chunks(chunks, anonymization_map)) == "Dear Jane Doe, hi <3"
+
+def test_deanonymize_chunks_async():
+    async def chunks():
+        for chunk in ["[ENTITY_", "PERSON_1", "] says hi"]:
+            yield chunk
+
+    async def collect():
+        return [text async for text in deanonymize_chunks_async(chunks(), {"[ENTITY_PERSON_1]": "Jane"})]
+
+    assert asyncio.run(collect()) == ["Jane says hi"]
+
+async def _http(connect, method, path, payload=None):
+    reader, writer = await connect()
+    body = json.dumps(payload).encode() if payload is not None else b""
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nConnection: close\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+    )
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(body)
+
+def test_server_endpoints(tmp_path, sample_text):
+    async def scenario():
+        server = AnonymizationServer()
+        listener = await server.start(port=0)
+        port = listener.sockets[0].getsockname()[1]
+
+        def connect():
+            return asyncio.open_connection("127.0.0.1", port)
+
+        try:
+            status, health = await _http(connect, "GET", "/health")
+            assert (status, health["status"]) == (200, "ok")
+            status, result = await _http(connect, "POST", "/anonymize", {"text": sample_text})
+            assert status == 200
+            assert [result["anonymized_text"], result["anonymization_map"]] == list(
+                anonymize(sample_text)
+            )
+            status, batch = await _http(
+                connect, "POST", "/anonymize/batch", {"texts": [sample_text, "Nothing here."]}
+            )
+            assert batch["results"][0] == result
+            restore = {
+                "text": result["anonymized_text"],
+                "anonymization_map": result["anonymization_map"],
+            }
+            assert await _http(connect, "POST", "/deanonymize", restore) == (
+                200, {"text": sample_text}
+            )
+            assert await _http(connect, "POST", "/deanonymize/batch", {"items": [restore]}) == (
+                200, {"texts": [sample_text]}
+            )
+            unknown = {"text": "[ENTITY_PERSON_9]", "anonymization_map": {}, "on_unknown": "raise"}
+            assert (await _http(connect, "POST", "/deanonymize", unknown))[0] == 422
+            assert (await _http(connect, "POST", "/anonymize", {"texts": 1}))[0] == 400
+            assert (await _http(connect, "GET", "/anonymize"))[0] == 405
+            assert (await _http(connect, "GET", "/missing"))[0] == 404
+            status, metrics = await _http(connect, "GET", "/metrics")
+            assert metrics["batched_texts"] == 3 and metrics["requests"]["/anonymize"] == 2
+        finally:
+            await server.stop()
+
+    asyncio.run(scenario())
+
+def test_server_micro_batches_and_rejects(tmp_path, sample_text):
+    async def scenario():
+        server = AnonymizationServer(max_wait=0.05, max_queue=8)
+        path = str(tmp_path / "anonymizer.sock")
+        await server.start(path=path)
+
+        def connect():
+            return asyncio.open_unix_connection(path)
+
+        try:
+            responses = await asyncio.gather(
+                *(_http(connect, "POST", "/anonymize", {"text": sample_text}) for _ in range(8))
+            )
+            assert all(status == 200 for status, _ in responses)
+            assert server.batcher.batches < 8
+            status, _ = await _http(connect, "POST", "/anonymize/batch", {"texts": ["a"] * 9})
+            assert status == 503
+        finally:
+            await server.stop()
+
+    asyncio.run(scenario())
+
+@pytest.fixture
+def instrumentation():
+    default_instrumentation.reset()
+    default_instrumentation.enable()
+    yield default_instrumentation
+    default_instrumentation.disable()
+    default_instrumentation.reset()
+
+def test_instrumentation_is_off_by_default(sample_text):
+    default_instrumentation.reset()
+    anonymize(sample_text)
+    assert default_instrumentation.snapshot()["stages"] == {}
+
+def test_instrumentation_stages_counters_and_observers(instrumentation, sample_text):
+    events = []
+
+    def observer(kind, name, value):
+        events.append((kind, name))
+
+    instrumentation.add_observer(observer)
+    cache = EntityCache()
+    anonymizer = Anonymizer(company_terms=["Globex"], cache=cache)
+    results = list(anonymizer.anonymize_batch([sample_text, "Globex hired Bob.", sample_text]))
+    deanonymize(*results[0])
+
+    snapshot = instrumentation.snapshot()
+    assert {"ner", "regex", "terms", "sort", "substitute", "deanonymize"} <= set(snapshot["stages"])
+    assert snapshot["stages"]["substitute"]["calls"] == 3
+    assert snapshot["counters"]["documents"] == 2
+    assert snapshot["counters"]["characters"] == len(sample_text) + len("Globex hired Bob.")
+    assert snapshot["caches"]["entities"]["hits"] == 1
+    assert ("count", "documents") in events and ("stage", "ner") in events
+    instrumentation.remove_observer(observer)
+
+    text = instrumentation.prometheus()
+    assert 'text_anonymizer_stage_seconds_total{stage="ner"}' in text
+    assert "text_anonymizer_documents_total 2" in text
+    assert 'text_anonymizer_cache_hits{cache="entities"} 1' in text
+
+def test_instrumentation_reports_each_cache_separately(instrumentation, sample_text):
+    first = Anonymizer(cache=EntityCache())
+    second = Anonymizer(cache=EntityCache())
+    named = Anonymizer(cache=EntityCache(), cache_name="requests")
+    shared = Anonymizer(cache=first.cache, cache_name=first.cache_name)
+    assert len({first.cache_name, second.cache_name, named.cache_name}) == 3
+    assert named.cache_name == "requests"
+    assert shared.cache_name == first.cache_name
+
+    first.anonymize(sample_text)
+    first.anonymize(sample_text)
+    caches = instrumentation.snapshot()["caches"]
+    assert caches[first.cache_name]["hits"] == 1
+    assert caches[second.cache_name]["hits"] == 0
+
+def test_instrumentation_collects_from_directory_workers(instrumentation, tmp_path, sample_text):
+    (tmp_path / "raw").mkdir()
+    for name in ("a.txt", "b.txt"):
+        (tmp_path / "raw" / name).write_text(sample_text)
+    run_directory("anonymize", str(tmp_path / "raw"), str(tmp_path / "anon"), workers=2)
+    snapshot = instrumentation.snapshot()
+    assert snapshot["counters"]["documents"] == 2
+    assert snapshot["stages"]["io"]["calls"] == 4
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("connection refused, retrying", False),
+        ("The backup finished without errors.", False),
+        ("ERROR worker stopped", False),
+        ("Meeting with Alice", True),
+        ("it's an iPhone issue", True),
+        ("we met in münchen with Ünal", True),
+        ("disk usage at 93%", True),
+        ("call me back tomorrow", True),
+        ("It failed. Then it recovered.\nThe queue drained.", False),
+        ("ask Will about it", True),
+        ("Hello Will", True),
+        ("hi May, thanks", True),
+        ("the release slips to May", True),
+        ("payment due in march", True),
+        ("meet me on friday", True),
+    ],
+)
+def test_needs_ner(text, expected):
+    assert needs_ner(text) is expected
+
+def test_auto_detection_has_no_recall_loss(instrumentation):
+    texts = [
+        "Alice met Bob in London on Tuesday.",
+        "Contact jane.doe@example.com about the Acme Corporation account.",
+        "disk usage at 93 percent, retrying",
+        "connection refused, retrying in a moment",
+        "ERROR worker stopped unexpectedly",
+        "The backup finished without errors.",
+        "send the report to ops@example.com",
+        "i spoke with John Doe yesterday",
+        "the queue drained normally. " * 40 + "Sarah Johnson approved it in New York City.",
+        "ask Will about it",
+        "hi May, thanks",
+        "the release slips to May",
+        "payment due in march",
+        "meet me on friday",
+        "Hello Alice, the report is due on Tuesday.",
+        "It stalled. The team told Bob. Then Jane Doe restarted it in London.",
+        "order 4471 shipped to the warehouse on 2024-03-05",
+        "retry 3 of 5 failed after 30 seconds",
+    ]
+    # Capitalized entities right behind every skipped sentence start, at the start of the
+    # text and of a later sentence.
+    hand_picked = len(texts)
+    for start in _SENTENCE_STARTS:
+        texts.append(f"{start} Alice called.")
+        texts.append(f"it stalled. {start} John Doe restarted it.")
+    full = list(recognize_spans_batch(texts, chunk_size=200, chunk_overlap=50, detection="full"))
+    instrumentation.reset()
+    auto = list(recognize_spans_batch(texts, chunk_size=200, chunk_overlap=50, detection="auto"))
+    assert auto == full
+    found = {entity.text_in(text) for text, entities in zip(texts, auto) for entity in entities}
+    assert {"Alice", "Bob", "London", "John Doe", "Jane Doe", "Sarah Johnson"} <= found
+    assert "ops@example.com" in found
+    assert all(auto[hand_picked:])
+    counters = instrumentation.snapshot()["counters"]
+    assert counters["documents"] == len(texts)
+    assert counters["ner_skipped"] == 4
+
+def test_fast_detection_does_not_load_the_model():
+    model = ModelManager("no_such_model")
+    anonymizer = Anonymizer(company_terms=["Globex"], model=model, detection="fast")
+    anonymized_text, anonymization_map = anonymizer.anonymize("Globex: write to a@example.com")
+    assert anonymized_text == "[ENTITY_COMPANY_1]: write to [ENTITY_EMAIL_1]"
+    assert anonymization_map == {"[ENTITY_COMPANY_1]": "Globex", "[ENTITY_EMAIL_1]": "a@example.com"}
+    assert not model.loaded
+    with pytest.raises(ValueError):
+        Anonymizer(detection="sometimes")
+
+def test_recognize_spans_batch_detection_override():
+    model = ModelManager("no_such_model")
+    cache = EntityCache()
+    anonymizer = Anonymizer(company_terms=["Globex"], model=model, cache=cache)
+    texts = ["Globex: write to a@example.com", "nothing here"]
+    spans = list(anonymizer.recognize_spans_batch(texts, detection="fast"))
+    assert spans == [[Entity("COMPANY", 0, 6), Entity("EMAIL", 17, 30)], []]
+    assert not model.loaded
+    assert len(cache) == 0
+    with pytest.raises(ValueError):
+        list(anonymizer.recognize_spans_batch(texts, detection="sometimes"))
+
+def test_conversation_anonymizes_only_new_turns(instrumentation):
+    conversation = Conversation()
+    assert conversation.add("Alice met Bob.") == ["[ENTITY_PERSON_1] met [ENTITY_PERSON_2]."]
+    reply = "Bob wrote to a@example.com."
+    history = conversation.sync(["Alice met Bob.", reply])
+    assert history == [
+        "[ENTITY_PERSON_1] met [ENTITY_PERSON_2].",
+        "[ENTITY_PERSON_2] wrote to [ENTITY_EMAIL_1].",
+    ]
+    counters = instrumentation.snapshot()["counters"]
+    assert counters["characters"] == len("Alice met Bob.") + len(reply)
+    assert conversation.sync(["Alice met Bob.", reply]) == history
+    assert instrumentation.snapshot()["counters"]["documents"] == 2
+
+    response = "Ask [ENTITY_PERSON_1] to call [ENTITY_PERSON_2] at [ENTITY_EMAIL_1]."
+    assert conversation.deanonymize(response) == "Ask Alice to call Bob at a@example.com."
+    chunks = ["Ask [ENTITY_PER", "SON_1] now."]
+    assert "".join(conversation.deanonymize_chunks(chunks)) == "Ask Alice now."
+    with pytest.raises(ValueError):
+        conversation.sync(["Alice met Carol."])
+    with pytest.raises(ValueError):
+        conversation.sync(["Alice met Bob.", "Carol wrote back.", "Thanks!"])
+
+def test_map_is_looked_through_once_per_map():
+    import text_anonymizer.core as core
+    import text_anonymizer.structured as structured
+
+    conversation = Conversation()
+    conversation.add("Alice met Bob.")
+    with patch.object(core, "_irregular_keys", wraps=core._irregular_keys) as scan:
+        for _ in range(3):
+            assert conversation.deanonymize("Hi [ENTITY_PERSON_2].") == "Hi Bob."
+    assert scan.call_count == 0
+
+    anonymization_map = {"[ENTITY_PERSON_1]": "Alice", "<<who>>": "Bob"}
+    records = [{"a": "[ENTITY_PERSON_1]", "b": "<<who>> [x]"}] * 3
+    with patch.object(structured, "_irregular_keys", wraps=core._irregular_keys) as scan:
+        restored = list(deanonymize_structured(records, itertools.repeat(anonymization_map)))
+    assert restored == [{"a": "Alice", "b": "Bob [x]"}] * 3
+    assert scan.call_count == 1
+
+def test_anonymize_structured_fields():
+    registry = RecognizerRegistry(default_recognizers())
+    registry.enable("PHONE")
+    anonymizer = Anonymizer(company_terms=["4711"], registry=registry)
+    records = [
+        {
+            "id": 4711,
+            "user": {
+                "name": "John Smith",
+                "phone": "555-123-4567",
+                "account": "4711",
+                "mobile": 5551234567,
+                "vip": True,
+            },
+            "messages": [{"text": "Alice met John Smith.", "ts": "2024-01-02"}],
+        },
+        {"id": 7, "user": {"name": "Bob", "phone": None}, "messages": []},
+    ]
+    with patch.object(
+        anonymizer, "recognize_spans_batch", wraps=anonymizer.recognize_spans_batch
+    ) as recognize:
+        results = list(
+            anonymize_structured(
+                records, include=["user", "messages.*.text"], exclude=["user.vip"],
+                anonymizer=anonymizer,
+            )
+        )
+    # The text fields of both records went through the pipeline together, and the other
+    # fields through the recognizers only.
+    detections = [call.kwargs.get("detection") for call in recognize.call_args_list]
+    assert detections == [None, "fast"]
+    (first, first_map), (second, second_map) = results
+    assert first == {
+        "id": 4711,
+        "user": {
+            "name": "[ENTITY_PERSON_1]",
+            "phone": "[ENTITY_PHONE_1]",
+            "account": "[ENTITY_COMPANY_1]",
+            "mobile": 5551234567,
+            "vip": True,
+        },
+        "messages": [{"text": "[ENTITY_PERSON_2] met [ENTITY_PERSON_1].", "ts": "2024-01-02"}],
+    }
+    assert first_map == {
+        "[ENTITY_PERSON_1]": "John Smith",
+        "[ENTITY_PHONE_1]": "555-123-4567",
+        "[ENTITY_COMPANY_1]": "4711",
+        "[ENTITY_PERSON_2]": "Alice",
+    }
+    assert second == {"id": 7, "user": {"name": "[ENTITY_PERSON_1]", "phone": None}, "messages": []}
+    assert second_map == {"[ENTITY_PERSON_1]": "Bob"}
+    assert records[0]["user"]["name"] == "John Smith"
+
+    restored = list(deanonymize_structured([first, second], [first_map, second_map]))
+    # Numbers are not anonymized, and keep their type.
+    assert restored == records
+
+    # Shared numbering, but every map only holds the placeholders of its own record.
+    for map_scope, batch_size in (("batch", 256), ("file", 1)):
+        (_, first_map), (_, second_map) = anonymize_structured(
+            records, map_scope=map_scope, batch_size=batch_size
+        )
+        assert first_map == {"[ENTITY_PERSON_1]": "John Smith", "[ENTITY_PERSON_2]": "Alice"}
+        assert second_map == {"[ENTITY_PERSON_3]": "Bob"}
+    (_, first_map), (_, second_map) = anonymize_structured(records, map_scope="batch", batch_size=1)
+    assert second_map == {"[ENTITY_PERSON_1]": "Bob"}
+
+def test_stream_structured_csv_round_trip(tmp_path):
+    input_file = tmp_path / "people.csv"
+    input_file.write_text("id,name,notes\n1,John Smith,Met Alice in London\n2,Alice,none\n")
+    for map_scope in MAP_SCOPES:
+        output_file = tmp_path / f"{map_scope}.csv"
+        restored_file = tmp_path / f"{map_scope}.restored.csv"
+        _, map_file = stream_anonymize_structured(
+            str(input_file), str(output_file), "csv", exclude=["id"], map_scope=map_scope
+        )
+        anonymized = output_file.read_text()
+        assert "John Smith" not in anonymized and "Alice" not in anonymized
+        if map_scope != "record":
+            assert anonymized.splitlines()[2] == "2,[ENTITY_PERSON_2],none"
+        if map_scope == "batch":
+            maps = [json.loads(line) for line in open(map_file)]
+            assert maps[1] == {"[ENTITY_PERSON_2]": "Alice"}
+        stream_deanonymize_structured(
+            str(output_file), str(restored_file), "csv", map_file=map_file, map_scope=map_scope
+        )
+        assert restored_file.read_text() == input_file.read_text()
+
+def test_stream_structured_rejects_non_object_lines(tmp_path):
+    input_file = tmp_path / "events.jsonl"
+    input_file.write_text('{"name": "Alice"}\n["Bob"]\n')
+    with pytest.raises(ValueError, match="line 2"):
+        stream_anonymize_structured(str(input_file), str(tmp_path / "out.jsonl"), "jsonl")
+
+def test_llm_evaluation_harness_offline(tmp_path, sample_text):
+    class CountingClient(EchoClient):
+        in_flight = peak = 0
+
+        async def complete(self, prompt):
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+            try:
+                return await super().complete(prompt)
+            finally:
+                self.in_flight -= 1
+
+    documents = [
+        {"text": sample_text, "questions": ["Who works at Acme Corporation?", "Where?"]},
+        {"text": "Alice met Bob in London on Tuesday.", "questions": ["Who met Bob?"]},
+    ]
+    client = CountingClient(latency=0.001)
+    cache = ResponseCache(str(tmp_path / "cache"))
+    report = asyncio.run(evaluate_corpus(documents, client, concurrency=2, cache=cache))
+    assert report["calls"] == client.calls == 2 * (3 + 2)
+    assert report["cache_hits"] == 0
+    assert client.peak == 2
+    assert report["quality"]["mean_answer_f1"] == 1.0
+    assert report["quality"]["unresolved_placeholders"] == 0
+    result = report["results"][1]
+    assert result["anonymized_answers"] == [
+        "[ENTITY_PERSON_2] met [ENTITY_PERSON_1] in [ENTITY_GPE_1] on [ENTITY_DATE_1]."
+    ]
+    assert result["deanonymized_answers"] == ["Alice met Bob in London on Tuesday."]
+    assert report["latency"]["overhead_percent"] is not None
+
+    report = asyncio.run(evaluate_corpus(documents, client, concurrency=2, cache=cache))
+    assert report["cache_hits"] == report["calls"] and client.calls == 10
+    assert report["latency"]["overhead_percent"] is None